@@ -0,0 +1,97 @@
+# Author - Daniel Dang
+# Filename - bench_connection_profile.py
+# Purpose - Compares insert and query throughput between connection profiles
+#
+# Usage - python -m benchmarks.bench_connection_profile [--rows 1000000]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from src.tender_ledger.Backend.database import DatabaseManager
+from src.tender_ledger.Backend.expenses import add_expense, from_cents, get_expenses_for_user, get_total_spending
+
+USER_ID = 1
+LOAD_BATCH = 50000
+
+def generate_rows(count, start=date(2015, 1, 1)):
+    """
+    Generate random expenses for the benchmark user
+
+    Arguments:
+        count (int): Number of rows to generate
+        start (date): Earliest possible date of purchase
+
+    Returns:
+        generator: Tuples that match the columns of the expenses table
+    """
+    rng = random.Random(42)
+    created_at = datetime.now()
+    for _ in range(count):
+        day = start + timedelta(days=rng.randrange(3650))
+        yield (USER_ID, rng.randint(100, 50000), day.isoformat(), day.toordinal(),
+               rng.randint(1, 2), rng.randint(1, 9), f"Store {rng.randrange(2000)}", created_at)
+
+def bulk_load(db, count):
+    """
+    Load the ledger with expenses using large batches so setup time doesn't dominate
+    """
+    sql = "INSERT INTO expenses (user_id, amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    rows = generate_rows(count)
+    while True:
+        batch = [row for _, row in zip(range(LOAD_BATCH), rows)]
+        if not batch:
+            break
+        with db.transaction():
+            db.con.executemany(sql, batch)
+
+def run_profile(profile, rows, inserts, queries):
+    """
+    Run the benchmark for a single connection profile
+
+    Returns:
+        dict: Throughput results for the profile
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseManager(profile=profile, path=os.path.join(directory, "bench.db"))
+
+        # Single row inserts, each one commits like the GUI does
+        start = time.perf_counter()
+        for row in generate_rows(inserts):
+            add_expense(row[0], from_cents(row[1]), row[2], *row[4:-1], db)
+        insert_time = time.perf_counter() - start
+
+        bulk_load(db, rows - inserts)
+
+        # Queries the expenses and dashboard pages make
+        start = time.perf_counter()
+        for i in range(queries):
+            start_date = (date(2015, 1, 1) + timedelta(days=i * 90)).isoformat()
+            get_expenses_for_user(USER_ID, db, start_date=start_date, category=(i % 9) + 1)
+            get_total_spending(USER_ID, db, start_date=start_date)
+        query_time = time.perf_counter() - start
+
+        db.close_connection()
+
+    return {
+        "inserts_per_sec": inserts / insert_time,
+        "queries_per_sec": (queries * 2) / query_time
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the database connection profiles")
+    parser.add_argument("--rows", type=int, default=1000000, help="Size of the ledger")
+    parser.add_argument("--inserts", type=int, default=2000, help="Number of single row inserts to time")
+    parser.add_argument("--queries", type=int, default=20, help="Number of query rounds to time")
+    parser.add_argument("--profiles", nargs="+", default=["legacy", "prod"])
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        results = run_profile(profile, args.rows, args.inserts, args.queries)
+        print(f"{profile:>8}: {results['inserts_per_sec']:10.1f} inserts/s  {results['queries_per_sec']:8.2f} queries/s")
+
+if __name__ == "__main__":
+    main()
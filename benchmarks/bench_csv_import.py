@@ -0,0 +1,112 @@
+# Author - Daniel Dang
+# Filename - bench_csv_import.py
+# Purpose - Measures the throughput and peak memory of importing a large csv file
+#
+# Usage - python -m benchmarks.bench_csv_import [--rows 5000000] [--chunk-size 50000]
+#
+# The file is written by a child process, so the peak memory reported is the import's own
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.tender_ledger.Backend.csv_utils import COLUMN_NAMES, import_expenses_csv
+from src.tender_ledger.Backend.database import DatabaseManager
+from .bench_connection_profile import USER_ID
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory isn't reported there
+    resource = None
+
+# Rows generated at a time when writing the file
+WRITE_BATCH_SIZE = 500000
+
+# An import of 5 million rows should take under 5 minutes
+TARGET_ROWS_PER_SECOND = 5000000 / 300
+
+# Peak memory of an import should not grow with the size of the file. The prod profile
+# maps up to 256 MB of the database and caches 64 MB of pages, which count towards it
+TARGET_PEAK_MEMORY = 512
+
+CATEGORIES = np.array(["Food", "Utilities", "Housing", "Travel", "Shopping", "Other", ""])
+PAYMENT_METHODS = np.array(["Cash", "Credit", "Debit"])
+
+def write_csv(file_path, rows, seed=0):
+    """
+    Write a csv file of random expenses spread over ten years. Some locations are
+    quoted and run over two lines, like the notes in some bank exports
+    """
+    rng = np.random.default_rng(seed)
+    first_day = np.datetime64("2015-01-01")
+
+    with open(file_path, "w", newline="") as file:
+        file.write(",".join(COLUMN_NAMES) + "\n")
+
+        for start in range(0, rows, WRITE_BATCH_SIZE):
+            size = min(WRITE_BATCH_SIZE, rows - start)
+            stores = rng.integers(1, 5000, size).astype(str)
+            locations = np.char.add("Store ", stores)
+            locations[rng.random(size) < 0.01] = "Store\nNotes"
+
+            batch = pd.DataFrame({
+                "Date": (first_day + rng.integers(0, 3650, size)).astype(str),
+                "Amount": (rng.integers(1, 100000, size) / 100).round(2),
+                "Category": CATEGORIES[rng.integers(0, len(CATEGORIES), size)],
+                "Payment Method": PAYMENT_METHODS[rng.integers(0, len(PAYMENT_METHODS), size)],
+                "Location": locations,
+            })
+            batch.to_csv(file, header=False, index=False)
+
+def get_peak_memory():
+    """
+    Get the most memory the process has used so far
+
+    Returns:
+        float: Peak resident memory in MB, None if it can't be measured
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark importing a large csv file")
+    parser.add_argument("--rows", type=int, default=5000000, help="Number of rows in the generated file")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Number of rows imported at a time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "expenses.csv")
+        writer = multiprocessing.Process(target=write_csv, args=(file_path, args.rows))
+        writer.start()
+        writer.join()
+        size = os.path.getsize(file_path) / 1024 / 1024
+
+        db = DatabaseManager(path=os.path.join(directory, "bench.db"))
+
+        start = time.perf_counter()
+        report = import_expenses_csv(file_path, USER_ID, db, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+
+        expense_count = db.con.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+        peak_memory = get_peak_memory()
+        db.close_connection()
+
+    rows_per_second = args.rows / elapsed
+    print(f"file:          {args.rows} rows, {size:.0f} MB")
+    print(f"import:        {elapsed:10.2f} s, {rows_per_second:10.0f} rows/s "
+          f"(target {TARGET_ROWS_PER_SECOND:.0f}, {'met' if rows_per_second >= TARGET_ROWS_PER_SECOND else 'missed'})")
+    print(f"report:        {report['inserted']} inserted, {report['skipped']} skipped, {report['invalid']} invalid")
+    print(f"expenses:      {expense_count} (should match inserted)")
+    if peak_memory is not None:
+        print(f"peak memory:   {peak_memory:10.0f} MB "
+              f"(target {TARGET_PEAK_MEMORY} MB, {'met' if peak_memory <= TARGET_PEAK_MEMORY else 'missed'})")
+
+if __name__ == "__main__":
+    main()
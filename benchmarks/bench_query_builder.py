@@ -0,0 +1,71 @@
+# Author - Daniel Dang
+# Filename - bench_query_builder.py
+# Purpose - Measures repeated expense table refreshes going through the query builder
+#
+# Usage - python -m benchmarks.bench_query_builder [--rows 200000] [--refreshes 500]
+
+import argparse
+import os
+import tempfile
+import time
+
+from src.tender_ledger.Backend.database import DatabaseManager
+from src.tender_ledger.Backend.expenses import build_expenses_query, get_expenses_for_user
+from src.tender_ledger.Backend.query_builder import compile_query
+from .bench_connection_profile import USER_ID, bulk_load
+
+# Filter combinations the expenses page cycles through while a user works
+REFRESHES = [
+    {},
+    {"start_date": "2020-01-01", "end_date": "2020-03-31"},
+    {"category": 3},
+    {"start_date": "2021-06-01", "payment_method": 1},
+    {"search": "Store 12"},
+    {"start_date": "2019-01-01", "end_date": "2019-01-31", "category": 1, "payment_method": 2},
+]
+
+def time_calls(func, calls):
+    """
+    Time how long a function takes on average
+
+    Returns:
+        float: Average time per call in microseconds
+    """
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1000000
+
+def refresh(db, filters):
+    """
+    Refresh the expense table from the database. The result cache is cleared first so
+    that every refresh goes through SQLite, which is the part the query builder speeds up
+    """
+    db.cache.clear()
+    return get_expenses_for_user(USER_ID, db, **filters)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repeated expense table refreshes")
+    parser.add_argument("--rows", type=int, default=200000, help="Size of the ledger")
+    parser.add_argument("--refreshes", type=int, default=500, help="Number of refreshes to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseManager(path=os.path.join(directory, "bench.db"))
+        bulk_load(db, args.rows)
+        with db.writer() as cur:
+            cur.execute("ANALYZE")
+
+        build_time = time_calls(lambda i: build_expenses_query(USER_ID, **REFRESHES[i % len(REFRESHES)]), args.refreshes * 10)
+        refresh_time = time_calls(lambda i: refresh(db, REFRESHES[i % len(REFRESHES)]), args.refreshes)
+        cache_hits = db.cache.hits
+
+        db.close_connection()
+
+    print(f"building a query: {build_time:10.2f} us")
+    print(f"table refresh:    {refresh_time / 1000:10.2f} ms")
+    print(f"compiled shapes:  {compile_query.cache_info()}")
+    print(f"result cache hits: {cache_hits} (should be 0)")
+
+if __name__ == "__main__":
+    main()
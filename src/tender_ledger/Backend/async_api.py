@@ -0,0 +1,215 @@
+# Author - Daniel Dang
+# Filename - async_api.py
+# Purpose - Provides an asyncio version of the Backend functions for scripts and services
+#
+# SQLite calls block, so each call runs on a thread instead of the event loop. Reads share a
+# bounded pool of threads (each with its own connection from the DatabaseManager's pool) and
+# writes go through one dedicated thread, matching SQLite's single writer. Streams from
+# iter_expenses get threads of their own, since they spend most of their time waiting on
+# the caller and would otherwise starve the other reads.
+#
+# Example:
+#     async with AsyncLedger(db) as ledger:
+#         await ledger.add_expense(user_id, "12.50", "2024-01-01", 1, 1, "Market")
+#         async for expense in ledger.iter_expenses(user_id, category=1):
+#             print(expense)
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from . import categories, expenses, payment_methods, users
+
+# Number of threads used for reading at the same time
+DEFAULT_MAX_READERS = 4
+
+# Number of rows fetched at a time by iter_expenses
+DEFAULT_BATCH_SIZE = 1000
+
+# How often, in seconds, a waiting iter_expenses thread checks if it should stop
+STOP_CHECK_INTERVAL = 0.1
+
+def reader_method(func):
+    """
+    Wrap a Backend read function so that it runs on the read threads
+
+    Argument:
+        func (function): Backend function that takes a db argument
+
+    Returns:
+        function: Coroutine function with the same arguments, minus db
+    """
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        return await self.run(self.read_executor, func, *args, **kwargs)
+
+    return method
+
+def writer_method(func):
+    """
+    Wrap a Backend write function so that it runs on the writer thread
+
+    Argument:
+        func (function): Backend function that takes a db argument
+
+    Returns:
+        function: Coroutine function with the same arguments, minus db
+    """
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        return await self.run(self.write_executor, func, *args, **kwargs)
+
+    return method
+
+class AsyncLedger:
+    def __init__(self, db, max_readers=DEFAULT_MAX_READERS):
+        """
+        Sets up the threads used to run database work
+
+        Arguments:
+            db (DatabaseManager): Instance of database manager being used
+            max_readers (int): Maximum number of reads that can run at the same time
+        """
+        self.db = db
+        self.read_executor = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix="ledger-reader")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger-writer")
+        self.stream_executor = ThreadPoolExecutor(thread_name_prefix="ledger-stream")
+
+        # Tells threads still feeding iter_expenses to give up
+        self.closing = threading.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        """
+        Stop the threads once the work they were given is done
+        """
+        self.closing.set()
+        self.stream_executor.shutdown(wait=True)
+        self.read_executor.shutdown(wait=True)
+        self.write_executor.shutdown(wait=True)
+
+    async def run(self, executor, func, *args, **kwargs):
+        """
+        Run a Backend function on an executor without blocking the event loop
+
+        Arguments:
+            executor (ThreadPoolExecutor): Threads to run the function on
+            func (function): Backend function that takes a db argument
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, db=self.db, **kwargs)
+        return await loop.run_in_executor(executor, call)
+
+    async def iter_expenses(self, user_id, batch_size=DEFAULT_BATCH_SIZE, **filters):
+        """
+        Iterate over a user's expenses without loading them all at once
+
+        Arguments:
+            user_id (int): Id of the user
+            batch_size (int): Number of rows fetched from the database at a time
+            filters: Same filters as get_expenses_for_user
+
+        Yields:
+            tuple: One expense, in the same format as get_expenses_for_user
+        """
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue(maxsize=2)
+        stop = threading.Event()
+
+        def put(item):
+            # Wait for room in the queue, giving up if the caller stopped iterating
+            future = asyncio.run_coroutine_threadsafe(batches.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=STOP_CHECK_INTERVAL)
+                    return True
+                except TimeoutError:
+                    if stop.is_set() or self.closing.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            # The cursor stays on one stream thread (and its connection) for the whole
+            # iteration, but a reader slot is only held while fetching a batch so that
+            # waiting on the caller never blocks other reads
+            cur = None
+            try:
+                sql, val = expenses.build_expenses_query(user_id, **filters)
+                while True:
+                    with self.db.reader() as reader:
+                        if cur is None:
+                            cur = reader
+                            cur.execute(sql, val)
+                        rows = cur.fetchmany(batch_size)
+                    if not put(rows) or not rows:
+                        break
+            except Exception as e:
+                put(e)
+            finally:
+                if cur is not None:
+                    cur.close()
+
+        producer = loop.run_in_executor(self.stream_executor, produce)
+        try:
+            while True:
+                rows = await batches.get()
+                if isinstance(rows, Exception):
+                    raise rows
+                if not rows:
+                    break
+
+                for row in rows:
+                    yield row
+        finally:
+            # Let the reading thread finish if the caller stopped early
+            stop.set()
+            while not batches.empty():
+                batches.get_nowait()
+            await producer
+
+    # Expenses
+    add_expense = writer_method(expenses.add_expense)
+    update_expense = writer_method(expenses.update_expense)
+    delete_expense = writer_method(expenses.delete_expense)
+    add_expenses = writer_method(expenses.add_expenses)
+    update_expenses = writer_method(expenses.update_expenses)
+    delete_expenses = writer_method(expenses.delete_expenses)
+    get_expense = reader_method(expenses.get_expense)
+    get_expenses_for_user = reader_method(expenses.get_expenses_for_user)
+    get_total_spending = reader_method(expenses.get_total_spending)
+    get_spending_summary = reader_method(expenses.get_spending_summary)
+    get_daily_totals = reader_method(expenses.get_daily_totals)
+    get_expenses_page = reader_method(expenses.get_expenses_page)
+    get_expense_count = reader_method(expenses.get_expense_count)
+
+    # Categories
+    add_category = writer_method(categories.add_category)
+    update_category = writer_method(categories.update_category)
+    delete_category = writer_method(categories.delete_category)
+    get_categories_for_user = reader_method(categories.get_categories_for_user)
+    get_categories_for_list = reader_method(categories.get_categories_for_list)
+    get_category = reader_method(categories.get_category)
+    get_category_by_name = reader_method(categories.get_category_by_name)
+
+    # Payment methods
+    add_payment_method = writer_method(payment_methods.add_payment_method)
+    update_payment_method = writer_method(payment_methods.update_payment_method)
+    delete_payment_method = writer_method(payment_methods.delete_payment_method)
+    get_payment_methods_for_user = reader_method(payment_methods.get_payment_methods_for_user)
+    get_payment_methods_for_list = reader_method(payment_methods.get_payment_methods_for_list)
+    get_payment_method = reader_method(payment_methods.get_payment_method)
+    get_payment_method_by_name = reader_method(payment_methods.get_payment_method_by_name)
+
+    # Users
+    add_user = writer_method(users.add_user)
+    update_user = writer_method(users.update_user)
+    delete_user = writer_method(users.delete_user)
+    get_user = reader_method(users.get_user)
+    get_user_by_username = reader_method(users.get_user_by_username)
+    get_user_by_id = reader_method(users.get_user_by_id)
+    check_if_username_exists = reader_method(users.check_if_username_exists)
@@ -23,7 +23,9 @@ def add_category(user_id, name, db):
     sql = "INSERT INTO categories (user_id, name, created_at) VALUES (?, ?, ?)"
     val = (user_id, name, created_at)
 
-    return db.execute_statement(sql, val)
+    added = db.execute_statement(sql, val)
+    db.invalidate(user_id)
+    return added
     
 
 
@@ -50,7 +52,11 @@ def update_category(id, name, db):
           WHERE id = ?
           """
     val = (name, updated_at, id,)
-    return db.execute_statement(sql, val)
+    owners = [category[2] for category in get_category(id, db)]
+    updated = db.execute_statement(sql, val)
+    if owners:
+        db.invalidate(*owners)
+    return updated
 
 
 def delete_category(id, db):
@@ -71,7 +77,11 @@ def delete_category(id, db):
           """
     val = (id,)
 
-    return db.execute_statement(sql, val)
+    owners = [category[2] for category in get_category(id, db)]
+    deleted = db.execute_statement(sql, val)
+    if owners:
+        db.invalidate(*owners)
+    return deleted
 
 def get_categories_for_user(user_id, db):
     """
@@ -94,8 +104,7 @@ def get_categories_for_user(user_id, db):
                 WHERE user_id = ? OR user_id IS NULL
               """
         
-        db.cur.execute(sql, (user_id,))
-        rows = db.cur.fetchall()
+        rows = db.cached_read(user_id, sql, (user_id,))
 
         for row in rows:
             categories[row[1]] = row[0]
@@ -124,8 +133,7 @@ def get_categories_for_list(user_id, db):
                 WHERE user_id = ? OR user_id IS NULL
               """
         
-        db.cur.execute(sql, (user_id,))
-        rows = db.cur.fetchall()
+        rows = db.cached_read(user_id, sql, (user_id,))
         
         return rows
 
@@ -158,8 +166,9 @@ def get_category(id, db):
 
     sql = select_clause + where_clause
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
         return []
@@ -189,8 +198,9 @@ def get_category_by_name(name, db):
 
         sql = select_clause + where_clause
         try:
-            db.cur.execute(sql, val)
-            return db.cur.fetchall()
+            with db.reader() as cur:
+                cur.execute(sql, val)
+                return cur.fetchall()
         except Exception as e:
             print(e)
             return []
\ No newline at end of file
@@ -0,0 +1,136 @@
+# Author - Daniel Dang
+# Filename - connection_pool.py
+# Purpose - Hands out SQLite connections so that the database can be used from several threads
+#
+# SQLite allows one writer at a time, so all writes share a single connection guarded by a
+# lock (the writer lane). Reads get a connection per thread so that background work, such as
+# building the dashboard or exporting, can read while the UI writes. With WAL journaling
+# readers don't block the writer and the writer doesn't block readers.
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class ConnectionPool:
+    def __init__(self, path, pragmas, cached_statements=128, max_readers=4):
+        """
+        Sets up the pool and opens the writer connection
+
+        Arguments:
+            path (string): Location of the database file
+            pragmas (dict): PRAGMA settings applied to every connection that is opened
+            cached_statements (int): Number of prepared statements each connection keeps
+            max_readers (int): Maximum number of threads that can read at the same time
+        """
+        self.path = path
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+
+        # Only one thread can hold the writer connection at a time. The lock is
+        # reentrant so that transactions can call functions that also write
+        self.write_lock = threading.RLock()
+        self.writer_thread = None
+        self.writer_connection = self.connect()
+
+        self.reader_slots = threading.BoundedSemaphore(max_readers)
+        self.local = threading.local()
+        self.readers = []
+        self.readers_lock = threading.Lock()
+
+    def connect(self):
+        """
+        Open a new connection to the database with the pool's settings
+
+        Returns:
+            sqlite3.Connection: The new connection
+        """
+        con = sqlite3.connect(self.path, cached_statements=self.cached_statements, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            con.execute(f"PRAGMA {pragma} = {value}")
+
+        return con
+
+    def holds_writer(self):
+        """
+        Checks if the current thread is holding the writer connection
+
+        Returns:
+            bool: True if the current thread holds the writer
+                  False if not
+        """
+        return self.writer_thread == threading.get_ident()
+
+    @contextmanager
+    def writer(self):
+        """
+        Hold the writer connection for the duration of the with block. Other threads
+        that want to write wait until the block ends
+        """
+        with self.write_lock:
+            previous = self.writer_thread
+            self.writer_thread = threading.get_ident()
+            try:
+                yield self.writer_connection
+            finally:
+                self.writer_thread = previous
+
+    def data_version(self):
+        """
+        Get SQLite's data_version for the writer connection, which changes whenever
+        another connection (such as another process) commits to the database. The
+        writer's own commits don't change it
+
+        Returns:
+            int: The data version, None if another thread is using the writer
+        """
+        if not self.write_lock.acquire(blocking=False):
+            return None
+
+        try:
+            return self.writer_connection.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self.write_lock.release()
+
+    @contextmanager
+    def reader(self):
+        """
+        Get a connection for reading in the with block. Each thread gets its own
+        connection. A thread that is holding the writer reads through the writer so
+        that it can see the changes it hasn't committed yet
+        """
+        if self.holds_writer():
+            yield self.writer_connection
+            return
+
+        con = getattr(self.local, "connection", None)
+        if con is None:
+            con = self.connect()
+            self.local.connection = con
+            self.local.depth = 0
+            with self.readers_lock:
+                self.readers.append(con)
+
+        # Nested reads on the same thread share the slot taken by the outermost one
+        if self.local.depth == 0:
+            self.reader_slots.acquire()
+        self.local.depth += 1
+        try:
+            yield con
+        finally:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                self.reader_slots.release()
+
+    def close(self):
+        """
+        Close every connection opened by the pool
+        """
+        with self.readers_lock:
+            for con in self.readers:
+                con.close()
+            self.readers.clear()
+
+        self.local = threading.local()
+
+        with self.write_lock:
+            self.writer_connection.close()
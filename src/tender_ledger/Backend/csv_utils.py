@@ -2,21 +2,132 @@
 # Filename - csv_utils.py
 # Purpose - Handles downloading and importing csv files
 
+import csv
+import hashlib
+import io
+import json
+import os
+import numpy as np
 import pandas as pd
+from datetime import date, datetime
 from tkinter import filedialog
-from .categories import get_categories_for_user, add_category, get_category_by_name
-from .payment_methods import get_payment_methods_for_user, add_payment_method, get_payment_method_by_name
-from .expenses import add_expense
+from .categories import get_categories_for_user, add_category
+from .payment_methods import get_payment_methods_for_user, add_payment_method
+from .expenses import get_fingerprint, to_cents, to_day_ordinal
+from .migrations import ROLLUP_TABLES
 
 
 COLUMN_NAMES = ['Date', 'Amount', 'Category', 'Payment Method', 'Location']
 
+# Number of rows read, checked and committed at a time when importing
+IMPORT_CHUNK_SIZE = 50000
+
+# Number of invalid rows whose reasons are kept in an import's report
+MAX_REPORTED_ERRORS = 100
+
+# Number of SQLite instructions run between checks for a cancelled import
+CANCEL_CHECK_INSTRUCTIONS = 10000
+
+# Amounts such as "-12.5", "$1,200.00" or ".99", split into sign, dollars and cents
+AMOUNT_PATTERN = r"^([+-]?)(\d*)(?:\.(\d*))?$"
+
+# Day ordinal of 1970-01-01, where NumPy starts counting days
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+
+# Imported expenses always get a fingerprint, rows whose fingerprint is already taken are ignored
+IMPORT_EXPENSE_SQL = "INSERT OR IGNORE INTO expenses (user_id, amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, created_at, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Triggers that update the search index and the daily, monthly and yearly totals for
+# every inserted expense. They are taken out while a chunk is inserted and the chunk is
+# added to each at once instead, which is several times faster. Triggers are part of the
+# schema, so they are put back from their own SQL in the same transaction and a chunk
+# that fails leaves them as they were
+CHUNK_TRIGGERS = ("expenses_fts_insert", "expense_daily_rollup_insert",
+                  "expense_monthly_rollup_insert", "expense_monthly_rollup_update",
+                  "expense_yearly_rollup_insert", "expense_yearly_rollup_update")
+
+CHUNK_TRIGGERS_SQL = f"""
+                     SELECT name, sql
+                     FROM sqlite_master
+                     WHERE type = 'trigger' AND name IN ({", ".join(f"'{name}'" for name in CHUNK_TRIGGERS)})
+                     """
+
+LAST_EXPENSE_ID_SQL = "SELECT IFNULL(MAX(id), 0) FROM expenses"
+
+# Expenses after the given id are the ones the chunk inserted
+INDEX_CHUNK_SQL = """
+                  INSERT INTO expenses_fts (rowid, location)
+                  SELECT id, location FROM expenses WHERE id > ?
+                  """
+
+# {period} is the first day of the day, month or year each expense is in
+ROLLUP_CHUNK_SQL = """
+                   INSERT INTO {table} (user_id, {column}, category_id, payment_method_id, total, count, max_cents)
+                   SELECT IFNULL(user_id, 0), {period}, IFNULL(category_id, 0), IFNULL(payment_method_id, 0),
+                          SUM(amount_cents), COUNT(*), MAX(amount_cents)
+                   FROM expenses
+                   WHERE id > ? AND purchase_day IS NOT NULL
+                   GROUP BY 1, 2, 3, 4
+                   ON CONFLICT (user_id, {column}, category_id, payment_method_id)
+                   DO UPDATE SET total = total + excluded.total, count = count + excluded.count,
+                                 max_cents = MAX(max_cents, excluded.max_cents)
+                   """
+
+ROLLUP_CHUNK_QUERIES = [
+    ROLLUP_CHUNK_SQL.format(
+        table=table,
+        column=column,
+        period=f"CAST(julianday(date(purchase_day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER)" if start else "purchase_day"
+    )
+    for table, column, start in ROLLUP_TABLES
+]
+
+EXISTING_FINGERPRINTS_SQL = """
+                            SELECT fingerprint
+                            FROM expenses
+                            WHERE fingerprint IN (SELECT value FROM json_each(?))
+                            """
+
+# Starts a journal entry for a file, or starts it over if the file was already fully imported
+START_IMPORT_SQL = """
+                   INSERT INTO imports (user_id, file_hash, created_at, updated_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(user_id, file_hash) DO UPDATE
+                   SET byte_offset = 0, rows_committed = 0, inserted = 0, skipped = 0, invalid = 0,
+                       completed = 0, updated_at = excluded.updated_at
+                   WHERE completed = 1
+                   """
+
+GET_IMPORT_SQL = """
+                 SELECT id, byte_offset, rows_committed, inserted, skipped, invalid
+                 FROM imports
+                 WHERE user_id = ? AND file_hash = ?
+                 """
+
+UPDATE_IMPORT_SQL = """
+                    UPDATE imports
+                    SET byte_offset = ?, rows_committed = ?, inserted = ?, skipped = ?, invalid = ?, updated_at = ?
+                    WHERE id = ?
+                    """
+
+FINISH_IMPORT_SQL = "UPDATE imports SET completed = 1, updated_at = ? WHERE id = ?"
+
+# Size of the blocks a file is read in when hashing it
+HASH_BLOCK_SIZE = 1 << 20
+
+CHECK_DUPLICATE_SQL = """
+                      SELECT 1
+                      FROM expenses
+                      WHERE fingerprint = ?
+                      """
+
 def download_expenses_csv(expenses):
     """
-    Download a csv file using a list of expenses
+    Download a csv file using a list of expenses. Rows are written as they are
+    read, so expenses can be streamed from iter_expenses_for_user
 
     Argument:
-        expenses (list): List of tuples that represent the expenses
+        expenses (iterable): Tuples that represent the expenses, in the order of COLUMN_NAMES
     """
     file_path = filedialog.asksaveasfilename(
         defaultextension=".csv",
@@ -24,8 +135,32 @@ def download_expenses_csv(expenses):
         title="Save File As"
     )
     if file_path:
-        df = pd.DataFrame(expenses, columns= COLUMN_NAMES)
-        df.to_csv(file_path, index=False)
+        write_expenses_csv(file_path, expenses)
+
+def write_expenses_csv(file_path, expenses):
+    """
+    Write expenses to a csv file one row at a time
+
+    Arguments:
+        file_path (string): Path to the file
+        expenses (iterable): Tuples that represent the expenses, in the order of COLUMN_NAMES
+    """
+    with open(file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMN_NAMES)
+        writer.writerows(expenses)
+
+def select_csv_file():
+    """
+    Opens a file dialog asking the user to pick a csv file to import
+
+    Returns:
+        string: Path to the file, empty if no file was picked
+    """
+    return filedialog.askopenfilename(
+        filetypes = [("CSV files", "*.csv"), ("All files", "*.*")],
+        title="Select Expenses CSV"
+    )
 
 def open_file(user_id, db):
     """
@@ -35,65 +170,369 @@ def open_file(user_id, db):
     Arguments:
         user_id (int): The user's id
         db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        dict: Report from import_expenses_csv, False if no file was picked or it couldn't be imported
     """
-    file_path = filedialog.askopenfilename(
-        filetypes = [("CSV files", "*.csv"), ("All files", "*.*")],
-        title="Select Expenses CSV"
-    )
+    file_path = select_csv_file()
 
     if file_path:
         return import_expenses_csv(file_path, user_id, db)
     
     return False
 
-def import_expenses_csv(file_path, user_id, db):
+def parse_dates(dates):
+    """
+    Parse a column of dates. ISO dates (2024-01-15) are parsed together, anything
+    else falls back to working out the format of each date
+
+    Argument:
+        dates (pd.Series): Dates as text
+
+    Returns:
+        pd.Series: Parsed dates, NaT where the date isn't valid
+    """
+    parsed = pd.to_datetime(dates, errors="coerce", format="ISO8601")
+
+    others = parsed.isna() & (dates != "")
+    if others.any():
+        parsed[others] = pd.to_datetime(dates[others], errors="coerce", format="mixed")
+
+    return parsed
+
+def parse_amounts(amounts):
     """
-    Import expenses from a csv file
+    Convert a column of amounts to cents, rounding half up the same way as to_cents
+
+    Argument:
+        amounts (pd.Series): Amounts as text
+
+    Returns:
+        pd.Series: Amounts in cents, NA where the amount isn't valid
+    """
+    cleaned = amounts.str.strip().str.replace("$", "", regex=False).str.replace(",", "", regex=False)
+    parts = cleaned.str.extract(AMOUNT_PATTERN)
+    sign, dollars, cents = parts[0], parts[1].fillna(""), parts[2].fillna("")
+
+    valid = parts[1].notna() & ((dollars != "") | (cents != ""))
+
+    # Work with digits so amounts like 0.125 round the same way as Decimal would
+    padded = cents.str.ljust(3, "0")
+    whole = pd.to_numeric(dollars.where(dollars != "", "0"), errors="coerce")
+    result = whole * 100 + pd.to_numeric(padded.str[:2].where(valid, "0")) + (padded.str[2].where(valid, "0") >= "5")
+    result = result.where(sign != "-", -result)
+
+    return result.where(valid).astype("Int64")
+
+def resolve_names(user_id, names, get_for_user, add, db):
+    """
+    Find the ids of category or payment method names, adding the ones the user doesn't have
+
+    Arguments:
+        user_id (int): The user's id
+        names (pd.Series): Names from the file, empty where there is no name
+        get_for_user (function): get_categories_for_user or get_payment_methods_for_user
+        add (function): add_category or add_payment_method
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        pd.Series: Id for each name, NA where there is no name
+    """
+    existing = get_for_user(user_id, db)
+
+    missing = set(names.unique()) - set(existing) - {""}
+    for name in sorted(missing):
+        add(user_id, name, db)
+    if missing:
+        existing = get_for_user(user_id, db)
+
+    ids = pd.DataFrame({"name": list(existing.keys()), "id": list(existing.values())})
+    merged = pd.DataFrame({"name": names}).merge(ids, on="name", how="left")
+
+    return pd.Series(merged["id"].to_numpy(), index=names.index).astype("Int64")
+
+def get_existing_fingerprints(fingerprints, db):
+    """
+    Find which fingerprints already belong to an expense
+
+    Arguments:
+        fingerprints (list): Fingerprints to look for
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        set: The fingerprints that were found
+    """
+    with db.reader() as cur:
+        cur.execute(EXISTING_FINGERPRINTS_SQL, (json.dumps(fingerprints),))
+        return {fingerprint for fingerprint, in cur.fetchall()}
+
+def get_file_hash(file_path):
+    """
+    Hash the contents of a file, so an import can be found again even if the file
+    was moved or renamed
+
+    Argument:
+        file_path (string): Path to the file
+
+    Returns:
+        string: Hex digest of the file's contents
+    """
+    file_hash = hashlib.blake2b()
+    with open(file_path, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+def start_import(user_id, file_hash, db):
+    """
+    Find where the last import of a file got to in the imports journal, or start a new
+    entry. Imports that finished start over, so a file can be imported again after its
+    expenses were deleted
+
+    Arguments:
+        user_id (int): The user's id
+        file_hash (string): Hash of the file's contents, from get_file_hash
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        tuple: Id of the journal entry, byte offset to carry on from, and the number of
+               rows committed, inserted, skipped and invalid so far
+    """
+    now = datetime.now()
+    with db.transaction():
+        db.con.execute(START_IMPORT_SQL, (user_id, file_hash, now, now))
+        return db.con.execute(GET_IMPORT_SQL, (user_id, file_hash)).fetchone()
+
+def read_csv_chunks(file_path, chunk_size=IMPORT_CHUNK_SIZE, offset=0):
+    """
+    Read a csv file a few rows at a time, so that the whole file never has to be in memory
+
+    Lines are gathered until a row is complete, quoted values can run over several
+    lines, and each chunk is then parsed with the header in front of it
+
+    Arguments:
+        file_path (string): Path to the file
+        chunk_size (int): Number of rows in each chunk, blank lines don't count
+        offset (int): Position in the file, in bytes, of the first row to read. Must be
+                      the start of a row, 0 starts from the first row after the header
+
+    Yields:
+        df (pd.DataFrame): The rows in the chunk, with every value as text
+        offset (int): Position in the file, in bytes, where the next chunk starts
+    """
+    with open(file_path, "rb") as file:
+        header = file.readline()
+        if offset:
+            file.seek(offset)
+
+        while True:
+            lines = []
+            rows = 0
+            quoted = False
+            while rows < chunk_size:
+                line = file.readline()
+                if not line:
+                    break
+
+                lines.append(line)
+
+                # An odd number of quotes opens or closes a quoted value
+                if line.count(b'"') % 2:
+                    quoted = not quoted
+
+                # Blank lines outside quoted values aren't rows, pandas skips them
+                if not quoted and line.strip():
+                    rows += 1
+
+            if not lines:
+                return
+
+            df = pd.read_csv(io.BytesIO(header + b"".join(lines)), dtype=str, keep_default_na=False)
+            yield df, file.tell()
+
+def import_chunk(df, first_row, user_id, db):
+    """
+    Import a chunk of rows from a csv file. Each column is converted all at once,
+    names are turned into ids with a merge, and the rows are inserted with a single
+    executemany. The search index and the daily, monthly and yearly totals are then
+    updated for the whole chunk at once. Must be called inside a transaction
+
+    Rows with the same fingerprint (see expenses.get_fingerprint) as an expense the
+    user already has, or as an earlier row in the chunk, are skipped
+
+    Arguments:
+        df (pd.DataFrame): Rows of the file, with every value as text
+        first_row (int): Row number of the first row in the chunk
+        user_id (int): The user's id
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        inserted (int): Number of expenses added
+        skipped (int): Number of rows that were already there, including rows the
+                       insert ignored because their fingerprint was taken
+        invalid (dict): Row numbers mapped to why the row couldn't be imported
+    """
+    missing = [column for column in COLUMN_NAMES if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    df = df[COLUMN_NAMES].apply(lambda column: column.str.strip())
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+
+    # Parse every column at once
+    dates = parse_dates(df["Date"])
+    df["amount_cents"] = parse_amounts(df["Amount"])
+
+    invalid = {}
+    for row in df.index[dates.isna().to_numpy()]:
+        invalid[int(row)] = f"Invalid date: {df.at[row, 'Date']}"
+    for row in df.index[(df["amount_cents"].isna() & dates.notna()).to_numpy()]:
+        invalid[int(row)] = f"Invalid amount: {df.at[row, 'Amount']}"
+
+    df = df[dates.notna() & df["amount_cents"].notna()]
+    if not len(df):
+        return 0, 0, invalid
+
+    dates = dates[df.index]
+    df["date_of_purchase"] = dates.dt.strftime("%Y-%m-%d")
+    df["purchase_day"] = dates.to_numpy().astype("datetime64[D]").astype(np.int64) + EPOCH_DAY
+
+    df["category_id"] = resolve_names(user_id, df["Category"], get_categories_for_user, add_category, db)
+    df["payment_method_id"] = resolve_names(user_id, df["Payment Method"], get_payment_methods_for_user, add_payment_method, db)
+
+    category_ids = [None if pd.isna(value) else int(value) for value in df["category_id"]]
+    payment_method_ids = [None if pd.isna(value) else int(value) for value in df["payment_method_id"]]
+    amounts = df["amount_cents"].astype(np.int64).tolist()
+    days = df["purchase_day"].tolist()
+    locations = [location or None for location in df["Location"]]
+
+    fingerprints = pd.Series([get_fingerprint(user_id, *contents)
+                              for contents in zip(days, amounts, category_ids, payment_method_ids, locations)])
+
+    # Rows repeated in the chunk, or that the user already has, are skipped
+    existing = get_existing_fingerprints(fingerprints.unique().tolist(), db)
+    duplicate = (fingerprints.duplicated() | fingerprints.isin(existing)).to_numpy()
+
+    created_at = datetime.now()
+    rows = [(user_id, amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, created_at, fingerprint)
+            for amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, fingerprint, is_duplicate
+            in zip(amounts, df["date_of_purchase"], days, payment_method_ids, category_ids, locations, fingerprints, duplicate)
+            if not is_duplicate]
+    # Inserting in order of day keeps the writes to the day indexes close together
+    rows.sort(key=lambda row: row[3])
+
+    last_id = db.con.execute(LAST_EXPENSE_ID_SQL).fetchone()[0]
+    triggers = db.con.execute(CHUNK_TRIGGERS_SQL).fetchall()
+    for name, _ in triggers:
+        db.con.execute(f"DROP TRIGGER {name}")
+
+    inserted = db.con.executemany(IMPORT_EXPENSE_SQL, rows).rowcount
+    db.con.execute(INDEX_CHUNK_SQL, (last_id,))
+    for sql in ROLLUP_CHUNK_QUERIES:
+        db.con.execute(sql, (last_id,))
+
+    for _, sql in triggers:
+        db.con.execute(sql)
+    db.invalidate(user_id)
+
+    # Rows the insert ignored were taken by an expense the lookup above didn't see
+    return inserted, int(duplicate.sum()) + len(rows) - inserted, invalid
+
+def import_expenses_csv(file_path, user_id, db, chunk_size=IMPORT_CHUNK_SIZE, progress=None, cancel=None):
+    """
+    Import expenses from a csv file. The file is read and committed a chunk at a time,
+    so memory use doesn't grow with the size of the file
+
+    Rows that match an expense the user already has, including ones from earlier
+    chunks, are skipped, so importing a file again doesn't add its expenses twice
+
+    Each chunk is committed along with how far into the file the import got, in the
+    imports journal. If an import is stopped part way, by a crash, a cancel or a row
+    that can't be read, importing the same file again carries on after the last chunk
+    that was committed
+
+    Can be run on a worker thread. Setting cancel stops the import and rolls back the
+    chunk being imported, chunks that were already committed are kept
 
     Arguments:
         file_path (string): Path to the file
         user_id (int): The user's id
         db (DatabaseManager): Instance of database manager being used
+        chunk_size (int): Number of rows read and committed at a time
+        progress (function): Called with a copy of the report and the fraction of the
+                             file that was read after each chunk is committed
+        cancel (threading.Event): Stops the import once it is set
+
+    Returns:
+        dict: parsed (int): Number of rows read from the file
+              inserted (int): Number of expenses added
+              skipped (int): Number of rows that were already there
+              invalid (int): Number of rows that couldn't be imported
+              errors (dict): Row numbers mapped to why the row couldn't be imported, for
+                             up to MAX_REPORTED_ERRORS rows. Row numbers start at 1 for
+                             the first row after the header. Only rows read by this
+                             call are included
+              cancelled (bool): True if the import was stopped before the end of the file
+              resumed (int): Number of rows committed by an earlier import of the file
+                             that was carried on from, they are included in the counts
+              False if the file couldn't be imported. Chunks before the one that
+              failed stay imported
     """
+    report = {"parsed": 0, "inserted": 0, "skipped": 0, "invalid": 0, "errors": {}, "cancelled": False, "resumed": 0}
+    size = os.path.getsize(file_path) or 1
+
     try:
-        categories = list(get_categories_for_user(user_id, db).keys())
-        payment_methods = list(get_payment_methods_for_user(user_id, db).keys())
-        df = pd.read_csv(file_path)
-
-        for i, row in df.iterrows():
-            date = row['Date']
-            amount = row['Amount']
-            category = row['Category']
-            payment_method = row['Payment Method']
-            location = row['Location']
-
-            # Formatting date
-            try:
-                date_obj = pd.to_datetime(date)
-                date = date_obj.strftime('%Y-%m-%d')
-            except:
-                print(f"Skipping row {i}: Invalid date format {date}")
-                continue
-
-            # Check if category and payment method already exists
-            if category not in categories:
-                add_category(user_id, category, db)
-
-            if payment_method not in payment_methods:
-                add_payment_method(user_id, payment_method, db)
-
-            category_id = get_category_by_name(category, db)[0][0]
-            payment_method_id = get_payment_method_by_name(payment_method, db)[0][0]
-
-            # Skip duplicates
-            if check_duplicate(user_id, db, date, amount, category_id, payment_method_id, location):
-                continue
-
-            add_expense(user_id, amount, date, payment_method_id, category_id, location, db)
-            
-        return True
+        import_id, offset, *counts = start_import(user_id, get_file_hash(file_path), db)
+        report["parsed"], report["inserted"], report["skipped"], report["invalid"] = counts
+        report["resumed"] = report["parsed"]
+
+        for df, offset in read_csv_chunks(file_path, chunk_size, offset):
+            if cancel is not None and cancel.is_set():
+                report["cancelled"] = True
+                break
+
+            with db.transaction():
+                # SQLite interrupts whatever statement is running once the import is
+                # cancelled, which rolls back the whole chunk
+                if cancel is not None:
+                    db.con.set_progress_handler(cancel.is_set, CANCEL_CHECK_INSTRUCTIONS)
+                try:
+                    inserted, skipped, invalid = import_chunk(df, report["parsed"] + 1, user_id, db)
+                finally:
+                    db.con.set_progress_handler(None, 0)
+
+                # The journal only moves forward if the chunk is committed
+                db.con.execute(UPDATE_IMPORT_SQL, (offset, report["parsed"] + len(df), report["inserted"] + inserted,
+                                                   report["skipped"] + skipped, report["invalid"] + len(invalid),
+                                                   datetime.now(), import_id))
+
+                # Some statements in the chunk swallow their errors, so make sure a chunk
+                # that was cancelled part way through isn't committed
+                if cancel is not None and cancel.is_set():
+                    raise RuntimeError("Import cancelled")
+
+            report["parsed"] += len(df)
+            report["inserted"] += inserted
+            report["skipped"] += skipped
+            report["invalid"] += len(invalid)
+            for row, reason in invalid.items():
+                if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                    report["errors"][row] = reason
+
+            if progress is not None:
+                progress(dict(report, errors=dict(report["errors"])), offset / size)
+
+        if not report["cancelled"]:
+            db.execute_statement(FINISH_IMPORT_SQL, (datetime.now(), import_id))
+
+        return report
 
     except Exception as e:
+        if cancel is not None and cancel.is_set():
+            report["cancelled"] = True
+            return report
+
         print(e)
         return False
     
@@ -115,21 +554,11 @@ def check_duplicate(user_id, db, date_of_purchase, amount, category_id, payment_
               False if not or if was unable to access the database
     """
     try:
-        sql = """
-              SELECT *
-              FROM expenses
-              WHERE
-                user_id = ? AND
-                date_of_purchase = ? AND
-                amount = ? AND
-                category_id = ? AND
-                payment_method_id = ? AND
-                location = ?
-              """
-        
-        vals = (user_id, date_of_purchase, amount, category_id, payment_method_id, location)
-        db.cur.execute(sql, vals)
-        expense = db.cur.fetchone()
+        fingerprint = get_fingerprint(user_id, to_day_ordinal(date_of_purchase), to_cents(amount), category_id, payment_method_id, location)
+        vals = (fingerprint,)
+        with db.reader() as cur:
+            cur.execute(CHECK_DUPLICATE_SQL, vals)
+            expense = cur.fetchone()
 
         return expense is not None
 
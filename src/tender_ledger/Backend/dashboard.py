@@ -3,45 +3,91 @@
 # Purpose - Generates the charts for the dashboard
 
 import datetime
+import numpy as np
 import matplotlib.dates as mdates
 import matplotlib.ticker as mtick
 from matplotlib.figure import Figure
 
-# Defining constants which are the indices of the elements that
-# appear in the expenses list
-CATEGORY_INDEX = 3
-PAYMENT_METHOD_INDEX = 2
-AMOUNT_INDEX = 0
-
 # Styling Constants to have colors of graphs match customtkinter color scheme
 TEXT_COLOR = 'white'
 FACE_COLOR = '#2B2B2B'
 ACCENT_COLOR = '#3B8ED0'
 
-def generate_pie_charts(expenses):
+# Ordinal of 1970-01-01, used for turning day ordinals into NumPy dates
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def sum_by_label(codes, labels, amount_cents):
     """
-    Generates a pie chart for the dashboard page that shows
-    how the expenses are distributed by category and payment method
+    Add up amounts for each label
+
+    Arguments:
+        codes (np.ndarray): Position of each expense's label in labels
+        labels (list): Names the codes point to
+        amount_cents (np.ndarray): Amount of each expense in cents
+
+    Returns:
+        dict: Labels mapped to the total amount in dollars
+    """
+    sums = np.bincount(codes, weights=amount_cents, minlength=len(labels)) / 100
+
+    # Different missing ids share the same label, so add them together
+    totals = {}
+    for label, total in zip(labels, sums.tolist()):
+        totals[label] = totals.get(label, 0) + total
+
+    return totals
+
+def get_spending_totals(columns):
+    """
+    Add up spending by category and by payment method
 
     Argument:
-        expenses (List): List of the user's expenses
+        columns (ExpenseColumns): The user's expenses from get_expense_columns or get_rollup_columns
 
     Returns:
-        category_pie: Pie chart representing distribution by categories
-        payment_method_pie: Pie chart representing distribution by payment methods
+        categories (dict): Category names mapped to the amount spent
+        payment_methods (dict): Payment method names mapped to the amount spent
+    """
+    categories = sum_by_label(columns.category_codes, columns.categories, columns.amount_cents)
+    payment_methods = sum_by_label(columns.payment_method_codes, columns.payment_methods, columns.amount_cents)
+
+    return categories, payment_methods
+
+def get_period_totals(columns, monthly=False):
     """
-    categories = {}
-    payment_methods = {}
+    Add up spending by day or by month
 
-    for expense in expenses:
-        category = expense[CATEGORY_INDEX]  if expense[CATEGORY_INDEX] is not None else "Uncategorized"
-        payment_method = expense[PAYMENT_METHOD_INDEX]  if expense[PAYMENT_METHOD_INDEX] is not None else "Uncategorized"
-        amount = expense[AMOUNT_INDEX]
+    Arguments:
+        columns (ExpenseColumns): The user's expenses from get_expense_columns or get_rollup_columns
+        monthly (bool): True to add up months instead of days
 
-        # Adding up values by expense amounts
-        categories[category] = categories.get(category, 0) + amount
-        payment_methods[payment_method] = payment_methods.get(payment_method, 0) + amount
+    Returns:
+        list: Tuples of the day (as an ordinal, months by their first day) and the amount
+              spent, sorted by day
+    """
+    days = columns.purchase_day.astype(np.int64)
+    if monthly:
+        months = (days - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+        days = months.astype("datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+
+    periods, codes = np.unique(days, return_inverse=True)
+    sums = np.bincount(codes, weights=columns.amount_cents, minlength=len(periods)) / 100
+
+    return list(zip(periods.tolist(), sums.tolist()))
+
+def generate_pie_charts(categories, payment_methods):
+    """
+    Generates a pie chart for the dashboard page that shows
+    how the expenses are distributed by category and payment method
+
+    Arguments:
+        categories (dict): Category names mapped to the amount spent
+        payment_methods (dict): Payment method names mapped to the amount spent
 
+    Returns:
+        category_pie: Pie chart representing distribution by categories
+        payment_method_pie: Pie chart representing distribution by payment methods
+    """
     # Making pie chart for distribution by categories
     category_pie = Figure(figsize=(4, 3), facecolor=FACE_COLOR)
     category_pie_axes = category_pie.add_subplot(111)
@@ -59,26 +105,20 @@ def generate_pie_charts(expenses):
 
     return category_pie, payment_method_pie
 
-def generate_line_plot(expenses):
+def generate_line_plot(totals, monthly=False):
     """
     Generates a line plot showing how spending is distributed in a date range
 
-    Argument:
-        expenses (List): List of the user's expenses
+    Arguments:
+        totals (List): Tuples of the day (as an ordinal) and the amount spent
+                       that day, sorted by day
+        monthly (bool): True if the totals are for months, given by their first day
 
     Returns:
         line_plot: Line plot representing spending distribution
     """
-    spending = {}
-    # Gather expenses and track amount of spending per day
-    for expense in expenses:
-        date = datetime.datetime.strptime(expense[1], "%Y-%m-%d").date()
-        if date in spending.keys():
-            spending[date] += expense[0]
-        else:
-            spending[date] = expense[0]
-
-    sorted_spending = dict(sorted(spending.items()))
+    # Days are already totaled and sorted by the database
+    sorted_spending = {datetime.date.fromordinal(day): total for day, total in totals}
 
     # Make line plot
     line_plot = Figure(figsize=(4, 3), facecolor=FACE_COLOR)
@@ -90,14 +130,14 @@ def generate_line_plot(expenses):
         line_plot_axes.plot(dates, sorted_spending.values(), marker='o', linestyle='-', color=ACCENT_COLOR, linewidth=2)
 
         # Format the dates
-        date_fmt = mdates.DateFormatter('%b %d')
+        date_fmt = mdates.DateFormatter('%b %Y' if monthly else '%b %d')
         line_plot_axes.xaxis.set_major_formatter(date_fmt)
         line_plot.autofmt_xdate()
 
         # Add grid
         line_plot_axes.grid(True, linestyle='--', linewidth=0.5, color='gray', alpha=0.5)
     
-    line_plot_axes.set_title("Daily Spending", color=TEXT_COLOR)
+    line_plot_axes.set_title("Monthly Spending" if monthly else "Daily Spending", color=TEXT_COLOR)
     line_plot_axes.set_xlabel("Dates", color=TEXT_COLOR)
     line_plot_axes.set_ylabel("Amount", color=TEXT_COLOR)
 
@@ -111,12 +151,12 @@ def generate_line_plot(expenses):
 
     return line_plot
 
-def generate_bar_chart(expenses):
+def generate_bar_chart(categories):
     """
     Generates a horizontal bar chart showing the ranking of categories by total spending
 
     Argument:
-        expenses (List): List of the user's expenses
+        categories (dict): Category names mapped to the amount spent
 
     Returns:
         bar_chart: Bar chart representing spending distribution
@@ -125,14 +165,6 @@ def generate_bar_chart(expenses):
     bar_chart_axes = bar_chart.add_subplot(111)
     bar_chart_axes.set_facecolor(FACE_COLOR)
 
-    categories = {}
-    for expense in expenses:
-        category = expense[CATEGORY_INDEX] if expense[CATEGORY_INDEX] is not None else "Uncategorized"
-        amount = expense[AMOUNT_INDEX]
-
-        # Sum up number of times categories and payment methods were used
-        categories[category] = categories.get(category, 0) + amount
-
     # Sort categories
     spending = dict(sorted(categories.items(), key=lambda item: item[1]))
     cat_names = list(spending.keys())
@@ -2,54 +2,108 @@
 # Filename - database.py
 # Purpose - To setup the database for the Tender Ledger project
 
+import os
 import sqlite3
-from .categories import add_category
-from .payment_methods import add_payment_method
+from contextlib import contextmanager
+from .connection_pool import ConnectionPool
+from .migrations import migrate, insert_defaults, DEFAULT_CATEGORIES, DEFAULT_PAYMENT_METHODS
 from .path_utils import get_database_path
+from .result_cache import ResultCache
 
 # Names of databases
 DB_NAME = "tender_ledger.db"
 TEST_DB_NAME = "test_tender_ledger.db"
 
-DEFAULT_CATEGORIES = ["Food", 
-                      "Utilities", 
-                      "Housing", 
-                      "Healthcare",
-                      "Insurance",
-                      "Entertainment",
-                      "Travel",
-                      "Shopping",
-                      "Other"]
+# Number of prepared statements each connection keeps around for reuse
+STATEMENT_CACHE_SIZE = 256
 
-DEFAULT_PAYMENT_METHODS = ["Cash",
-                           "Credit"]
+# Environment variable that can be used to override the connection profile
+PROFILE_ENV_VAR = "TENDER_LEDGER_DB_PROFILE"
+
+# PRAGMA settings applied every time a connection is opened.
+# cache_size is negative so that it is measured in KiB rather than pages
+CONNECTION_PROFILES = {
+    "prod": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY"
+    },
+    "testing": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16384,
+        "mmap_size": 67108864,
+        "temp_store": "MEMORY"
+    },
+    # SQLite's defaults, kept around as a baseline for benchmarking
+    "legacy": {}
+}
+
+def get_connection_profile(testing, profile=None):
+    """
+    Decide which connection profile should be used
+
+    Arguments:
+        testing (bool): True if the database is for testing purposes
+        profile (string): Name of the profile to use, takes priority over everything else
+
+    Returns:
+        string: Name of the connection profile
+    """
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV_VAR)
+
+    if profile is None:
+        profile = "testing" if testing else "prod"
+
+    if profile not in CONNECTION_PROFILES:
+        raise ValueError(f"Unknown connection profile: {profile}")
+
+    return profile
 
 class DatabaseManager:
-    def __init__(self, testing=False):
+    def __init__(self, testing=False, profile=None, path=None):
         """
         Sets up the database for the Tender Ledger project
 
-        Argument:
+        Arguments:
             testing (bool): If true, set up database for testing purposes
                             Else, set up database for prod
+            profile (string): Name of the connection profile to use. Defaults to the
+                              TENDER_LEDGER_DB_PROFILE environment variable, then to
+                              the profile matching the environment
+            path (string): Custom location of the database file
         """
         name = TEST_DB_NAME if testing else DB_NAME
-        path = get_database_path(testing)
+        if path is None:
+            path = get_database_path(testing)
+        self.profile = get_connection_profile(testing, profile)
+
+        # How many transaction() blocks are currently open
+        self.transaction_depth = 0
+
+        # Results of recent reads, and the users whose cached results need to be dropped
+        # once the open transaction ends
+        self.cache = ResultCache()
+        self.pending_invalidations = set()
+        self.data_version = None
 
         try:
             # Connect to database and create it if it doesn't exist
-            self.con = sqlite3.connect(path)
+            self.pool = ConnectionPool(path, CONNECTION_PROFILES[self.profile], STATEMENT_CACHE_SIZE)
+
+            # The writer connection, only to be used while holding writer() or transaction()
+            self.con = self.pool.writer_connection
             self.cur = self.con.cursor()
 
-            # Build the tables if they don't exist
-            self.set_up_users_table()
-            self.set_up_categories_table()
-            self.set_up_payment_methods_table()
-            self.set_up_expenses_table()
+            # Bring the schema up to date, does nothing if it is already current
+            with self.pool.writer():
+                migrate(self.con)
 
-            # Commit pending transactions to the database then close the connection
-            self.con.commit()
- 
             print("Database", name, "has been connected")
 
         except sqlite3.Error as e:
@@ -59,142 +113,220 @@ class DatabaseManager:
         """
         Close the database's connection if it is open
         """
-        self.con.close()
-
-    def set_up_users_table(self):
-        """
-        Create the table for the users
-        """
-        self.cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users(
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password TEXT NOT NULL,
-                        first_name TEXT,
-                        last_name TEXT,
-                        birthday DATETIME,
-                        email TEXT UNIQUE NOT NULL,
-                        phone INTEGER NOT NULL,
-                        created_at DATETIME,
-                        updated_at DATETIME
-                    )
-                    """)
-        self.con.commit()
-
-    def set_up_categories_table(self):
-        """
-        Create the table for the categories
-        """
-        self.cur.execute("""
-                    CREATE TABLE IF NOT EXISTS categories(
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        name TEXT NOT NULL,
-                        created_at DATETIME,
-                        updated_at DATETIME,
-                    
-                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                        
-                        UNIQUE(user_id, name)
-                    )
-                    """)
-        self.con.commit()
-        
-        
-        # Inserting default categories
-        self.insert_default_categories()
-
-    def set_up_payment_methods_table(self):
-        """
-        Create the table for the payment methods
-        """
-        self.cur.execute("""
-                    CREATE TABLE IF NOT EXISTS payment_methods(
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        name TEXT NOT NULL,
-                        created_at DATETIME,
-                        updated_at DATETIME,
-                    
-                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                         
-                        UNIQUE(user_id, name)
-                    )
-                    """)
-        self.con.commit()
-        
-        # Inserting default payment methods
-        self.insert_default_payment_methods()
-
-    def set_up_expenses_table(self):
-        """
-        Create the table for the expenses
-        """
-        self.cur.execute("""
-                    CREATE TABLE IF NOT EXISTS expenses(
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        amount FLOAT NOT NULL,
-                        date_of_purchase DATETIME NOT NULL,
-                        payment_method_id INTEGER,
-                        category_id INTEGER,
-                        location TEXT,
-                        created_at DATETIME,
-                        updated_at DATETIME,
-                    
-                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                        FOREIGN KEY (payment_method_id) REFERENCES payment_methods(id) ON DELETE SET NULL,
-                        FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
-                    )
-                    """)
-        self.con.commit()
+        # Let SQLite refresh the statistics it uses for choosing indexes
+        with self.pool.writer():
+            self.con.execute("PRAGMA optimize")
+        self.pool.close()
+
+    @contextmanager
+    def reader(self):
+        """
+        Get a cursor for reading inside a with block. Each thread reads through its own
+        connection, so reads are safe to run off the main thread
+
+        Example:
+            with db.reader() as cur:
+                cur.execute("SELECT ...")
+                rows = cur.fetchall()
+        """
+        with self.pool.reader() as con:
+            yield con.cursor()
+
+    @contextmanager
+    def writer(self):
+        """
+        Get a cursor on the single writer connection inside a with block. Other threads
+        wait to write until the block ends. Statements are not committed automatically,
+        use execute_statement or transaction() unless you are managing that yourself
+        """
+        with self.pool.writer() as con:
+            yield con.cursor()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups every statement executed inside the with block into a single unit of work.
+        Backend functions called inside the block join the transaction instead of
+        committing on their own. The transaction is committed once when the block ends
+        and rolled back if an exception is raised.
+
+        Nested blocks use savepoints, so an exception inside an inner block only undoes
+        the inner block's work
+
+        Example:
+            with db.transaction():
+                add_category(user_id, "Groceries", db)
+                add_expense(user_id, "12.50", "2024-01-01", 1, 1, "Market", db)
+        """
+        # Hold the writer for the whole block so no other thread's writes get mixed in
+        with self.pool.writer() as con:
+            savepoint = f"sp_{self.transaction_depth}"
+            if self.transaction_depth == 0:
+                con.execute("BEGIN")
+            else:
+                con.execute(f"SAVEPOINT {savepoint}")
+
+            self.transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    con.rollback()
+                    self.apply_invalidations()
+                else:
+                    con.execute(f"ROLLBACK TO {savepoint}")
+                    con.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                self.transaction_depth -= 1
+                if self.transaction_depth == 0:
+                    con.commit()
+                    self.apply_invalidations()
+                else:
+                    con.execute(f"RELEASE {savepoint}")
+
+    def in_transaction(self):
+        """
+        Checks if statements from the current thread are being grouped by transaction()
+
+        Returns:
+            bool: True if inside a transaction() block
+                  False if not
+        """
+        return self.transaction_depth > 0 and self.pool.holds_writer()
+
+    def cached_read(self, user_id, sql, val):
+        """
+        Run a read query for a user, reusing the result of the same query if the user's
+        data hasn't changed since it last ran. Reads inside a transaction always go to the
+        database since they can see changes that aren't committed yet, as do reads made
+        while another thread is writing
+
+        Arguments:
+            user_id (int): Id of the user the query is for
+            sql (string): The SQL statement to be executed
+            val (list): Values to replace placeholders in the statement
+
+        Returns:
+            list: Rows returned by the query
+        """
+        # Changes committed through another connection aren't seen by invalidate(), so
+        # drop everything if the database changed from outside
+        data_version = None if self.in_transaction() else self.pool.data_version()
+        if data_version is None:
+            with self.reader() as cur:
+                cur.execute(sql, val)
+                return cur.fetchall()
+
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.cache.invalidate()
+
+        rows = self.cache.get(user_id, sql, val)
+        if rows is not None:
+            return rows
+
+        version = self.cache.get_version(user_id)
+        with self.reader() as cur:
+            cur.execute(sql, val)
+            rows = cur.fetchall()
+
+        self.cache.put(user_id, sql, val, rows, version)
+        return rows
+
+    def invalidate(self, *user_ids):
+        """
+        Drop the cached results for users whose data was changed. Inside a transaction
+        this waits until the transaction ends so that other threads can't cache data
+        that is about to change
+
+        Argument:
+            user_ids (int): Ids of the users whose data changed. If none are given, or
+                            one of them is None (shared data such as the default
+                            categories), the results for every user are dropped
+        """
+        if not user_ids or None in user_ids:
+            user_ids = (None,)
+
+        if self.in_transaction():
+            self.pending_invalidations.update(user_ids)
+        else:
+            self.invalidate_users(user_ids)
+
+    def apply_invalidations(self):
+        """
+        Drop the cached results for changes made during the transaction that just ended
+        """
+        user_ids = self.pending_invalidations
+        self.pending_invalidations = set()
+        self.invalidate_users(user_ids)
+
+    def invalidate_users(self, user_ids):
+        """
+        Drop the cached results for a set of users, None meaning every user
+
+        Argument:
+            user_ids (iterable): Ids of the users whose data changed
+        """
+        if None in user_ids:
+            self.cache.invalidate()
+        elif user_ids:
+            self.cache.invalidate(*user_ids)
 
     def clear_tables(self):
         """
         Empty the tables in the database
         """
-        self.cur.execute("DELETE FROM expenses")
-        self.cur.execute("DELETE FROM categories")
-        self.cur.execute("DELETE FROM payment_methods")
-        self.cur.execute("DELETE FROM users")
-        self.con.commit()
+        with self.transaction():
+            self.con.execute("DELETE FROM expenses")
+            self.con.execute("DELETE FROM imports")
+            self.con.execute("DELETE FROM categories")
+            self.con.execute("DELETE FROM payment_methods")
+            self.con.execute("DELETE FROM users")
 
-        # Leave the defaults alone
-        self.insert_default_payment_methods()
-        self.insert_default_categories()
+            # Leave the defaults alone
+            self.insert_default_payment_methods()
+            self.insert_default_categories()
+
+            self.invalidate()
     
     def execute_statement(self, sql, val):
         """
-        Executes a SQL query made by other files
+        Executes a SQL query made by other files. The statement is committed right away
+        unless it is part of a transaction() block
 
         Arugments:
             sql (string): The SQL statement to be executed
             val (tuple): Tuple of values to replace placeholders in the statement
         """
-        try:
-            self.cur.execute(sql, val)
-            self.con.commit()
+        with self.writer() as cur:
+            try:
+                cur.execute(sql, val)
+                if not self.in_transaction():
+                    self.con.commit()
 
-            return True
-        
-        except Exception as e:
-            print(e)
-            return False
+                return True
+            
+            except Exception as e:
+                print(e)
+
+                # Release the write lock held by the failed statement. Inside a transaction
+                # SQLite has already undone the failed statement and the rest is kept
+                if not self.in_transaction():
+                    self.con.rollback()
+                return False
         
     def insert_default_payment_methods(self):
         """
         Insert default payment methods if they don't already exist
         """
-        for payment_method in DEFAULT_PAYMENT_METHODS:
-            self.cur.execute("SELECT id FROM payment_methods WHERE name = ? AND user_id IS NULL", (payment_method,))
-            if self.cur.fetchone() is None:
-                add_payment_method(None, payment_method, self)
+        with self.transaction():
+            insert_defaults(self.con.cursor(), "payment_methods", DEFAULT_PAYMENT_METHODS)
 
     def insert_default_categories(self):
         """
         Insert default categories if they don't already exist
         """
-        for category in DEFAULT_CATEGORIES:
-            self.cur.execute("SELECT id FROM categories WHERE name = ? AND user_id IS NULL", (category,))
-            if self.cur.fetchone() is None:
-                add_category(None, category, self)
\ No newline at end of file
+        with self.transaction():
+            insert_defaults(self.con.cursor(), "categories", DEFAULT_CATEGORIES)
\ No newline at end of file
@@ -0,0 +1,169 @@
+# Author - Daniel Dang
+# Filename - expense_columns.py
+# Purpose - Reads a user's expenses as NumPy arrays, one per column, for charts and analysis
+#
+# A list of tuples costs a Python object per value. Here each column is a single array,
+# so totals by day or category can be worked out with NumPy instead of Python loops.
+# Categories and payment methods are stored as small integer codes that index into a
+# list of names.
+#
+# When only a date range is needed, get_rollup_columns reads the same columns from the
+# rollup tables, where each row already adds up a day (or month) of one category and
+# payment method, so a chart never has to read every expense.
+
+import numpy as np
+from .categories import get_categories_for_user
+from .expenses import get_filters
+from .payment_methods import get_payment_methods_for_user
+from .query_builder import build_query
+from .rollups import UNCATEGORIZED, build_range_query, get_day_range
+
+# Number of rows fetched from the database at a time
+COLUMNS_BATCH_SIZE = 50000
+
+# Number of columns read for each row, see ExpenseColumns
+COLUMN_COUNT = 5
+
+class ExpenseColumns:
+    def __init__(self, amount_cents, purchase_day, category_codes, categories, payment_method_codes, payment_methods, counts):
+        """
+        Holds a user's expenses as columns
+
+        Arguments:
+            amount_cents (np.ndarray): Amount of each expense in cents
+            purchase_day (np.ndarray): Day of purchase of each expense as a day ordinal
+            category_codes (np.ndarray): Position of each expense's category in categories
+            categories (list): Category names
+            payment_method_codes (np.ndarray): Position of each expense's payment method in payment_methods
+            payment_methods (list): Payment method names
+            counts (np.ndarray): Number of expenses each row adds up, 1 unless read from the rollups
+        """
+        self.amount_cents = amount_cents
+        self.purchase_day = purchase_day
+        self.category_codes = category_codes
+        self.categories = categories
+        self.payment_method_codes = payment_method_codes
+        self.payment_methods = payment_methods
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.amount_cents)
+
+    @property
+    def amounts(self):
+        """
+        Amount of each expense in dollars
+        """
+        return self.amount_cents / 100
+
+def encode(ids, names):
+    """
+    Turn a column of ids into small integer codes and a list of names
+
+    Arguments:
+        ids (np.ndarray): Category or payment method id of each expense, 0 if missing
+        names (dict): Ids mapped to their names
+
+    Returns:
+        codes (np.ndarray): Position of each expense's name in labels
+        labels (list): Names of the ids that appear, missing ids are UNCATEGORIZED
+    """
+    unique_ids, codes = np.unique(ids, return_inverse=True)
+    labels = [names.get(int(i), UNCATEGORIZED) for i in unique_ids]
+
+    dtype = np.int16 if len(labels) <= np.iinfo(np.int16).max else np.int32
+    return codes.astype(dtype), labels
+
+def to_columns(user_id, db, data):
+    """
+    Split rows read from the database into columns
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        data (np.ndarray): One row per expense (or rollup row) of the amount in cents, day,
+                           category id, payment method id and number of expenses
+
+    Returns:
+        ExpenseColumns: The rows as columns
+    """
+    # Names are looked up by id, the dictionaries from the Backend go from name to id
+    category_names = {category_id: name for name, category_id in get_categories_for_user(user_id, db).items()}
+    method_names = {method_id: name for name, method_id in get_payment_methods_for_user(user_id, db).items()}
+
+    category_codes, categories = encode(data[:, 2], category_names)
+    payment_method_codes, payment_methods = encode(data[:, 3], method_names)
+
+    return ExpenseColumns(
+        data[:, 0].copy(),
+        data[:, 1].astype(np.int32),
+        category_codes,
+        categories,
+        payment_method_codes,
+        payment_methods,
+        data[:, 4].astype(np.int32)
+    )
+
+def get_expense_columns(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Gets a user's expenses as columns, ordered by day of purchase
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        ExpenseColumns: The user's expenses, empty if they couldn't be read
+    """
+    batches = []
+    try:
+        filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+        sql, val = build_query("expense_columns", user_id, **filters)
+
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            while True:
+                rows = cur.fetchmany(COLUMNS_BATCH_SIZE)
+                if not rows:
+                    break
+                batches.append(np.array(rows, dtype=np.int64))
+    except Exception as e:
+        print(e)
+        batches = []
+
+    data = np.concatenate(batches) if batches else np.empty((0, COLUMN_COUNT), dtype=np.int64)
+    return to_columns(user_id, db, data)
+
+def get_rollup_columns(user_id, db, start_date=None, end_date=None, largest="day"):
+    """
+    Gets a user's spending in a date range as columns from the rollups. Each row is the
+    total of one day, category and payment method, so amount_cents holds totals and
+    counts holds how many expenses went into them
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        largest (string): Largest period a row can cover, "day", "month" or "year".
+                          Rows for longer periods are given by their first day
+
+    Returns:
+        ExpenseColumns: The user's spending ordered by day, empty if it couldn't be read
+    """
+    try:
+        sql, val = build_range_query("columns", user_id, *get_day_range(start_date, end_date), largest=largest)
+        rows = db.cached_read(user_id, sql, val)
+    except Exception as e:
+        print(e)
+        rows = []
+
+    data = np.array(rows, dtype=np.int64).reshape(-1, COLUMN_COUNT)
+    return to_columns(user_id, db, data)
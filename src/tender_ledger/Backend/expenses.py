@@ -2,7 +2,160 @@
 # Filename - expenses.py
 # Purpose - Handles adding, updating, and deleting expenses
 
-from datetime import datetime
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from .query_builder import DEFAULT_ORDER, build_query
+from .search import parse_search
+
+# Amounts are stored as an integer number of cents
+CENTS = Decimal("0.01")
+
+# Number of rows written per executemany call by the bulk functions
+BULK_CHUNK_SIZE = 10000
+
+# Number of expenses shown on a page of the expenses table
+PAGE_SIZE = 20
+
+# Number of rows fetched at a time by iter_expenses_for_user
+STREAM_BATCH_SIZE = 1000
+
+# Number of ids per DELETE ... WHERE id IN (...) statement, kept under SQLite's variable limit
+ID_CHUNK_SIZE = 500
+
+# The fingerprint (see get_fingerprint) is only stored if no other expense has it yet, so
+# expenses entered twice on purpose are still allowed
+INSERT_EXPENSE_SQL = """
+                     INSERT INTO expenses (user_id, amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, created_at, fingerprint)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, (SELECT ? WHERE NOT EXISTS (SELECT 1 FROM expenses WHERE fingerprint = ?)))
+                     """
+
+UPDATE_EXPENSE_SQL = """
+                     UPDATE expenses
+                     SET 
+                       amount_cents = ?,
+                       date_of_purchase = ?,
+                       purchase_day = ?,
+                       payment_method_id = ?,
+                       category_id = ?,
+                       location = ?,
+                       updated_at = ?,
+                       fingerprint = (SELECT ? WHERE NOT EXISTS (SELECT 1 FROM expenses WHERE fingerprint = ? AND id != ?))
+                     WHERE id = ?
+                     """
+
+# Expenses that hold a fingerprint, read before they are deleted or changed so that the
+# fingerprint can be passed on to a copy of them (see pass_on_fingerprints)
+FINGERPRINTED_EXPENSES_SQL = """
+                             SELECT fingerprint, user_id, purchase_day, amount_cents, category_id, payment_method_id
+                             FROM expenses
+                             WHERE id IN (SELECT value FROM json_each(?)) AND fingerprint IS NOT NULL
+                             """
+
+# Copies without a fingerprint, their locations still have to be compared in Python
+FINGERPRINT_COPIES_SQL = """
+                         SELECT id, location
+                         FROM expenses
+                         WHERE user_id IS ? AND purchase_day = ? AND amount_cents = ?
+                           AND IFNULL(category_id, 0) = IFNULL(?, 0) AND IFNULL(payment_method_id, 0) = IFNULL(?, 0)
+                           AND fingerprint IS NULL
+                         ORDER BY id
+                         """
+
+def to_cents(amount):
+    """
+    Convert an amount of money to an integer number of cents
+
+    Argument:
+        amount (string, int, float): Amount of money in dollars, such as "12.50" or 12.5
+
+    Returns:
+        int: The amount in cents, rounded half up
+
+    Raises:
+        ValueError: If the amount is not a valid number
+    """
+    if isinstance(amount, str):
+        amount = amount.strip().replace("$", "").replace(",", "")
+
+    try:
+        # Going through str() keeps floats like 0.1 from picking up binary noise
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {amount}")
+
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {amount}")
+
+    return int(value.quantize(CENTS, rounding=ROUND_HALF_UP) * 100)
+
+def from_cents(cents):
+    """
+    Convert an integer number of cents to dollars
+
+    Argument:
+        cents (int): Amount of money in cents
+
+    Returns:
+        float: Amount of money in dollars
+    """
+    return cents / 100
+
+def to_day_ordinal(value):
+    """
+    Convert a date to the integer day stored in the purchase_day column
+
+    Argument:
+        value (date, datetime, string): The date, strings must start with YYYY-MM-DD
+
+    Returns:
+        int: Number of days since 0001-01-01, the same as date.toordinal()
+
+    Raises:
+        ValueError: If the value is not a valid date
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value.strip()[:10])
+    elif not isinstance(value, date):
+        raise ValueError(f"Invalid date: {value}")
+
+    return value.toordinal()
+
+def from_day_ordinal(day):
+    """
+    Convert the integer day stored in the purchase_day column back to a date
+
+    Argument:
+        day (int): Number of days since 0001-01-01
+
+    Returns:
+        date: The matching date
+    """
+    return date.fromordinal(day)
+
+def get_fingerprint(user_id, purchase_day, amount_cents, category_id, payment_method_id, location):
+    """
+    Get a hash of what an expense contains, used to find expenses that were already imported.
+    Missing categories and payment methods count as 0, and locations are compared without
+    case or extra spaces, with a missing location the same as an empty one
+
+    Arguments:
+        user_id (int): The user's id
+        purchase_day (int): Day of purchase (see to_day_ordinal)
+        amount_cents (int): Amount of the purchase in cents
+        category_id (int): Expense's category
+        payment_method_id (int): Payment method used for expense
+        location (string): Other details about the expense
+
+    Returns:
+        int: 64-bit fingerprint of the expense
+    """
+    location = " ".join((location or "").split()).casefold()
+    key = f"{user_id}|{purchase_day}|{amount_cents}|{category_id or 0}|{payment_method_id or 0}|{location}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
 
 def add_expense(user_id, amount, date_of_purchase, payment_method_id, category_id, location, db):
     """
@@ -10,7 +163,7 @@ def add_expense(user_id, amount, date_of_purchase, payment_method_id, category_i
 
     Arguments:
         user_id (int): The user's id
-        amount (float): Amount of the purchase
+        amount (float, string): Amount of the purchase in dollars
         date_of_purchase (string): Date when purchase was made
         payment_method_id (int): Payment method used for expense
         category_id (int): Expense's category
@@ -21,18 +174,28 @@ def add_expense(user_id, amount, date_of_purchase, payment_method_id, category_i
         bool: True if able to add expense
               False if not
     """
+    try:
+        amount_cents = to_cents(amount)
+        purchase_day = to_day_ordinal(date_of_purchase)
+    except ValueError as e:
+        print(e)
+        return False
+
     created_at = datetime.now()
-    sql = "INSERT INTO expenses (user_id, amount, date_of_purchase, payment_method_id, category_id, location, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
-    val = (user_id, amount, date_of_purchase, payment_method_id, category_id, location, created_at)
+    fingerprint = get_fingerprint(user_id, purchase_day, amount_cents, category_id, payment_method_id, location)
+    val = (user_id, amount_cents, date_of_purchase, purchase_day, payment_method_id, category_id, location, created_at,
+           fingerprint, fingerprint)
 
-    return db.execute_statement(sql, val)
+    added = db.execute_statement(INSERT_EXPENSE_SQL, val)
+    db.invalidate(user_id)
+    return added
 
 def update_expense(amount, date_of_purchase, payment_method_id, category_id, location, expense_id, db):
     """
     Update an expense for the user
 
     Arguments:
-        amount (float): Amount of the purchase
+        amount (float, string): Amount of the purchase in dollars
         date_of_purchase (string): Date when purchase was made
         payment_method_id (int): Payment method used for expense
         category_id (int): Expense's category
@@ -44,21 +207,31 @@ def update_expense(amount, date_of_purchase, payment_method_id, category_id, loc
         bool: True if able to update expense
               False if not
     """
-    sql = """
-          UPDATE expenses
-          SET 
-            amount = ?,
-            date_of_purchase = ?,
-            payment_method_id = ?,
-            category_id = ?,
-            location = ?,
-            updated_at = ?
-          WHERE id = ?
-          """
+    try:
+        amount_cents = to_cents(amount)
+        purchase_day = to_day_ordinal(date_of_purchase)
+    except ValueError as e:
+        print(e)
+        return False
+
     updated_at = datetime.now()
-    val=(amount,date_of_purchase,payment_method_id,category_id,location,updated_at,expense_id)
+    owners = get_expense_owners([expense_id], db)
+    fingerprint = get_fingerprint(owners.get(expense_id), purchase_day, amount_cents, category_id, payment_method_id, location)
+    val=(amount_cents,date_of_purchase,purchase_day,payment_method_id,category_id,location,updated_at,
+         fingerprint,fingerprint,expense_id,expense_id)
 
-    return db.execute_statement(sql, val)
+    try:
+        with db.transaction():
+            fingerprinted = get_fingerprinted_expenses([expense_id], db)
+            updated = db.execute_statement(UPDATE_EXPENSE_SQL, val)
+            pass_on_fingerprints(fingerprinted, db)
+    except Exception as e:
+        print(e)
+        updated = False
+
+    if owners:
+        db.invalidate(*owners.values())
+    return updated
 
 def delete_expense(id, db):
     """
@@ -78,7 +251,265 @@ def delete_expense(id, db):
           """
     val = (id,)
 
-    return db.execute_statement(sql, val)
+    owners = get_expense_owners([id], db)
+    try:
+        with db.transaction():
+            fingerprinted = get_fingerprinted_expenses([id], db)
+            deleted = db.execute_statement(sql, val)
+            pass_on_fingerprints(fingerprinted, db)
+    except Exception as e:
+        print(e)
+        deleted = False
+
+    if owners:
+        db.invalidate(*owners.values())
+    return deleted
+
+def get_fingerprinted_expenses(ids, db):
+    """
+    Get what the expenses holding a fingerprint contain, before they are deleted or changed
+
+    Arguments:
+        ids (list): IDs of the expenses
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        list: Tuples of the fingerprint, user_id, purchase_day, amount_cents, category_id and
+              payment_method_id of each expense that has a fingerprint
+    """
+    with db.reader() as cur:
+        cur.execute(FINGERPRINTED_EXPENSES_SQL, (json.dumps(ids),))
+        return cur.fetchall()
+
+def pass_on_fingerprints(fingerprinted, db):
+    """
+    Give fingerprints that no expense holds anymore to a remaining copy of the expense
+    that had it, so imports still find the copies. Only the first copy of an expense
+    gets the fingerprint, so once it is deleted or changed the next copy takes over.
+    Must be called in the same transaction() block as the delete or update
+
+    Arguments:
+        fingerprinted (list): Expenses from get_fingerprinted_expenses, read before the change
+        db (DatabaseManager): Instance of database manager being used
+    """
+    for fingerprint, user_id, purchase_day, amount_cents, category_id, payment_method_id in fingerprinted:
+        # Still held, either the expense kept its contents or another one took it
+        if db.con.execute("SELECT 1 FROM expenses WHERE fingerprint = ?", (fingerprint,)).fetchone():
+            continue
+
+        copies = db.con.execute(FINGERPRINT_COPIES_SQL, (user_id, purchase_day, amount_cents, category_id, payment_method_id)).fetchall()
+        for expense_id, location in copies:
+            if get_fingerprint(user_id, purchase_day, amount_cents, category_id, payment_method_id, location) == fingerprint:
+                db.con.execute("UPDATE expenses SET fingerprint = ? WHERE id = ?", (fingerprint, expense_id))
+                break
+
+def chunks(items, size):
+    """
+    Split a sequence into lists of at most size items
+
+    Arguments:
+        items (iterable): Items to split up
+        size (int): Maximum number of items per chunk
+
+    Returns:
+        generator: Lists of (index, item) pairs, the index being the item's position in items
+    """
+    chunk = []
+    for pair in enumerate(items):
+        chunk.append(pair)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def write_rows(sql, rows, db):
+    """
+    Write rows with a single executemany. If the batch fails, fall back to writing the
+    rows one by one so that a single bad row doesn't stop the rest
+
+    Arguments:
+        sql (string): The SQL statement to be executed for each row
+        rows (list): Pairs of the row's position and the values for the statement
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        dict: Position of each row mapped to True if it was written, False if not
+    """
+    try:
+        with db.transaction():
+            db.con.executemany(sql, [val for _, val in rows])
+        return {index: True for index, _ in rows}
+    except Exception:
+        return {index: db.execute_statement(sql, val) for index, val in rows}
+
+def add_expenses(expenses, db):
+    """
+    Add many expenses in a single transaction
+
+    Arguments:
+        expenses (iterable): Tuples of (user_id, amount, date_of_purchase, payment_method_id,
+                             category_id, location), the same arguments as add_expense
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        list: True or False for each expense, in the same order, depending on if it was added
+    """
+    expenses = list(expenses)
+    results = []
+    created_at = datetime.now()
+
+    try:
+        with db.transaction():
+            for chunk in chunks(expenses, BULK_CHUNK_SIZE):
+                outcomes = {}
+                rows = []
+
+                # Convert amounts and dates, rows that can't be converted are not added
+                for index, (user_id, amount, date_of_purchase, payment_method_id, category_id, location) in chunk:
+                    try:
+                        amount_cents = to_cents(amount)
+                        purchase_day = to_day_ordinal(date_of_purchase)
+                        fingerprint = get_fingerprint(user_id, purchase_day, amount_cents, category_id, payment_method_id, location)
+                        val = (user_id, amount_cents, date_of_purchase, purchase_day,
+                               payment_method_id, category_id, location, created_at, fingerprint, fingerprint)
+                        rows.append((index, val))
+                    except ValueError as e:
+                        print(e)
+                        outcomes[index] = False
+
+                outcomes.update(write_rows(INSERT_EXPENSE_SQL, rows, db))
+                results.extend(outcomes[index] for index, _ in chunk)
+
+                users = {val[0] for _, val in rows}
+                if users:
+                    db.invalidate(*users)
+
+    except Exception as e:
+        print(e)
+        return [False] * len(expenses)
+
+    return results
+
+def update_expenses(expenses, db):
+    """
+    Update many expenses in a single transaction
+
+    Arguments:
+        expenses (iterable): Tuples of (amount, date_of_purchase, payment_method_id, category_id,
+                             location, expense_id), the same arguments as update_expense
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        list: True or False for each expense, in the same order, depending on if it was updated.
+              Expenses that don't exist are False
+    """
+    expenses = list(expenses)
+    results = []
+    updated_at = datetime.now()
+
+    try:
+        with db.transaction():
+            for chunk in chunks(expenses, BULK_CHUNK_SIZE):
+                outcomes = {}
+                rows = []
+
+                for index, (amount, date_of_purchase, payment_method_id, category_id, location, expense_id) in chunk:
+                    try:
+                        val = (to_cents(amount), date_of_purchase, to_day_ordinal(date_of_purchase),
+                               payment_method_id, category_id, location, updated_at, expense_id)
+                        rows.append((index, val))
+                    except ValueError as e:
+                        print(e)
+                        outcomes[index] = False
+
+                # Only expenses that exist can be updated
+                existing = get_expense_owners([val[-1] for _, val in rows], db)
+                for index, val in rows:
+                    if val[-1] not in existing:
+                        outcomes[index] = False
+
+                # The owner of each expense is part of its fingerprint
+                updates = []
+                for index, val in rows:
+                    if val[-1] in existing:
+                        amount_cents, _, purchase_day, payment_method_id, category_id, location, _, expense_id = val
+                        fingerprint = get_fingerprint(existing[expense_id], purchase_day, amount_cents, category_id, payment_method_id, location)
+                        updates.append((index, val[:-1] + (fingerprint, fingerprint, expense_id, expense_id)))
+                rows = updates
+
+                fingerprinted = get_fingerprinted_expenses([val[-1] for _, val in rows], db)
+                outcomes.update(write_rows(UPDATE_EXPENSE_SQL, rows, db))
+                pass_on_fingerprints(fingerprinted, db)
+                results.extend(outcomes[index] for index, _ in chunk)
+
+                if existing:
+                    db.invalidate(*existing.values())
+
+    except Exception as e:
+        print(e)
+        return [False] * len(expenses)
+
+    return results
+
+def delete_expenses(ids, db):
+    """
+    Delete many expenses in a single transaction
+
+    Arguments:
+        ids (iterable): IDs of the expenses
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        list: True or False for each id, in the same order, depending on if it was deleted.
+              Expenses that don't exist are False
+    """
+    ids = list(ids)
+    results = []
+
+    try:
+        with db.transaction():
+            for chunk in chunks(ids, ID_CHUNK_SIZE):
+                chunk_ids = [expense_id for _, expense_id in chunk]
+                existing = get_expense_owners(chunk_ids, db)
+
+                fingerprinted = get_fingerprinted_expenses(chunk_ids, db)
+                placeholders = ", ".join("?" * len(chunk_ids))
+                db.con.execute(f"DELETE FROM expenses WHERE id IN ({placeholders})", chunk_ids)
+                pass_on_fingerprints(fingerprinted, db)
+
+                if existing:
+                    db.invalidate(*existing.values())
+
+                results.extend(expense_id in existing for expense_id in chunk_ids)
+
+    except Exception as e:
+        print(e)
+        return [False] * len(ids)
+
+    return results
+
+def get_expense_owners(ids, db):
+    """
+    Find which of the given expense ids exist and the users they belong to
+
+    Arguments:
+        ids (list): IDs of the expenses
+        db (DatabaseManager): Instance of database manager being used
+
+    Returns:
+        dict: IDs that exist in the expenses table mapped to the id of their user
+    """
+    owners = {}
+    for chunk in chunks(ids, ID_CHUNK_SIZE):
+        chunk_ids = [expense_id for _, expense_id in chunk]
+        placeholders = ", ".join("?" * len(chunk_ids))
+        with db.reader() as cur:
+            cur.execute(f"SELECT id, user_id FROM expenses WHERE id IN ({placeholders})", chunk_ids)
+            owners.update(cur.fetchall())
+
+    return owners
 
 def get_expense(id, db):
     """
@@ -93,7 +524,7 @@ def get_expense(id, db):
     """
     select_clause = """
                     SELECT
-                        e.amount,
+                        e.amount_cents / 100.0 AS amount,
                         e.date_of_purchase,
                         p.name AS payment_method_name,
                         c.name AS category_name,
@@ -114,13 +545,96 @@ def get_expense(id, db):
 
     sql = select_clause + where_clause
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
         return []
 
-def get_expenses_for_user(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, order=None):
+def get_id_filter(ids):
+    """
+    Decide how to filter by one or more category or payment method ids. A single id is
+    compared directly, several are passed to the database as one JSON list
+
+    Argument:
+        ids (int, list): An id, a list of ids, or None
+
+    Returns:
+        single (int): The id if only one is being filtered by
+        several (string): JSON list of the ids if more than one is being filtered by
+    """
+    if ids is None or isinstance(ids, int):
+        return ids, None
+
+    ids = sorted(set(ids))
+    if not ids:
+        return None, None
+    if len(ids) == 1:
+        return ids[0], None
+
+    return None, json.dumps(ids)
+
+def get_filters(start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Convert the filters used by the pages into the filters used by the query builder
+
+    Arguments:
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        dict: Filters for query_builder.build_query
+
+    Raises:
+        ValueError: If an amount or date is not valid
+    """
+    filters = {
+        "start_day": to_day_ordinal(start_date) if start_date else None,
+        "end_day": to_day_ordinal(end_date) if end_date else None,
+        "min_cents": to_cents(min_amount) if min_amount not in (None, "") else None,
+        "max_cents": to_cents(max_amount) if max_amount not in (None, "") else None,
+        **parse_search(search)
+    }
+
+    filters["category"], filters["categories"] = get_id_filter(category)
+    filters["payment_method"], filters["payment_methods"] = get_id_filter(payment_method)
+
+    return filters
+
+def build_expenses_query(user_id, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None, order=None, descending=True):
+    """
+    Build the query used for getting a user's expenses
+
+    Arguments:
+        user_id (int): Id of the user
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+        order (string): Column being sorted, one of date, amount, category, payment_method
+                        or location. Defaults to date
+        descending (bool): True to sort from highest to lowest
+
+    Returns:
+        sql (string): The SQL statement to be executed
+        val (list): Values to replace placeholders in the statement
+
+    Raises:
+        ValueError: If an amount or date in the filters is not valid
+    """
+    filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+    return build_query("expenses", user_id, order or DEFAULT_ORDER, descending, **filters)
+
+def get_expenses_for_user(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None, order=None, descending=True):
     """
     Gets all expenses for a user
 
@@ -129,74 +643,167 @@ def get_expenses_for_user(user_id, db, start_date=None, end_date=None, category=
         db (DatabaseManager): Instance of database manager being used
         start_date (string): Start date for searching
         end_date (string): End date for searching
-        category (int): Category being searched for
-        payment_method (int): Payment method being searched for
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
         search (string): Term being searched for from search bar
-        order: Column being sorted
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+        order (string): Column being sorted, one of date, amount, category, payment_method
+                        or location. Defaults to date
+        descending (bool): True to sort from highest to lowest
 
     Returns:
         list: List of the user's expenses
     """
-    select_clause = """
-                    SELECT
-                        e.amount,
-                        e.date_of_purchase,
-                        p.name AS payment_method_name,
-                        c.name AS category_name,
-                        e.location,
-                        e.id
-                    FROM
-                        expenses e
-                    LEFT JOIN
-                        categories c ON e.category_id = c.id
-                    LEFT JOIN
-                        payment_methods p ON e.payment_method_id = p.id
-                    """
-    where_clause = """
-                    WHERE
-                        e.user_id = ?
-                   """
-    order_by_clause = """
-                      ORDER BY
-                        e.date_of_purchase DESC
-                      """
-    val = [user_id,]
-
-    # Handling filtering
-    if start_date:
-        where_clause += ("AND e.date_of_purchase >= ?")
-        val.append(start_date)
-    
-    if end_date:
-        where_clause += (" AND e.date_of_purchase <= ?")
-        val.append(end_date)
+    # Execute the sql query, malformed dates or amounts in the filters are errors too
+    try:
+        sql, val = build_expenses_query(user_id, start_date, end_date, category, payment_method, search, min_amount, max_amount, order, descending)
+        return db.cached_read(user_id, sql, val)
+    except Exception as e:
+        print(e)
+        return []
+
+def iter_expenses_for_user(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None, order=None, descending=True, batch_size=STREAM_BATCH_SIZE):
+    """
+    Go through a user's expenses without loading them all at once. Rows are fetched
+    in batches from a cursor of their own, so memory stays the same however many
+    expenses match
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+        order (string): Column being sorted, one of date, amount, category, payment_method
+                        or location. Defaults to date
+        descending (bool): True to sort from highest to lowest
+        batch_size (int): Number of rows fetched from the database at a time
 
-    if category:
-        where_clause += (" AND e.category_id = ?")
-        val.append(category)
+    Yields:
+        tuple: One expense, in the same format as get_expenses_for_user
+    """
+    try:
+        sql, val = build_expenses_query(user_id, start_date, end_date, category, payment_method, search, min_amount, max_amount, order, descending)
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+    except Exception as e:
+        print(e)
 
-    if payment_method:
-        where_clause += (" AND e.payment_method_id = ?")
-        val.append(payment_method)
+# How to get the value an expense is sorted by from a row returned by get_expenses_page,
+# in the same form as the query builder's ORDERS
+PAGE_KEYS = {
+    "date": lambda expense: to_day_ordinal(expense[1]),
+    "amount": lambda expense: to_cents(expense[0]),
+    "category": lambda expense: expense[3] or "",
+    "payment_method": lambda expense: expense[2] or "",
+    "location": lambda expense: expense[4] or "",
+}
 
-    if search:
-        where_clause += (" AND (e.amount LIKE ? OR e.location LIKE ? OR e.date_of_purchase LIKE ?)")
-        val.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+def get_page_key(expense, order=DEFAULT_ORDER):
+    """
+    Get the key of an expense that the next page starts after
 
-    # Handling sorting by columns
-    if order:
-        pass
-    
-    # Execute the sql query
-    sql = select_clause + where_clause + order_by_clause
+    Arguments:
+        expense (tuple): An expense in the format returned by get_expenses_page
+        order (string): Column the page is sorted by
+
+    Returns:
+        tuple: The value the expense is sorted by and its id
+    """
+    return (PAGE_KEYS[order](expense), expense[-1])
+
+def get_expenses_page(user_id, db, filters=None, after=None, limit=PAGE_SIZE, order=DEFAULT_ORDER, descending=True):
+    """
+    Gets a page of a user's expenses. Pages are found by where the previous page
+    ended instead of by an offset, so getting any page only reads the rows on it
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        filters (dict): Same filters as get_expenses_for_user, such as start_date or category
+        after (tuple): Key of the last expense on the previous page from get_page_key,
+                       None for the first page
+        limit (int): Maximum number of expenses on the page
+        order (string): Column being sorted, one of date, amount, category, payment_method
+                        or location
+        descending (bool): True to sort from highest to lowest
+
+    Returns:
+        list: List of the user's expenses on the page
+    """
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        query_filters = get_filters(**(filters or {}))
+        query_filters["after"] = after
+
+        sql, val = build_query("expenses_page", user_id, order, descending, **query_filters)
+        val.append(limit)
+
+        return db.cached_read(user_id, sql, val)
     except Exception as e:
         print(e)
         return []
+
+def get_expense_count(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Gets the number of expenses a user has
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        int: Number of expenses matching the filters
+    """
+    try:
+        filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+        sql, val = build_query("expense_count", user_id, **filters)
+        return db.cached_read(user_id, sql, val)[0][0]
+    except Exception as e:
+        print(e)
+        return 0
+
+def build_total_spending_query(user_id, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Build the query used for getting a user's total spending
+
+    Arguments:
+        user_id (int): Id of the user
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        sql (string): The SQL statement to be executed
+        val (list): Values to replace placeholders in the statement
+
+    Raises:
+        ValueError: If an amount or date in the filters is not valid
+    """
+    filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+    return build_query("total_spending", user_id, **filters)
     
-def get_total_spending(user_id, db, start_date=None, end_date=None):
+def get_total_spending(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
     """
     Gets the total spending for a user
 
@@ -205,37 +812,114 @@ def get_total_spending(user_id, db, start_date=None, end_date=None):
         db (DatabaseManager): Instance of database manager being used
         start_date (string): Start date for searching
         end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
 
     Returns:
         float: Total spending for a user
     """
-    select_clause = """
-          SELECT
-              COALESCE(SUM(amount), 0)
-          FROM
-              expenses
-          """
-    where_clause = """
-                   WHERE user_id = ?
-                   """
-    start_clause = ""
-    end_clause = ";"
+    # Execute the sql query
+    try:
+        sql, val = build_total_spending_query(user_id, start_date, end_date, category, payment_method, search, min_amount, max_amount)
+        return from_cents(db.cached_read(user_id, sql, val)[0][0])
+    except Exception as e:
+        print(e)
+        return 0
 
-    val = [user_id]
-    # Handle date filters
-    if start_date:
-        start_clause = " AND date_of_purchase >= ?"
-        val.append(start_date)
+def get_spending_summary(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Gets summary statistics of a user's spending with a single query
 
-    if end_date:
-        end_clause = " AND date_of_purchase <= ?;"
-        val.append(end_date)
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
 
-    # Execute the sql query
-    sql = select_clause + where_clause + start_clause + end_clause
+    Returns:
+        dict: count (int): Number of expenses
+              total (float): Total spending
+              first_date (date): Date of the earliest expense, None if there are no expenses
+              last_date (date): Date of the latest expense, None if there are no expenses
+              average (float): Average amount of an expense
+              largest (float): Amount of the largest expense
+    """
+    summary = {"count": 0, "total": 0, "first_date": None, "last_date": None, "average": 0, "largest": 0}
+
+    try:
+        filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+        sql, val = build_query("spending_summary", user_id, **filters)
+        count, total, first_day, last_day, average, largest = db.cached_read(user_id, sql, val)[0]
+    except Exception as e:
+        print(e)
+        return summary
+
+    if count:
+        summary.update({
+            "count": count,
+            "total": from_cents(total),
+            "first_date": from_day_ordinal(first_day),
+            "last_date": from_day_ordinal(last_day),
+            "average": from_cents(average),
+            "largest": from_cents(largest)
+        })
+
+    return summary
+
+def build_daily_totals_query(user_id, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Build the query used for getting a user's spending per day
+
+    Arguments:
+        user_id (int): Id of the user
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        sql (string): The SQL statement to be executed
+        val (list): Values to replace placeholders in the statement
+
+    Raises:
+        ValueError: If an amount or date in the filters is not valid
+    """
+    filters = get_filters(start_date, end_date, category, payment_method, search, min_amount, max_amount)
+    return build_query("daily_totals", user_id, **filters)
+
+def get_daily_totals(user_id, db, start_date=None, end_date=None, category=None, payment_method=None, search=None, min_amount=None, max_amount=None):
+    """
+    Gets the total spending per day for a user
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+        category (int, list): Category being searched for, or a list of categories
+        payment_method (int, list): Payment method being searched for, or a list of payment methods
+        search (string): Term being searched for from search bar
+        min_amount (float, string): Smallest amount to include
+        max_amount (float, string): Largest amount to include
+
+    Returns:
+        list: Tuples of the day (see to_day_ordinal) and the amount spent that day,
+              sorted by day
+    """
     try:
-        db.cur.execute(sql, val)
-        return float(db.cur.fetchall()[0][0])
+        sql, val = build_daily_totals_query(user_id, start_date, end_date, category, payment_method, search, min_amount, max_amount)
+        return [(day, from_cents(total)) for day, total in db.cached_read(user_id, sql, val)]
     except Exception as e:
         print(e)
-        return 0
\ No newline at end of file
+        return []
\ No newline at end of file
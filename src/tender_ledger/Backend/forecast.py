@@ -10,10 +10,12 @@ import math
 import matplotlib.pyplot as plt
 from sklearn.linear_model import LinearRegression 
 
+# Ordinal of 1970-01-01, used for turning day ordinals into timestamps
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
 # TODO - break forecast file into separate files for feature creation and linear regression
-def forecast(expenses):
-    df = create_dataframe(expenses)
-    daily_spending = get_daily_spending(df)
+def forecast(columns):
+    daily_spending = get_daily_spending(columns)
 
     x_train, y_train = create_features(daily_spending)
 
@@ -61,40 +63,23 @@ def forecast(expenses):
 
     
 
-def create_dataframe(expenses):
+def get_daily_spending(columns):
     """
-    Create dataframe from expenses for analysis
-    
-    Argument: 
-        expenses (list): List of expenses
-
-    Returns:
-        df (pd.DataFrame): Expenses converted to a cleaned Pandas DataFrame  
-    """
-    columns = ['Amount', 'Date', 'Payment Method', 'Category', 'Location', 'id']
-    df = pd.DataFrame(expenses, columns=columns)
-    
-    # Remove unnecessary columns and reorder the dataframe
-    df = df[['Date', 'Amount', 'Category', 'Payment Method']]
-
-    # Convert strings to dates
-    df['Date'] = pd.to_datetime(df['Date'])
-
-    df = df.sort_values('Date').reset_index(drop=True)
-
-    return df
-
-def get_daily_spending(df):
-    """
-    Get daily spending using expenses dataframe
+    Get daily spending using the expenses read as columns
 
     Argument:
-        df (pd.DataFrame): Expenses converted to a cleaned Pandas DataFrame
+        columns (ExpenseColumns): Expenses from get_expense_columns or get_rollup_columns
 
     Returns:
-        daily_spending (pd.DataFrame): Dataframe containing the total amount spent per day 
+        daily_spending (pd.Series): Series containing the total amount spent per day 
     """
-    daily_spending = df.groupby('Date')['Amount'].sum().sort_index()
+    # Add up each day with NumPy, rows from the rollups already hold a day's totals
+    days, codes = np.unique(columns.purchase_day.astype(np.int64), return_inverse=True)
+    totals = np.bincount(codes, weights=columns.amount_cents, minlength=len(days)) / 100
+
+    # Convert day ordinals straight to timestamps without parsing strings
+    dates = pd.to_datetime(days - EPOCH_ORDINAL, unit='D')
+    daily_spending = pd.Series(totals, index=dates).sort_index()
     
     # Fill in missing dates with 0 spending
     full_date_range = pd.date_range(start=daily_spending.index.min(), 
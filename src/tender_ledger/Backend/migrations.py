@@ -0,0 +1,711 @@
+# Author - Daniel Dang
+# Filename - migrations.py
+# Purpose - Applies versioned changes to the database schema
+#
+# The version of the schema is stored in SQLite's user_version pragma. Each migration
+# is applied once, in order, inside its own transaction. Once the database is current,
+# starting the app only costs a single pragma read.
+
+import hashlib
+from datetime import datetime
+
+DEFAULT_CATEGORIES = ["Food",
+                      "Utilities",
+                      "Housing",
+                      "Healthcare",
+                      "Insurance",
+                      "Entertainment",
+                      "Travel",
+                      "Shopping",
+                      "Other"]
+
+DEFAULT_PAYMENT_METHODS = ["Cash",
+                           "Credit"]
+
+def insert_defaults(cur, table, names):
+    """
+    Insert default values (values without a user) into a table if they don't already exist
+
+    Arguments:
+        cur (sqlite3.Cursor): Cursor used to execute the statements
+        table (string): Either categories or payment_methods
+        names (list): Names of the default values
+    """
+    created_at = datetime.now()
+    sql = f"""
+          INSERT INTO {table} (user_id, name, created_at)
+          SELECT NULL, ?, ?
+          WHERE NOT EXISTS (
+              SELECT 1 FROM {table} WHERE name = ? AND user_id IS NULL
+          )
+          """
+    cur.executemany(sql, [(name, created_at, name) for name in names])
+
+def create_initial_schema(cur):
+    """
+    Create the users, categories, payment methods and expenses tables along with
+    the default categories and payment methods
+
+    Tables are created with IF NOT EXISTS so that databases made before
+    migrations existed can be brought under version control
+    """
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS users(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    first_name TEXT,
+                    last_name TEXT,
+                    birthday DATETIME,
+                    email TEXT UNIQUE NOT NULL,
+                    phone INTEGER NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME
+                )
+                """)
+
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS categories(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    name TEXT NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+
+                    UNIQUE(user_id, name)
+                )
+                """)
+
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS payment_methods(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    name TEXT NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+
+                    UNIQUE(user_id, name)
+                )
+                """)
+
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS expenses(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    amount FLOAT NOT NULL,
+                    date_of_purchase DATETIME NOT NULL,
+                    payment_method_id INTEGER,
+                    category_id INTEGER,
+                    location TEXT,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY (payment_method_id) REFERENCES payment_methods(id) ON DELETE SET NULL,
+                    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+                )
+                """)
+
+    insert_defaults(cur, "categories", DEFAULT_CATEGORIES)
+    insert_defaults(cur, "payment_methods", DEFAULT_PAYMENT_METHODS)
+
+def create_expense_indexes(cur):
+    """
+    Create indexes for the ways expenses are filtered. Every expense query filters
+    by user first, then optionally narrows by category or payment method, with
+    the date last so that date ranges can be scanned within the index
+    """
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+                ON expenses(user_id, date_of_purchase)
+                """)
+
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date
+                ON expenses(user_id, category_id, date_of_purchase)
+                """)
+
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_payment_method_date
+                ON expenses(user_id, payment_method_id, date_of_purchase)
+                """)
+
+    # Columns compared when checking for duplicates during imports
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_duplicate
+                ON expenses(user_id, date_of_purchase, amount, category_id, payment_method_id, location)
+                """)
+
+def convert_amounts_to_cents(cur):
+    """
+    Store the amounts of expenses as an integer number of cents instead of floats.
+    SQLite can't change the type of a column, so the expenses table is rebuilt
+    """
+    # Keep track of the last id used so that ids aren't reused after rebuilding
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'")
+    row = cur.fetchone()
+    last_id = row[0] if row else 0
+
+    cur.execute("""
+                CREATE TABLE expenses_new(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    amount_cents INTEGER NOT NULL,
+                    date_of_purchase DATETIME NOT NULL,
+                    payment_method_id INTEGER,
+                    category_id INTEGER,
+                    location TEXT,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY (payment_method_id) REFERENCES payment_methods(id) ON DELETE SET NULL,
+                    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+                )
+                """)
+
+    cur.execute("""
+                INSERT INTO expenses_new (id, user_id, amount_cents, date_of_purchase, payment_method_id, category_id, location, created_at, updated_at)
+                SELECT id, user_id, CAST(ROUND(amount * 100) AS INTEGER), date_of_purchase, payment_method_id, category_id, location, created_at, updated_at
+                FROM expenses
+                """)
+
+    cur.execute("DROP TABLE expenses")
+    cur.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    cur.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", (last_id,))
+    if cur.rowcount == 0 and last_id:
+        cur.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('expenses', ?)", (last_id,))
+
+    # Indexes are dropped along with the old table
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_date
+                ON expenses(user_id, date_of_purchase)
+                """)
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_category_date
+                ON expenses(user_id, category_id, date_of_purchase)
+                """)
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_payment_method_date
+                ON expenses(user_id, payment_method_id, date_of_purchase)
+                """)
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_duplicate
+                ON expenses(user_id, date_of_purchase, amount_cents, category_id, payment_method_id, location)
+                """)
+
+def add_purchase_day(cur):
+    """
+    Add the day of purchase as an integer (days since 0001-01-01, matching
+    date.toordinal()) so date ranges compare integers instead of strings.
+    The date filter indexes are moved over to the new column
+    """
+    cur.execute("ALTER TABLE expenses ADD COLUMN purchase_day INTEGER")
+    cur.execute("""
+                UPDATE expenses
+                SET purchase_day = CAST(julianday(date_of_purchase) - 1721424.5 AS INTEGER)
+                """)
+
+    cur.execute("DROP INDEX IF EXISTS idx_expenses_user_date")
+    cur.execute("DROP INDEX IF EXISTS idx_expenses_user_category_date")
+    cur.execute("DROP INDEX IF EXISTS idx_expenses_user_payment_method_date")
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_day
+                ON expenses(user_id, purchase_day)
+                """)
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_category_day
+                ON expenses(user_id, category_id, purchase_day)
+                """)
+
+    cur.execute("""
+                CREATE INDEX idx_expenses_user_payment_method_day
+                ON expenses(user_id, payment_method_id, purchase_day)
+                """)
+
+def add_sort_indexes(cur):
+    """
+    Add indexes for sorting the expenses table by amount and location. The
+    location index is on the same expression the query builder sorts by, so
+    that expenses without a location are sorted as an empty location
+    """
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_amount
+                ON expenses(user_id, amount_cents)
+                """)
+
+    cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_expenses_user_location
+                ON expenses(user_id, IFNULL(location, ''))
+                """)
+
+def add_location_search(cur):
+    """
+    Add a full-text index on the location of expenses for the search bar. The index
+    stores no copy of the text, it points at the expenses table and is kept up to
+    date by triggers. Prefixes of 2 and 3 characters are indexed so short searches
+    while typing stay fast
+    """
+    cur.execute("""
+                CREATE VIRTUAL TABLE expenses_fts
+                USING fts5(location, content='expenses', content_rowid='id', prefix='2 3')
+                """)
+
+    cur.execute("""
+                CREATE TRIGGER expenses_fts_insert AFTER INSERT ON expenses
+                BEGIN
+                    INSERT INTO expenses_fts (rowid, location) VALUES (new.id, new.location);
+                END
+                """)
+
+    cur.execute("""
+                CREATE TRIGGER expenses_fts_delete AFTER DELETE ON expenses
+                BEGIN
+                    INSERT INTO expenses_fts (expenses_fts, rowid, location) VALUES ('delete', old.id, old.location);
+                END
+                """)
+
+    cur.execute("""
+                CREATE TRIGGER expenses_fts_update AFTER UPDATE OF location ON expenses
+                BEGIN
+                    INSERT INTO expenses_fts (expenses_fts, rowid, location) VALUES ('delete', old.id, old.location);
+                    INSERT INTO expenses_fts (rowid, location) VALUES (new.id, new.location);
+                END
+                """)
+
+    # Index the expenses that already exist
+    cur.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+def add_daily_rollup(cur):
+    """
+    Add a table with the total and number of expenses for each user, day, category
+    and payment method. Triggers keep it up to date as expenses change, so totals for
+    a range of days read one row per day and combination instead of every expense.
+    Missing categories and payment methods are stored as 0 so they can be part of
+    the primary key. Expenses without a day of purchase are left out
+    """
+    cur.execute("""
+                CREATE TABLE expense_daily_rollup(
+                    user_id INTEGER NOT NULL,
+                    day INTEGER NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    payment_method_id INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+
+                    PRIMARY KEY (user_id, day, category_id, payment_method_id)
+                ) WITHOUT ROWID
+                """)
+
+    cur.execute("""
+                CREATE TRIGGER expense_daily_rollup_insert AFTER INSERT ON expenses
+                BEGIN
+                    INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count)
+                    SELECT IFNULL(new.user_id, 0), new.purchase_day, IFNULL(new.category_id, 0), IFNULL(new.payment_method_id, 0), new.amount_cents, 1
+                    WHERE new.purchase_day IS NOT NULL
+                    ON CONFLICT (user_id, day, category_id, payment_method_id)
+                    DO UPDATE SET total = total + excluded.total, count = count + 1;
+                END
+                """)
+
+    cur.execute("""
+                CREATE TRIGGER expense_daily_rollup_delete AFTER DELETE ON expenses
+                BEGIN
+                    UPDATE expense_daily_rollup
+                    SET total = total - old.amount_cents, count = count - 1
+                    WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                      AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0);
+
+                    DELETE FROM expense_daily_rollup
+                    WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                      AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0)
+                      AND count = 0;
+                END
+                """)
+
+    # An update moves the expense out of its old row and into its new one
+    cur.execute("""
+                CREATE TRIGGER expense_daily_rollup_update
+                AFTER UPDATE OF user_id, amount_cents, purchase_day, category_id, payment_method_id ON expenses
+                BEGIN
+                    UPDATE expense_daily_rollup
+                    SET total = total - old.amount_cents, count = count - 1
+                    WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                      AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0);
+
+                    DELETE FROM expense_daily_rollup
+                    WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                      AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0)
+                      AND count = 0;
+
+                    INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count)
+                    SELECT IFNULL(new.user_id, 0), new.purchase_day, IFNULL(new.category_id, 0), IFNULL(new.payment_method_id, 0), new.amount_cents, 1
+                    WHERE new.purchase_day IS NOT NULL
+                    ON CONFLICT (user_id, day, category_id, payment_method_id)
+                    DO UPDATE SET total = total + excluded.total, count = count + 1;
+                END
+                """)
+
+    # Total the expenses that already exist
+    cur.execute("""
+                INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count)
+                SELECT IFNULL(user_id, 0), purchase_day, IFNULL(category_id, 0), IFNULL(payment_method_id, 0), SUM(amount_cents), COUNT(*)
+                FROM expenses
+                WHERE purchase_day IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+                """)
+
+def add_monthly_and_yearly_rollups(cur):
+    """
+    Add monthly and yearly totals on top of the daily totals, so long date ranges
+    can be answered from a few rows. Months and years are stored as their first day
+    (as a day ordinal). Triggers on expense_daily_rollup carry every change up to
+    both tables
+    """
+    for table, column, start in (("expense_monthly_rollup", "month_start", "start of month"),
+                                 ("expense_yearly_rollup", "year_start", "start of year")):
+        # First day of the month or year that a day ordinal is in
+        new_start = f"CAST(julianday(date(new.day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER)"
+        old_start = f"CAST(julianday(date(old.day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER)"
+
+        cur.execute(f"""
+                    CREATE TABLE {table}(
+                        user_id INTEGER NOT NULL,
+                        {column} INTEGER NOT NULL,
+                        category_id INTEGER NOT NULL,
+                        payment_method_id INTEGER NOT NULL,
+                        total INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+
+                        PRIMARY KEY (user_id, {column}, category_id, payment_method_id)
+                    ) WITHOUT ROWID
+                    """)
+
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_insert AFTER INSERT ON expense_daily_rollup
+                    BEGIN
+                        INSERT INTO {table} (user_id, {column}, category_id, payment_method_id, total, count)
+                        VALUES (new.user_id, {new_start}, new.category_id, new.payment_method_id, new.total, new.count)
+                        ON CONFLICT (user_id, {column}, category_id, payment_method_id)
+                        DO UPDATE SET total = total + excluded.total, count = count + excluded.count;
+                    END
+                    """)
+
+        # The daily triggers only change the total and count of a day, never which day it is
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_update AFTER UPDATE OF total, count ON expense_daily_rollup
+                    BEGIN
+                        UPDATE {table}
+                        SET total = total + new.total - old.total, count = count + new.count - old.count
+                        WHERE user_id = new.user_id AND {column} = {new_start}
+                          AND category_id = new.category_id AND payment_method_id = new.payment_method_id;
+                    END
+                    """)
+
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_delete AFTER DELETE ON expense_daily_rollup
+                    BEGIN
+                        UPDATE {table}
+                        SET total = total - old.total, count = count - old.count
+                        WHERE user_id = old.user_id AND {column} = {old_start}
+                          AND category_id = old.category_id AND payment_method_id = old.payment_method_id;
+
+                        DELETE FROM {table}
+                        WHERE user_id = old.user_id AND {column} = {old_start}
+                          AND category_id = old.category_id AND payment_method_id = old.payment_method_id
+                          AND count = 0;
+                    END
+                    """)
+
+        # Total the days that already exist
+        cur.execute(f"""
+                    INSERT INTO {table} (user_id, {column}, category_id, payment_method_id, total, count)
+                    SELECT user_id, CAST(julianday(date(day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER),
+                           category_id, payment_method_id, SUM(total), SUM(count)
+                    FROM expense_daily_rollup
+                    GROUP BY 1, 2, 3, 4
+                    """)
+
+def fingerprint_v9(user_id, purchase_day, amount_cents, category_id, payment_method_id, location):
+    """
+    Get the fingerprint of an expense the way migration 9 stored it. This is a frozen
+    copy of expenses.get_fingerprint, so later changes to it can't change what an old
+    migration does
+
+    Arguments:
+        user_id (int): The user's id
+        purchase_day (int): Day of purchase (see expenses.to_day_ordinal)
+        amount_cents (int): Amount of the purchase in cents
+        category_id (int): Expense's category
+        payment_method_id (int): Payment method used for expense
+        location (string): Other details about the expense
+
+    Returns:
+        int: 64-bit fingerprint of the expense
+    """
+    location = " ".join((location or "").split()).casefold()
+    key = f"{user_id}|{purchase_day}|{amount_cents}|{category_id or 0}|{payment_method_id or 0}|{location}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+def add_expense_fingerprints(cur):
+    """
+    Add a fingerprint of what each expense contains (see fingerprint_v9) under
+    a unique index, so imports can find expenses they already added with a single
+    lookup. Only the first of any expenses with the same contents gets the fingerprint.
+    The six column index used for finding duplicates before is no longer needed
+    """
+    cur.execute("ALTER TABLE expenses ADD COLUMN fingerprint INTEGER")
+
+    rows = cur.execute("""
+                       SELECT id, user_id, purchase_day, amount_cents, category_id, payment_method_id, location
+                       FROM expenses
+                       ORDER BY id
+                       """).fetchall()
+
+    seen = set()
+    fingerprints = []
+    for expense_id, *contents in rows:
+        fingerprint = fingerprint_v9(*contents)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            fingerprints.append((fingerprint, expense_id))
+
+    cur.executemany("UPDATE expenses SET fingerprint = ? WHERE id = ?", fingerprints)
+
+    cur.execute("DROP INDEX IF EXISTS idx_expenses_duplicate")
+    cur.execute("""
+                CREATE UNIQUE INDEX idx_expenses_fingerprint
+                ON expenses(fingerprint) WHERE fingerprint IS NOT NULL
+                """)
+
+def add_import_journal(cur):
+    """
+    Add a journal of csv imports. Each chunk of a file commits with its row in the
+    journal, which keeps where in the file the import got to and how many rows it has
+    gone through, so an import that was interrupted can carry on from there
+    """
+    cur.execute("""
+                CREATE TABLE imports(
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    byte_offset INTEGER NOT NULL DEFAULT 0,
+                    rows_committed INTEGER NOT NULL DEFAULT 0,
+                    inserted INTEGER NOT NULL DEFAULT 0,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    invalid INTEGER NOT NULL DEFAULT 0,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+
+                    UNIQUE(user_id, file_hash)
+                )
+                """)
+
+# Tables of the rollups, the column holding their period, and the SQLite modifier for
+# the start of the period
+ROLLUP_TABLES = (
+    ("expense_daily_rollup", "day", None),
+    ("expense_monthly_rollup", "month_start", "start of month"),
+    ("expense_yearly_rollup", "year_start", "start of year"),
+)
+
+def add_rollup_max_amounts(cur):
+    """
+    Keep the largest expense of each row in the daily, monthly and yearly totals, so
+    the largest expense in a date range is read from the same few rows as its total.
+
+    A largest amount can't be taken back out the way a total can, so when the largest
+    expense of a row is deleted or lowered, the triggers look it up again from the
+    expenses of that one day, or the days of that one month or year. Anything else only
+    compares against the amount already there. The triggers are replaced and all three
+    tables are filled in again
+    """
+    for table, _, _ in ROLLUP_TABLES:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN max_cents INTEGER")
+
+    cur.execute("DROP TRIGGER expense_daily_rollup_insert")
+    cur.execute("DROP TRIGGER expense_daily_rollup_delete")
+    cur.execute("DROP TRIGGER expense_daily_rollup_update")
+    for table, _, _ in ROLLUP_TABLES[1:]:
+        for event in ("insert", "update", "delete"):
+            cur.execute(f"DROP TRIGGER {table}_{event}")
+
+    # Adding an expense to a day, and taking one out again
+    add_new = """
+              INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count, max_cents)
+              SELECT IFNULL(new.user_id, 0), new.purchase_day, IFNULL(new.category_id, 0), IFNULL(new.payment_method_id, 0),
+                     new.amount_cents, 1, new.amount_cents
+              WHERE new.purchase_day IS NOT NULL
+              ON CONFLICT (user_id, day, category_id, payment_method_id)
+              DO UPDATE SET total = total + excluded.total, count = count + 1, max_cents = MAX(max_cents, excluded.max_cents);
+              """
+    # Only losing the day's largest expense re-reads the day, the unary plus keeps that read on the day index
+    remove_old = """
+                 UPDATE expense_daily_rollup
+                 SET total = total - old.amount_cents, count = count - 1,
+                     max_cents = CASE WHEN old.amount_cents < max_cents THEN max_cents
+                                      ELSE (SELECT MAX(+amount_cents) FROM expenses
+                                            WHERE user_id IS old.user_id AND purchase_day = old.purchase_day
+                                              AND IFNULL(category_id, 0) = IFNULL(old.category_id, 0)
+                                              AND IFNULL(payment_method_id, 0) = IFNULL(old.payment_method_id, 0)) END
+                 WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                   AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0);
+
+                 DELETE FROM expense_daily_rollup
+                 WHERE user_id = IFNULL(old.user_id, 0) AND day = old.purchase_day
+                   AND category_id = IFNULL(old.category_id, 0) AND payment_method_id = IFNULL(old.payment_method_id, 0)
+                   AND count = 0;
+                 """
+
+    cur.execute(f"CREATE TRIGGER expense_daily_rollup_insert AFTER INSERT ON expenses BEGIN {add_new} END")
+    cur.execute(f"CREATE TRIGGER expense_daily_rollup_delete AFTER DELETE ON expenses BEGIN {remove_old} END")
+    cur.execute(f"""
+                CREATE TRIGGER expense_daily_rollup_update
+                AFTER UPDATE OF user_id, amount_cents, purchase_day, category_id, payment_method_id ON expenses
+                BEGIN {remove_old} {add_new} END
+                """)
+
+    for table, column, start in ROLLUP_TABLES[1:]:
+        # First and last day of the month or year that a day ordinal is in
+        new_start = f"CAST(julianday(date(new.day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER)"
+        old_start = f"CAST(julianday(date(old.day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER)"
+        period = "+1 month" if column == "month_start" else "+1 year"
+        new_end = f"CAST(julianday(date(new.day + 1721424.5, '{start}', '{period}')) - 1721424.5 AS INTEGER) - 1"
+        old_end = f"CAST(julianday(date(old.day + 1721424.5, '{start}', '{period}')) - 1721424.5 AS INTEGER) - 1"
+
+        # Largest amount of the days left in the period
+        def largest(row, first, last):
+            return f"""
+                    (SELECT MAX(max_cents) FROM expense_daily_rollup
+                     WHERE user_id = {row}.user_id AND day BETWEEN {first} AND {last}
+                       AND category_id = {row}.category_id AND payment_method_id = {row}.payment_method_id)
+                    """
+
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_insert AFTER INSERT ON expense_daily_rollup
+                    BEGIN
+                        INSERT INTO {table} (user_id, {column}, category_id, payment_method_id, total, count, max_cents)
+                        VALUES (new.user_id, {new_start}, new.category_id, new.payment_method_id, new.total, new.count, new.max_cents)
+                        ON CONFLICT (user_id, {column}, category_id, payment_method_id)
+                        DO UPDATE SET total = total + excluded.total, count = count + excluded.count,
+                                      max_cents = MAX(max_cents, excluded.max_cents);
+                    END
+                    """)
+
+        # The daily triggers only change the totals of a day, never which day it is
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_update AFTER UPDATE OF total, count, max_cents ON expense_daily_rollup
+                    BEGIN
+                        UPDATE {table}
+                        SET total = total + new.total - old.total, count = count + new.count - old.count,
+                            max_cents = CASE WHEN new.max_cents >= max_cents THEN new.max_cents
+                                             WHEN old.max_cents < max_cents THEN max_cents
+                                             ELSE {largest("new", new_start, new_end)} END
+                        WHERE user_id = new.user_id AND {column} = {new_start}
+                          AND category_id = new.category_id AND payment_method_id = new.payment_method_id;
+                    END
+                    """)
+
+        cur.execute(f"""
+                    CREATE TRIGGER {table}_delete AFTER DELETE ON expense_daily_rollup
+                    BEGIN
+                        UPDATE {table}
+                        SET total = total - old.total, count = count - old.count,
+                            max_cents = CASE WHEN old.max_cents < max_cents THEN max_cents
+                                             ELSE {largest("old", old_start, old_end)} END
+                        WHERE user_id = old.user_id AND {column} = {old_start}
+                          AND category_id = old.category_id AND payment_method_id = old.payment_method_id;
+
+                        DELETE FROM {table}
+                        WHERE user_id = old.user_id AND {column} = {old_start}
+                          AND category_id = old.category_id AND payment_method_id = old.payment_method_id
+                          AND count = 0;
+                    END
+                    """)
+
+    # Fill the tables in again. Emptying the largest periods first leaves the delete
+    # triggers nothing to do, and the insert triggers fill in the months and years
+    for table, _, _ in reversed(ROLLUP_TABLES):
+        cur.execute(f"DELETE FROM {table}")
+
+    cur.execute("""
+                INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count, max_cents)
+                SELECT IFNULL(user_id, 0), purchase_day, IFNULL(category_id, 0), IFNULL(payment_method_id, 0),
+                       SUM(amount_cents), COUNT(*), MAX(amount_cents)
+                FROM expenses
+                WHERE purchase_day IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+                """)
+
+# Ordered list of (version, description, function) for every migration
+MIGRATIONS = [
+    (1, "Create initial tables and default values", create_initial_schema),
+    (2, "Add indexes for filtering expenses", create_expense_indexes),
+    (3, "Store expense amounts as integer cents", convert_amounts_to_cents),
+    (4, "Add day of purchase as an integer", add_purchase_day),
+    (5, "Add indexes for sorting expenses", add_sort_indexes),
+    (6, "Add full-text search on locations", add_location_search),
+    (7, "Add daily totals of expenses", add_daily_rollup),
+    (8, "Add monthly and yearly totals of expenses", add_monthly_and_yearly_rollups),
+    (9, "Add fingerprints for finding duplicate expenses", add_expense_fingerprints),
+    (10, "Add a journal of csv imports", add_import_journal),
+    (11, "Add the largest expense to the rollups", add_rollup_max_amounts),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(cur):
+    """
+    Get the version of the database's schema
+
+    Argument:
+        cur (sqlite3.Cursor): Cursor for the database
+
+    Returns:
+        int: Version stored in the user_version pragma
+    """
+    return cur.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(con):
+    """
+    Apply all migrations that have not been applied to the database yet
+
+    Argument:
+        con (sqlite3.Connection): Connection to the database
+
+    Returns:
+        int: Version of the schema after migrating
+    """
+    cur = con.cursor()
+    version = get_schema_version(cur)
+
+    for migration_version, description, apply in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        # Each migration and its version bump are committed together
+        try:
+            cur.execute("BEGIN")
+            apply(cur)
+            cur.execute(f"PRAGMA user_version = {migration_version}")
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+
+        version = migration_version
+        print(f"Applied migration {migration_version}: {description}")
+
+    return version
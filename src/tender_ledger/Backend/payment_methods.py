@@ -23,7 +23,9 @@ def add_payment_method(user_id, name, db):
     sql = "INSERT INTO payment_methods (user_id, name, created_at) VALUES (?, ?, ?)"
     val = (user_id, name, created_at)
 
-    return db.execute_statement(sql, val)
+    added = db.execute_statement(sql, val)
+    db.invalidate(user_id)
+    return added
 
 def update_payment_method(id, name, db):
     """
@@ -48,7 +50,11 @@ def update_payment_method(id, name, db):
           WHERE id = ?
           """
     val = (name, updated_at, id,)
-    return db.execute_statement(sql, val)
+    owners = [method[2] for method in get_payment_method(id, db)]
+    updated = db.execute_statement(sql, val)
+    if owners:
+        db.invalidate(*owners)
+    return updated
 
 def delete_payment_method(id, db):
     """
@@ -68,7 +74,11 @@ def delete_payment_method(id, db):
           """
     val = (id,)
 
-    return db.execute_statement(sql, val)
+    owners = [method[2] for method in get_payment_method(id, db)]
+    deleted = db.execute_statement(sql, val)
+    if owners:
+        db.invalidate(*owners)
+    return deleted
 
 def get_payment_methods_for_user(user_id, db):
     """
@@ -91,8 +101,7 @@ def get_payment_methods_for_user(user_id, db):
                 WHERE user_id = ? OR user_id IS NULL
               """
         
-        db.cur.execute(sql, (user_id,))
-        rows = db.cur.fetchall()
+        rows = db.cached_read(user_id, sql, (user_id,))
 
         for row in rows:
             payment_methods[row[1]] = row[0]
@@ -121,8 +130,7 @@ def get_payment_methods_for_list(user_id, db):
                 WHERE user_id = ? OR user_id IS NULL
               """
         
-        db.cur.execute(sql, (user_id,))
-        rows = db.cur.fetchall()
+        rows = db.cached_read(user_id, sql, (user_id,))
         
         return rows
 
@@ -156,8 +164,9 @@ def get_payment_method(id, db):
 
     sql = select_clause + where_clause
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
         return []
@@ -187,8 +196,9 @@ def get_payment_method_by_name(name, db):
 
     sql = select_clause + where_clause
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
         return []
\ No newline at end of file
@@ -0,0 +1,213 @@
+# Author - Daniel Dang
+# Filename - query_builder.py
+# Purpose - Builds the SQL for queries on a user's expenses
+#
+# The optional filters only produce a small number of combinations (shapes). The SQL for
+# each shape is put together once and then reused, so the text of a query never changes
+# between calls and sqlite3's statement cache can skip re-preparing it.
+
+from functools import lru_cache
+
+# Each filter's name, its condition, and how its value is turned into parameters.
+# The order here decides the order of the conditions and parameters in the SQL
+FILTERS = (
+    ("start_day", "e.purchase_day >= ?", lambda value: [value]),
+    ("end_day", "e.purchase_day <= ?", lambda value: [value]),
+    ("category", "e.category_id = ?", lambda value: [value]),
+    ("payment_method", "e.payment_method_id = ?", lambda value: [value]),
+    # Several categories or payment methods, given as a JSON list so the SQL stays the same
+    # however many are picked
+    ("categories", "e.category_id IN (SELECT value FROM json_each(?))", lambda value: [value]),
+    ("payment_methods", "e.payment_method_id IN (SELECT value FROM json_each(?))", lambda value: [value]),
+    ("min_cents", "e.amount_cents >= ?", lambda value: [value]),
+    ("max_cents", "e.amount_cents <= ?", lambda value: [value]),
+    # Search bar, see search.parse_search
+    ("search_day", "e.purchase_day BETWEEN ? AND ?", lambda value: list(value)),
+    ("search_numbers", "(e.amount_cents BETWEEN ? AND ? OR e.purchase_day BETWEEN ? AND ? "
+                       "OR e.id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?))",
+                       lambda value: list(value)),
+    ("search_text", "e.id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)", lambda value: [value]),
+    # Keyset paging, only expenses that come after the (sort value, id) of the previous page
+    ("after", "({key}, e.id) {compare} (?, ?)", lambda value: list(value)),
+)
+
+# Filters given a list of values, where any one of them can match. The condition is
+# repeated once for each value, so the shape includes how many there are
+ANY_OF_FILTERS = ("search_numbers",)
+
+# Values the expenses can be sorted by. Missing names and locations are sorted as empty
+# so that they can still be compared when paging
+ORDERS = {
+    "date": "e.purchase_day",
+    "amount": "e.amount_cents",
+    "category": "IFNULL(c.name, '')",
+    "payment_method": "IFNULL(p.name, '')",
+    "location": "IFNULL(e.location, '')",
+}
+
+DEFAULT_ORDER = "date"
+
+# Query for a user's expenses. The id breaks ties between expenses with the same sort
+# value so that the order is always the same, which keyset paging relies on
+EXPENSES_QUERY = """
+                SELECT
+                    e.amount_cents / 100.0 AS amount,
+                    e.date_of_purchase,
+                    p.name AS payment_method_name,
+                    c.name AS category_name,
+                    e.location,
+                    e.id
+                FROM
+                    expenses e
+                LEFT JOIN
+                    categories c ON e.category_id = c.id
+                LEFT JOIN
+                    payment_methods p ON e.payment_method_id = p.id
+                {where}
+                ORDER BY
+                    {order}
+                """
+
+# Queries that can be built, {where} is replaced by the conditions for the filters
+# and {order} by the sort order
+QUERIES = {
+    "expenses": EXPENSES_QUERY,
+    "expenses_page": EXPENSES_QUERY + "LIMIT ?",
+    "expense_count": """
+                     SELECT
+                         COUNT(*)
+                     FROM
+                         expenses e
+                     {where}
+                     """,
+    "total_spending": """
+                      SELECT
+                          COALESCE(SUM(e.amount_cents), 0)
+                      FROM
+                          expenses e
+                      {where}
+                      """,
+    "spending_summary": """
+                        SELECT
+                            COUNT(*),
+                            COALESCE(SUM(e.amount_cents), 0),
+                            MIN(e.purchase_day),
+                            MAX(e.purchase_day),
+                            AVG(e.amount_cents),
+                            MAX(e.amount_cents)
+                        FROM
+                            expenses e
+                        {where}
+                        """,
+    "expense_columns": """
+                       SELECT
+                           e.amount_cents,
+                           e.purchase_day,
+                           IFNULL(e.category_id, 0),
+                           IFNULL(e.payment_method_id, 0),
+                           1
+                       FROM
+                           expenses e
+                       {where}
+                       ORDER BY
+                           e.purchase_day
+                       """,
+    "daily_totals": """
+                    SELECT
+                        e.purchase_day,
+                        SUM(e.amount_cents)
+                    FROM
+                        expenses e
+                    {where}
+                    GROUP BY
+                        e.purchase_day
+                    ORDER BY
+                        e.purchase_day
+                    """
+}
+
+def get_shape(filters):
+    """
+    Get the shape of a set of filters, which is the names of the filters being used
+
+    Argument:
+        filters (dict): Filter names mapped to their values, values of None are not used
+
+    Returns:
+        tuple: Names of the filters being used, in the order of FILTERS. Names in
+               ANY_OF_FILTERS are repeated once for each of their values
+    """
+    shape = []
+    for name, _, _ in FILTERS:
+        value = filters.get(name)
+        if value is None:
+            continue
+        shape.extend([name] * len(value) if name in ANY_OF_FILTERS else [name])
+
+    return tuple(shape)
+
+@lru_cache(maxsize=None)
+def compile_query(query, shape, order=DEFAULT_ORDER, descending=True):
+    """
+    Put together the SQL for a query, filter shape and sort order. The result is
+    cached so each combination is only put together once
+
+    Arguments:
+        query (string): Name of the query in QUERIES
+        shape (tuple): Names of the filters being used
+        order (string): Name of the value in ORDERS to sort by
+        descending (bool): True to sort from highest to lowest
+
+    Returns:
+        string: The SQL statement
+
+    Raises:
+        ValueError: If the order is not in ORDERS
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order: {order}")
+
+    key = ORDERS[order]
+    direction = "DESC" if descending else "ASC"
+
+    conditions = ["e.user_id = ?"]
+    for name, condition, _ in FILTERS:
+        condition = condition.format(key=key, compare="<" if descending else ">")
+        count = shape.count(name)
+        if count > 1:
+            conditions.append("(" + " OR ".join([condition] * count) + ")")
+        elif count:
+            conditions.append(condition)
+
+    where_clause = "WHERE " + " AND ".join(conditions)
+    order_clause = f"{key} {direction}, e.id {direction}"
+    return QUERIES[query].format(where=where_clause, order=order_clause)
+
+def build_query(query, user_id, order=DEFAULT_ORDER, descending=True, **filters):
+    """
+    Build a query on a user's expenses
+
+    Arguments:
+        query (string): Name of the query in QUERIES
+        user_id (int): Id of the user
+        order (string): Name of the value in ORDERS to sort by
+        descending (bool): True to sort from highest to lowest
+        filters: Values for the filters in FILTERS. Dates must already be day ordinals
+
+    Returns:
+        sql (string): The SQL statement to be executed
+        val (list): Values to replace placeholders in the statement
+    """
+    shape = get_shape(filters)
+
+    val = [user_id]
+    for name, _, to_params in FILTERS:
+        if name not in shape:
+            continue
+        if name in ANY_OF_FILTERS:
+            for value in filters[name]:
+                val.extend(to_params(value))
+        else:
+            val.extend(to_params(filters[name]))
+
+    return compile_query(query, shape, order, descending), val
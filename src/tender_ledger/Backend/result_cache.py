@@ -0,0 +1,116 @@
+# Author - Daniel Dang
+# Filename - result_cache.py
+# Purpose - Keeps the results of recent queries so that pages can be shown again without
+#           going back to the database
+#
+# Results are stored by the user, SQL and parameters of the query. Every user has a data
+# version that goes up whenever their expenses, categories or payment methods change, and
+# a result is only used if it was stored under the current version. Changes that affect
+# every user, such as to the default categories, bump a global version instead.
+
+import threading
+from collections import OrderedDict
+
+# Number of query results kept, the least recently used are dropped first
+DEFAULT_CACHE_SIZE = 256
+
+class ResultCache:
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """
+        Sets up an empty cache
+
+        Argument:
+            maxsize (int): Maximum number of query results to keep
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.global_version = 0
+        self.versions = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_version(self, user_id):
+        """
+        Get the current data version for a user
+
+        Argument:
+            user_id (int): Id of the user
+
+        Returns:
+            tuple: The global version and the user's version
+        """
+        with self.lock:
+            return (self.global_version, self.versions.get(user_id, 0))
+
+    def get(self, user_id, sql, val):
+        """
+        Get the stored result of a query if the user's data hasn't changed since
+
+        Arguments:
+            user_id (int): Id of the user the query is for
+            sql (string): The SQL statement
+            val (list): Values for the placeholders in the statement
+
+        Returns:
+            list: The stored rows, None if there is no usable result
+        """
+        key = (user_id, sql, tuple(val))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            version, rows = entry
+            if version != (self.global_version, self.versions.get(user_id, 0)):
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(rows)
+
+    def put(self, user_id, sql, val, rows, version):
+        """
+        Store the result of a query
+
+        Arguments:
+            user_id (int): Id of the user the query is for
+            sql (string): The SQL statement
+            val (list): Values for the placeholders in the statement
+            rows (list): Rows returned by the query
+            version (tuple): Version from get_version taken before the query ran, so
+                             a change made while the query was running isn't missed
+        """
+        key = (user_id, sql, tuple(val))
+        with self.lock:
+            self.entries[key] = (version, tuple(rows))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        """
+        Stop using the stored results for some users
+
+        Argument:
+            user_ids (int): Ids of the users whose data changed. If none are given, the
+                            results for every user are dropped
+        """
+        with self.lock:
+            if not user_ids:
+                self.global_version += 1
+                self.entries.clear()
+                return
+
+            for user_id in user_ids:
+                self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+    def clear(self):
+        """
+        Drop every stored result
+        """
+        self.invalidate()
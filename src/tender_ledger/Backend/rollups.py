@@ -0,0 +1,436 @@
+# Author - Daniel Dang
+# Filename - rollups.py
+# Purpose - Reads dashboard totals from the rollup tables and rebuilds them
+#
+# expense_daily_rollup holds the total, number and largest of the expenses for each user, day,
+# category and payment method. Triggers on the expenses table keep it up to date (see
+# migrations.add_daily_rollup), and triggers on it keep monthly and yearly totals up to
+# date in turn (see migrations.add_monthly_and_yearly_rollups).
+#
+# A date range is split into whole years, whole months and the days left over at either
+# end (see plan_range), and each piece is read from the matching table. An "All Time"
+# total over ten years of expenses reads a handful of rows per category and payment method
+# instead of one per expense. If the tables are ever out of step, rebuild them:
+#
+#     python -m src.tender_ledger.Backend.rollups [--testing] [--user USER_ID]
+
+import argparse
+from datetime import MAXYEAR, date
+from functools import lru_cache
+from .categories import get_categories_for_user
+from .database import DatabaseManager
+from .expenses import from_cents, from_day_ordinal, to_day_ordinal
+from .payment_methods import get_payment_methods_for_user
+
+# Name used for expenses without a category or payment method
+UNCATEGORIZED = "Uncategorized"
+
+# Bounds used when a date range is left open
+FIRST_DAY = date.min.toordinal()
+LAST_DAY = date.max.toordinal()
+
+# Table and column holding the totals for each size of period, from smallest to largest.
+# Months and years are stored as the day ordinal of their first day
+TIERS = {
+    "day": ("expense_daily_rollup", "day"),
+    "month": ("expense_monthly_rollup", "month_start"),
+    "year": ("expense_yearly_rollup", "year_start"),
+}
+
+# Totals for one piece of a date range, the pieces are combined with UNION ALL
+PIECE_SQL = """
+            SELECT {column} AS period, category_id, payment_method_id, total, count, max_cents
+            FROM {table}
+            WHERE user_id = ? AND {column} BETWEEN ? AND ?
+            """
+
+# Queries over the pieces of a date range, {pieces} is replaced by the pieces
+ROLLUP_QUERIES = {
+    "summary": """
+               SELECT
+                   COALESCE(SUM(count), 0),
+                   COALESCE(SUM(total), 0),
+                   MAX(max_cents)
+               FROM ({pieces})
+               """,
+    "totals": """
+              SELECT
+                  category_id,
+                  payment_method_id,
+                  SUM(total)
+              FROM ({pieces})
+              GROUP BY
+                  category_id, payment_method_id
+              """,
+    "monthly_totals": """
+                      SELECT
+                          CAST(julianday(date(period + 1721424.5, 'start of month')) - 1721424.5 AS INTEGER) AS month,
+                          SUM(total)
+                      FROM ({pieces})
+                      GROUP BY
+                          month
+                      ORDER BY
+                          month
+                      """,
+    # Same columns as the expense_columns query, see expense_columns.get_rollup_columns
+    "columns": """
+               SELECT
+                   total,
+                   period,
+                   category_id,
+                   payment_method_id,
+                   count
+               FROM ({pieces})
+               ORDER BY
+                   period
+               """,
+}
+
+# Kept as two subqueries so that each one is a single lookup in the primary key
+FIRST_LAST_DAY_SQL = """
+                     SELECT
+                         (SELECT MIN(day) FROM expense_daily_rollup WHERE user_id = ? AND day BETWEEN ? AND ?),
+                         (SELECT MAX(day) FROM expense_daily_rollup WHERE user_id = ? AND day BETWEEN ? AND ?)
+                     """
+
+ROLLUP_DAILY_TOTALS_SQL = """
+                          SELECT
+                              day,
+                              SUM(total)
+                          FROM
+                              expense_daily_rollup
+                          WHERE user_id = ? AND day BETWEEN ? AND ?
+                          GROUP BY
+                              day
+                          ORDER BY
+                              day
+                          """
+
+# The monthly and yearly totals are filled in by the triggers on the daily totals
+REBUILD_SQL = """
+              INSERT INTO expense_daily_rollup (user_id, day, category_id, payment_method_id, total, count, max_cents)
+              SELECT IFNULL(user_id, 0), purchase_day, IFNULL(category_id, 0), IFNULL(payment_method_id, 0),
+                     SUM(amount_cents), COUNT(*), MAX(amount_cents)
+              FROM expenses
+              WHERE purchase_day IS NOT NULL {where}
+              GROUP BY 1, 2, 3, 4
+              """
+
+def get_month_start(day):
+    """
+    Get the first day of the month a day is in
+
+    Argument:
+        day (int): Day ordinal
+
+    Returns:
+        int: Day ordinal of the first day of the month
+    """
+    value = date.fromordinal(day)
+    return date(value.year, value.month, 1).toordinal()
+
+def get_next_month_start(day):
+    """
+    Get the first day of the month after the one a day is in
+
+    Argument:
+        day (int): Day ordinal
+
+    Returns:
+        int: Day ordinal of the first day of the next month, one past LAST_DAY for the last month
+    """
+    value = date.fromordinal(day)
+    if value.month < 12:
+        return date(value.year, value.month + 1, 1).toordinal()
+    if value.year < MAXYEAR:
+        return date(value.year + 1, 1, 1).toordinal()
+    return LAST_DAY + 1
+
+def get_year_start(day):
+    """
+    Get the first day of the year a day is in
+
+    Argument:
+        day (int): Day ordinal
+
+    Returns:
+        int: Day ordinal of January 1st of the year
+    """
+    return date(date.fromordinal(day).year, 1, 1).toordinal()
+
+def get_next_year_start(day):
+    """
+    Get the first day of the year after the one a day is in
+
+    Argument:
+        day (int): Day ordinal
+
+    Returns:
+        int: Day ordinal of January 1st of the next year, one past LAST_DAY for the last year
+    """
+    year = date.fromordinal(day).year
+    return date(year + 1, 1, 1).toordinal() if year < MAXYEAR else LAST_DAY + 1
+
+def plan_range(first_day, last_day, largest="year"):
+    """
+    Split a range of days into whole years, whole months and the days left over
+    at either end, so that each piece can be read from the smallest number of rows
+
+    Arguments:
+        first_day (int): First day of the range as a day ordinal
+        last_day (int): Last day of the range as a day ordinal
+        largest (string): Largest size of piece to use, "day", "month" or "year"
+
+    Returns:
+        list: Tuples of the tier (see TIERS), and the first and last day of the piece.
+              Months and years are given by their first days. Pieces are in order
+              and don't overlap
+    """
+    if first_day > last_day:
+        return []
+
+    if largest == "day":
+        return [("day", first_day, last_day)]
+
+    # Whole months run from month_first up to (not including) month_end
+    month_first = first_day if first_day == get_month_start(first_day) else get_next_month_start(first_day)
+    month_end = last_day + 1 if get_next_month_start(last_day) == last_day + 1 else get_month_start(last_day)
+    if month_first >= month_end:
+        return [("day", first_day, last_day)]
+
+    middle = [("month", month_first, month_end - 1)]
+    if largest == "year":
+        # Whole years inside the whole months
+        year_first = month_first if month_first == get_year_start(month_first) else get_next_year_start(month_first)
+        year_end = month_end if get_next_year_start(month_end - 1) == month_end else get_year_start(month_end - 1)
+        if year_first < year_end:
+            middle = [("month", month_first, year_first - 1),
+                      ("year", year_first, year_end - 1),
+                      ("month", year_end, month_end - 1)]
+
+    pieces = [("day", first_day, month_first - 1)] + middle + [("day", month_end, last_day)]
+    return [(tier, first, last) for tier, first, last in pieces if first <= last]
+
+@lru_cache(maxsize=None)
+def compile_range_query(query, tiers):
+    """
+    Put together the SQL for a query over the pieces of a date range
+
+    Arguments:
+        query (string): Name of a query in ROLLUP_QUERIES
+        tiers (tuple): Tier of each piece, in order
+
+    Returns:
+        string: The SQL statement
+    """
+    pieces = " UNION ALL ".join(PIECE_SQL.format(table=TIERS[tier][0], column=TIERS[tier][1]) for tier in tiers)
+    return ROLLUP_QUERIES[query].format(pieces=pieces)
+
+def build_range_query(query, user_id, first_day, last_day, largest="year"):
+    """
+    Build a query over the rollups for a range of days
+
+    Arguments:
+        query (string): Name of a query in ROLLUP_QUERIES
+        user_id (int): Id of the user
+        first_day (int): First day of the range as a day ordinal
+        last_day (int): Last day of the range as a day ordinal
+        largest (string): Largest size of piece to use, "day", "month" or "year"
+
+    Returns:
+        sql (string): The SQL statement
+        val (list): Values for the placeholders in the statement
+    """
+    # An empty range still needs a piece for the SQL to be valid, it matches nothing
+    pieces = plan_range(first_day, last_day, largest) or [("day", first_day, last_day)]
+
+    sql = compile_range_query(query, tuple(tier for tier, _, _ in pieces))
+    val = []
+    for _, first, last in pieces:
+        val.extend((user_id, first, last))
+
+    return sql, val
+
+def get_day_range(start_date=None, end_date=None):
+    """
+    Turn a date range into the first and last day as day ordinals
+
+    Arguments:
+        start_date (string): Start date of the range, the range is open if not given
+        end_date (string): End date of the range, the range is open if not given
+
+    Returns:
+        tuple: First and last day of the range
+    """
+    first = to_day_ordinal(start_date) if start_date else FIRST_DAY
+    last = to_day_ordinal(end_date) if end_date else LAST_DAY
+    return (first, last)
+
+def get_rollup_summary(user_id, db, start_date=None, end_date=None):
+    """
+    Gets summary statistics of a user's spending from the rollups
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+
+    Returns:
+        dict: Same as expenses.get_spending_summary
+    """
+    summary = {"count": 0, "total": 0, "first_date": None, "last_date": None, "average": 0, "largest": 0}
+
+    try:
+        first_day, last_day = get_day_range(start_date, end_date)
+        sql, val = build_range_query("summary", user_id, first_day, last_day)
+        day_range = (user_id, first_day, last_day)
+
+        count, total, largest = db.cached_read(user_id, sql, val)[0]
+        if count:
+            first, last = db.cached_read(user_id, FIRST_LAST_DAY_SQL, day_range * 2)[0]
+    except Exception as e:
+        print(e)
+        return summary
+
+    if count:
+        summary.update({
+            "count": count,
+            "total": from_cents(total),
+            "first_date": from_day_ordinal(first),
+            "last_date": from_day_ordinal(last),
+            "average": from_cents(total / count),
+            "largest": from_cents(largest)
+        })
+
+    return summary
+
+def get_rollup_totals(user_id, db, start_date=None, end_date=None):
+    """
+    Gets the amount spent in each category and with each payment method from the rollups
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+
+    Returns:
+        categories (dict): Category names mapped to the amount spent
+        payment_methods (dict): Payment method names mapped to the amount spent
+    """
+    try:
+        sql, val = build_range_query("totals", user_id, *get_day_range(start_date, end_date))
+        rows = db.cached_read(user_id, sql, val)
+    except Exception as e:
+        print(e)
+        rows = []
+
+    # Names are looked up by id, the dictionaries from the Backend go from name to id
+    category_names = {category_id: name for name, category_id in get_categories_for_user(user_id, db).items()}
+    method_names = {method_id: name for name, method_id in get_payment_methods_for_user(user_id, db).items()}
+
+    categories = {}
+    payment_methods = {}
+    for category_id, payment_method_id, total in rows:
+        category = category_names.get(category_id, UNCATEGORIZED)
+        method = method_names.get(payment_method_id, UNCATEGORIZED)
+        categories[category] = categories.get(category, 0) + total
+        payment_methods[method] = payment_methods.get(method, 0) + total
+
+    categories = {name: from_cents(total) for name, total in categories.items()}
+    payment_methods = {name: from_cents(total) for name, total in payment_methods.items()}
+
+    return categories, payment_methods
+
+def get_rollup_daily_totals(user_id, db, start_date=None, end_date=None):
+    """
+    Gets the total spending per day for a user from the daily totals
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+
+    Returns:
+        list: Same as expenses.get_daily_totals
+    """
+    try:
+        val = (user_id, *get_day_range(start_date, end_date))
+        return [(day, from_cents(total)) for day, total in db.cached_read(user_id, ROLLUP_DAILY_TOTALS_SQL, val)]
+    except Exception as e:
+        print(e)
+        return []
+
+def get_rollup_monthly_totals(user_id, db, start_date=None, end_date=None):
+    """
+    Gets the total spending per month for a user from the rollups
+
+    Arguments:
+        user_id (int): Id of the user
+        db (DatabaseManager): Instance of database manager being used
+        start_date (string): Start date for searching
+        end_date (string): End date for searching
+
+    Returns:
+        list: Tuples of the first day of the month (see to_day_ordinal) and the amount
+              spent that month, sorted by month. Months cut off by the date range only
+              count the days inside it
+    """
+    try:
+        sql, val = build_range_query("monthly_totals", user_id, *get_day_range(start_date, end_date), largest="month")
+        return [(month, from_cents(total)) for month, total in db.cached_read(user_id, sql, val)]
+    except Exception as e:
+        print(e)
+        return []
+
+def rebuild_rollups(db, user_id=None):
+    """
+    Recalculate the daily, monthly and yearly totals from the expenses
+
+    Arguments:
+        db (DatabaseManager): Instance of database manager being used
+        user_id (int): Only rebuild this user's totals. Every user's totals are
+                       rebuilt if not given
+
+    Returns:
+        bool: True if the totals were rebuilt
+              False if not
+    """
+    if user_id is None:
+        delete_where, rebuild_where, val = "", "", ()
+    else:
+        delete_where, rebuild_where, val = "WHERE user_id = ?", "AND user_id = ?", (user_id,)
+
+    try:
+        with db.transaction():
+            # Emptying the larger periods first leaves the daily delete triggers nothing to do
+            for table, _ in reversed(list(TIERS.values())):
+                db.con.execute(f"DELETE FROM {table} {delete_where}", val)
+            db.con.execute(REBUILD_SQL.format(where=rebuild_where), val)
+
+            if user_id is None:
+                db.invalidate()
+            else:
+                db.invalidate(user_id)
+    except Exception as e:
+        print(e)
+        return False
+
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily, monthly and yearly totals of expenses")
+    parser.add_argument("--testing", action="store_true", help="Use the testing database")
+    parser.add_argument("--user", type=int, help="Only rebuild the totals for this user")
+    args = parser.parse_args()
+
+    db = DatabaseManager(testing=args.testing)
+    rebuilt = rebuild_rollups(db, args.user)
+    db.close_connection()
+
+    print("Totals rebuilt" if rebuilt else "Totals could not be rebuilt")
+
+if __name__ == "__main__":
+    main()
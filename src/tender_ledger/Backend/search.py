@@ -0,0 +1,150 @@
+# Author - Daniel Dang
+# Filename - search.py
+# Purpose - Turns the text in the search bar into filters that can use indexes
+#
+# Each word in the search is checked in turn:
+#   - Dates (2024-01 or 2024-01-15) become a range of days
+#   - Amounts (12, 12.5, $12.50) become a range of cents. "12" matches 12.00 to 12.99 and
+#     "12.5" matches 12.50 to 12.59. Since numbers also show up in locations, such as
+#     "Store 12", an amount also matches locations containing it. A bare year such as
+#     "2024" also matches every day of that year. An expense only has one amount, so
+#     when there are several amounts any one of them can match
+#   - Everything else is matched against the location with the full-text index. Words
+#     match as prefixes, so "coff" finds "Coffee Shop", and every word has to match
+
+import calendar
+import re
+from datetime import date
+
+AMOUNT_TERM = re.compile(r"^\$?(\d[\d,]*)(?:\.(\d{0,2}))?$")
+DATE_TERM = re.compile(r"^(\d{4})-(\d{1,2})(?:-(\d{1,2}))?$")
+YEAR_TERM = re.compile(r"^(\d{4})$")
+
+# Range of days that can never match, used for amounts that aren't also a year
+NO_DAYS = (1, 0)
+
+def get_date_range(term):
+    """
+    Get the range of days a date in the search covers
+
+    Argument:
+        term (string): Word from the search, such as 2024-01 or 2024-01-15
+
+    Returns:
+        tuple: First and last day of the range as day ordinals, None if the word isn't a date
+    """
+    match = DATE_TERM.match(term)
+    if not match:
+        return None
+
+    year, month, day = match.groups()
+    try:
+        if day:
+            first = last = date(int(year), int(month), int(day))
+        else:
+            first = date(int(year), int(month), 1)
+            last = date(int(year), int(month), calendar.monthrange(first.year, first.month)[1])
+    except ValueError:
+        return None
+
+    return (first.toordinal(), last.toordinal())
+
+def get_year_range(term):
+    """
+    Get the range of days a bare year in the search covers
+
+    Argument:
+        term (string): Word from the search, such as 2024
+
+    Returns:
+        tuple: First and last day of the year as day ordinals, None if the word isn't a year
+    """
+    match = YEAR_TERM.match(term)
+    if not match:
+        return None
+
+    try:
+        first = date(int(match.group(1)), 1, 1)
+    except ValueError:
+        return None
+
+    return (first.toordinal(), date(first.year, 12, 31).toordinal())
+
+def get_amount_range(term):
+    """
+    Get the range of amounts that start with an amount in the search
+
+    Argument:
+        term (string): Word from the search, such as 12, 12.5 or $12.50
+
+    Returns:
+        tuple: Lowest and highest amount in cents, None if the word isn't an amount
+    """
+    match = AMOUNT_TERM.match(term)
+    if not match:
+        return None
+
+    dollars, cents = match.groups()
+    dollars = int(dollars.replace(",", ""))
+    cents = cents or ""
+
+    # Any digits of cents left off can be anything
+    low = dollars * 100 + int(cents.ljust(2, "0"))
+    high = dollars * 100 + int(cents.ljust(2, "9"))
+    return (low, high)
+
+def to_match_query(terms):
+    """
+    Build a full-text query where every term has to match the start of a word
+
+    Argument:
+        terms (list): Words from the search
+
+    Returns:
+        string: Query for the MATCH operator
+    """
+    # Quoting keeps characters in the terms from being read as FTS5 syntax
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def parse_search(search):
+    """
+    Turn the text in the search bar into filters for the query builder
+
+    Argument:
+        search (string): Text from the search bar
+
+    Returns:
+        dict: search_day (tuple): First and last day the expense must be in
+              search_numbers (list): For each amount, the lowest and highest amount in
+                                     cents, the first and last day of the year it
+                                     could be, and a location query that can match instead
+              search_text (string): Query that the location must match
+              Filters that aren't needed are left out
+    """
+    filters = {}
+    numbers = []
+    text_terms = []
+
+    for term in (search or "").split():
+        date_range = get_date_range(term)
+        if date_range:
+            # Every date in the search has to match, so the ranges overlap
+            if "search_day" in filters:
+                first, last = filters["search_day"]
+                date_range = (max(first, date_range[0]), min(last, date_range[1]))
+            filters["search_day"] = date_range
+            continue
+
+        amount_range = get_amount_range(term)
+        if amount_range:
+            numbers.append((*amount_range, *(get_year_range(term) or NO_DAYS), to_match_query([term])))
+            continue
+
+        text_terms.append(term)
+
+    if numbers:
+        filters["search_numbers"] = numbers
+    if text_terms:
+        filters["search_text"] = to_match_query(text_terms)
+
+    return filters
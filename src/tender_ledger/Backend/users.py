@@ -109,8 +109,9 @@ def get_user(username, password, db):
     val = (username, password,)
 
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
 
@@ -135,8 +136,9 @@ def get_user_by_username(username, db):
     val = (username,)
 
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
 
@@ -161,8 +163,9 @@ def get_user_by_id(id, db):
     val = (id,)
 
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()
     except Exception as e:
         print(e)
 
@@ -183,7 +186,8 @@ def check_if_username_exists(id, username, db):
           """
     val = [id, username]
     try:
-        db.cur.execute(sql, val)
-        return db.cur.fetchall()[0][0] != 0
+        with db.reader() as cur:
+            cur.execute(sql, val)
+            return cur.fetchall()[0][0] != 0
     except Exception as e:
         print(e)
\ No newline at end of file
@@ -4,10 +4,19 @@
 
 import customtkinter
 from tkinter import ttk
-from ....Backend.expenses import get_expenses_for_user
+from ....Backend.expenses import PAGE_SIZE, get_expense_count, get_expenses_page, get_page_key, to_cents
 from ...Elements.pagination import Pagination
 
-OPTIONS_PER_PAGE = 20
+OPTIONS_PER_PAGE = PAGE_SIZE
+
+# Sortable columns mapped to their heading text and the order used by the Backend
+SORT_COLUMNS = {
+    'date': ('Date', 'date'),
+    'amount': ('Amount', 'amount'),
+    'category': ('Category', 'category'),
+    'payment method': ('Payment Method', 'payment_method'),
+    'location': ('Location', 'location'),
+}
 
 class ExpenseTable():
     def __init__(self, parent, controller, filter_section, db):
@@ -26,7 +35,19 @@ class ExpenseTable():
         self.user_id = self.controller.user_id
         self.db = db
 
-        self.expenses = get_expenses_for_user(self.user_id, self.db)
+        # Only the expenses on the current page are loaded
+        self.expenses = []
+        self.filters = {}
+
+        # Key of the last expense before each page, the first page starts at the beginning
+        self.page_keys = [None]
+
+        # Number of expenses matching the filters, counted again only when they might have changed
+        self.total_expenses = None
+
+        # Newest expenses are shown first until a column heading is clicked
+        self.sort_column = 'date'
+        self.descending = True
 
         # Creating table
         self.create_table()
@@ -44,16 +65,14 @@ class ExpenseTable():
         self.expense_table = ttk.Treeview(self.expense_table_frame, columns=columns, show='headings', height=20)
 
         # Create pagination options
-        self.pagination = Pagination(self.expense_table_frame, OPTIONS_PER_PAGE, self.expenses, self.refresh_table)
+        self.pagination = Pagination(self.expense_table_frame, OPTIONS_PER_PAGE, self.expenses, self.load_page, total_items=0)
         self.pagination.grid(row=1, column=0, columnspan=2, sticky="nsew")
         self.pagination.create_pagination_options()
 
-        # Add headers to columns
-        self.expense_table.heading('date', text='Date')
-        self.expense_table.heading('amount', text='Amount')
-        self.expense_table.heading('category', text='Category')
-        self.expense_table.heading('payment method', text='Payment Method')
-        self.expense_table.heading('location', text='Location')
+        # Add headers to columns, clicking a sortable header sorts the table by it
+        for column in SORT_COLUMNS:
+            self.expense_table.heading(column, command=lambda column=column: self.sort_by(column))
+        self.update_headings()
         self.expense_table.heading('edit', text="Edit")
         self.expense_table.heading('delete', text="Delete")
 
@@ -100,9 +119,72 @@ class ExpenseTable():
                 self.controller.display_popup(deleting)
 
 
+    def sort_by(self, column):
+        """
+        Sort the table by a column. Clicking the column the table is already sorted
+        by switches between ascending and descending
+
+        Argument:
+            column (string): Id of the column that was clicked
+        """
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            # Dates start with the newest, everything else starts from the lowest
+            self.sort_column = column
+            self.descending = column == 'date'
+
+        # Go back to the first page since the old page keys are for a different order
+        self.page_keys = [None]
+        self.pagination.current_page = 1
+
+        self.update_headings()
+        self.load_page()
+
+    def update_headings(self):
+        """
+        Show an arrow on the heading of the column the table is sorted by
+        """
+        for column, (text, _) in SORT_COLUMNS.items():
+            if column == self.sort_column:
+                text += " \u25BC" if self.descending else " \u25B2"
+            self.expense_table.heading(column, text=text)
+
+    def get_amount(self, entry):
+        """
+        Get the amount typed into an amount filter. Amounts that aren't numbers are
+        ignored and the field is outlined in red
+
+        Argument:
+            entry (CTkEntry): The amount field
+
+        Returns:
+            string: The amount, None if the field is empty or not a number
+        """
+        amount = entry.get().strip()
+        try:
+            if amount:
+                to_cents(amount)
+        except ValueError:
+            entry.configure(border_color="red")
+            return None
+
+        entry.configure(border_color=customtkinter.ThemeManager.theme["CTkEntry"]["border_color"])
+        return amount or None
+
     def refresh_table(self):
         """
-        Refreshes the table by clearing it and then repopulating it
+        Refreshes the table by clearing it and then repopulating it. Used when the
+        filters are applied or expenses were changed, so the matching expenses are
+        counted again
+        """
+        self.total_expenses = None
+        self.load_page()
+
+    def load_page(self):
+        """
+        Load the current page into the table. Turning pages and sorting reuse the count
+        of matching expenses, since counting has to go through all of them
         """
         # Get current page
         current_page = self.pagination.current_page
@@ -119,41 +201,60 @@ class ExpenseTable():
 
         # Get what are in the search and dropdown filters
         search = self.filter_section.search_bar.get()
-        category_search = self.controller.categories[self.filter_section.category_filter.get()] if self.filter_section.category_filter.get() != "--Category--" else None
-        payment_method_search = self.controller.payment_methods[self.filter_section.method_filter.get()] if self.filter_section.method_filter.get() != "--Payment Method--" else None
+        category_search = [self.controller.categories[category] for category in self.filter_section.category_filter.get()]
+        payment_method_search = [self.controller.payment_methods[method] for method in self.filter_section.method_filter.get()]
+
+        filters = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "category": category_search,
+            "payment_method": payment_method_search,
+            "search": search,
+            "min_amount": self.get_amount(self.filter_section.min_amount),
+            "max_amount": self.get_amount(self.filter_section.max_amount)
+        }
+
+        # Start from the first page when the filters change
+        if filters != self.filters:
+            self.filters = filters
+            self.total_expenses = None
+            self.page_keys = [None]
+            self.pagination.current_page = 1
+            current_page = 1
+
+        # Pages are only turned one at a time, so moving forward starts after the last
+        # expense shown and moving back reuses the key saved for that page
+        page_index = max(current_page, 1) - 1
+        order = SORT_COLUMNS[self.sort_column][1]
+        if page_index >= len(self.page_keys) and self.expenses:
+            self.page_keys.append(get_page_key(self.expenses[-1], order))
+        del self.page_keys[page_index + 1:]
 
-        self.expenses = get_expenses_for_user(self.user_id, self.db, category=category_search, payment_method=payment_method_search, search=search, start_date=start_date, end_date=end_date)
+        self.expenses = get_expenses_page(self.user_id, self.db, filters, after=self.page_keys[-1], limit=OPTIONS_PER_PAGE,
+                                          order=order, descending=self.descending)
+        if self.total_expenses is None:
+            self.total_expenses = get_expense_count(self.user_id, self.db, **filters)
 
         # Clear the table
         for row in self.expense_table.get_children():
             self.expense_table.delete(row)
 
-        # Calculate start and end indices for pagination
-
-        start = OPTIONS_PER_PAGE * (current_page - 1) if current_page != 0 else 0
-        end = min(start + OPTIONS_PER_PAGE, len(self.expenses))
-
         # Add expenses to the table
-        if len(self.expenses) > 0: 
-            for i in range(start, end):
-                expense = self.expenses[i]
-                date = expense[1]
-                amount = f"${expense[0]:.2f}"
-                category = expense[3]
-                payment_method = expense[2]
-                location = expense[4]
+        for expense in self.expenses:
+            date = expense[1]
+            amount = f"${expense[0]:.2f}"
+            category = expense[3]
+            payment_method = expense[2]
+            location = expense[4]
 
-                # Use item identifier of Treeview, makes getting expense ID easier
-                expense_id = expense[-1]
+            # Use item identifier of Treeview, makes getting expense ID easier
+            expense_id = expense[-1]
 
-                display_values = (date, amount, category, payment_method, location, "Edit", "Delete")
-                self.expense_table.insert('', 'end', values=display_values, iid=expense_id)
+            display_values = (date, amount, category, payment_method, location, "Edit", "Delete")
+            self.expense_table.insert('', 'end', values=display_values, iid=expense_id)
 
         # Refresh pagination options
-        self.pagination.create_pagination_options(self.expenses)
+        self.pagination.create_pagination_options(total_items=self.total_expenses)
         self.pagination.calculate_total_pages()
         if current_page > self.pagination.total_pages:
             self.pagination.go_to_prev_page()
-
-        
-   
\ No newline at end of file
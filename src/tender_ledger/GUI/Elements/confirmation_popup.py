@@ -3,7 +3,7 @@
 # Purpose - Handles the appearance and function of the confirmation popup
 
 import customtkinter
-from ...Backend.expenses import delete_expense
+from ...Backend.expenses import delete_expense, delete_expenses
 from ...Backend.categories import delete_category
 from ...Backend.payment_methods import delete_payment_method
 
@@ -11,6 +11,7 @@ from ...Backend.payment_methods import delete_payment_method
 # Defining constants, change title depending on type of page popup is from
 TITLES = {
     "Expense": "Delete Expense",
+    "Expenses": "Delete Expenses",
     "User": "Delete User",
     "Category": "Delete Category",
     "Payment Method": "Delete Payment Method"
@@ -85,6 +86,11 @@ class ConfirmationPopup(customtkinter.CTkToplevel):
             delete_expense(self.action[1], self.db)
             self.action[2].refresh_table()
             self.controller.show_message("Successfully deleted expense")
+
+        elif self.action[0] == "Expenses":
+            deleted = delete_expenses(self.action[1], self.db)
+            self.action[2].refresh_table()
+            self.controller.show_message(f"Successfully deleted \n{sum(deleted)} expenses")
             
         elif self.action[0] == "Category":
             delete_category(self.action[1], self.db)
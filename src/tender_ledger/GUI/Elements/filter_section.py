@@ -4,6 +4,7 @@
 
 import customtkinter
 from tkcalendar import DateEntry
+from .multi_select import MultiSelect
 
 class FilterSection:
     def __init__(self, parent, controller, for_expenses=False):
@@ -66,23 +67,28 @@ class FilterSection:
             # Category Filter
             category_label = customtkinter.CTkLabel(self.input_frame, text="Categories")
             category_label.grid(row=2, column=0, sticky="w")
-            categories = ["--Category--"]
-            for category in self.controller.categories.keys():
-                categories.append(category)
-            self.category_filter = customtkinter.CTkOptionMenu(self.input_frame, values=categories)
+            self.category_filter = MultiSelect(self.input_frame, "--Category--", list(self.controller.categories.keys()))
             self.category_filter.grid(row=3, column=0, sticky="w")
 
             # Payment Method Filter
             payment_method_label = customtkinter.CTkLabel(self.input_frame, text="Payment Methods")
             payment_method_label.grid(row=2, column=1, padx=10, sticky="w")
-            method_of_purchase = ["--Payment Method--"]
-            for method in self.controller.payment_methods.keys():
-                method_of_purchase.append(method)
-            self.method_filter = customtkinter.CTkOptionMenu(self.input_frame, values=method_of_purchase)
+            self.method_filter = MultiSelect(self.input_frame, "--Payment Method--", list(self.controller.payment_methods.keys()))
             self.method_filter.grid(row=3, column=1, padx=10, sticky="w")
 
+            # Amount range filters
+            min_amount_label = customtkinter.CTkLabel(self.input_frame, text="Min Amount")
+            min_amount_label.grid(row=4, column=0, sticky="w")
+            self.min_amount = customtkinter.CTkEntry(self.input_frame, placeholder_text="0.00")
+            self.min_amount.grid(row=5, column=0, sticky="w")
+
+            max_amount_label = customtkinter.CTkLabel(self.input_frame, text="Max Amount")
+            max_amount_label.grid(row=4, column=1, padx=10, sticky="w")
+            self.max_amount = customtkinter.CTkEntry(self.input_frame, placeholder_text="0.00")
+            self.max_amount.grid(row=5, column=1, padx=10, sticky="w")
+
             # Generic search bar
-            self.search_bar = customtkinter.CTkEntry(self.input_frame, placeholder_text = "Search")
+            self.search_bar = customtkinter.CTkEntry(self.input_frame, placeholder_text = "Search location, amount or date")
             self.search_bar.grid(row=3, column=3, columnspan=2, sticky="ew")
 
             current_col = 3
@@ -110,7 +116,10 @@ class FilterSection:
             clear = customtkinter.StringVar(value="")
             self.search_bar.configure(textvariable=clear)
 
-            self.category_filter.set("--Category--")
-            self.method_filter.set("--Payment Method--")
+            self.category_filter.clear()
+            self.method_filter.clear()
+
+            self.min_amount.delete(0, customtkinter.END)
+            self.max_amount.delete(0, customtkinter.END)
 
             self.controller.refresh_table()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# Author - Daniel Dang
+# Filename - import_progress.py
+# Purpose - Handles the appearance and function of the popup shown while a csv file is imported
+
+import customtkinter
+import queue
+import threading
+from ...Backend.csv_utils import import_expenses_csv
+
+# How often, in milliseconds, the popup checks on the import
+POLL_INTERVAL = 100
+
+class ImportProgress(customtkinter.CTkToplevel):
+    def __init__(self, parent, controller, db, user_id, file_path, on_finish):
+        """
+        Initializes a new instance of the ImportProgress popup and starts importing the file
+
+        The import runs on a worker thread so the window stays responsive. The worker only
+        puts updates on a queue, which the popup reads with after() since tkinter widgets
+        can only be changed from the main thread
+
+        Arguments:
+            parent (CTkFrame): The container that will be containing this popup
+            controller (App): The main ui that acts as a controller for deciding what page is visible
+            db (DatabaseManager): Instance of database manager being used
+            user_id (int): The user's id
+            file_path (string): Path to the csv file being imported
+            on_finish (function): Called with the import's report once it is done
+        """
+        super().__init__(parent)
+        self.controller = controller
+        self.on_finish = on_finish
+
+        self.title("Importing CSV")
+        self.center_window()
+
+        # Closing the popup cancels the import rather than leaving it running unseen
+        self.protocol("WM_DELETE_WINDOW", self.cancel_import)
+
+        self.status_label = customtkinter.CTkLabel(self, text="Reading file...", width=300)
+        self.status_label.grid(row=0, column=0, padx=20, pady=(20, 10))
+
+        self.progress_bar = customtkinter.CTkProgressBar(self, width=300)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=1, column=0, padx=20)
+
+        self.cancel_button = customtkinter.CTkButton(self, text="Cancel", command=self.cancel_import)
+        self.cancel_button.grid(row=2, column=0, pady=20)
+
+        # Start importing
+        self.updates = queue.Queue()
+        self.cancel = threading.Event()
+        self.worker = threading.Thread(target=self.run_import, args=(file_path, user_id, db), daemon=True)
+        self.worker.start()
+
+        self.after(POLL_INTERVAL, self.check_progress)
+
+    def center_window(self):
+        """
+        Ensures that the popup shows over the window rather than some random location
+        """
+        # Get dimensions of main window
+        width = self.controller.winfo_width()
+        height = self.controller.winfo_height()
+        main_x = self.controller.winfo_x()
+        main_y = self.controller.winfo_y()
+
+        # Set coordinates of where popup should show
+        x = main_x + (width // 2)
+        y = (main_y//2) + (height // 2)
+
+        self.geometry(f"+{x}+{y}")
+
+    def run_import(self, file_path, user_id, db):
+        """
+        Import the file, runs on the worker thread
+
+        Arguments:
+            file_path (string): Path to the csv file being imported
+            user_id (int): The user's id
+            db (DatabaseManager): Instance of database manager being used
+        """
+        report = import_expenses_csv(file_path, user_id, db, progress=lambda report, fraction: self.updates.put((report, fraction)), cancel=self.cancel)
+        self.updates.put((report, None))
+
+    def check_progress(self):
+        """
+        Show the latest progress from the worker, and finish up once it is done
+        """
+        update = None
+        try:
+            while True:
+                update = self.updates.get_nowait()
+        except queue.Empty:
+            pass
+
+        if update is None:
+            self.after(POLL_INTERVAL, self.check_progress)
+            return
+
+        report, fraction = update
+
+        # A fraction of None means the import is over
+        if fraction is None:
+            self.destroy()
+            self.on_finish(report)
+            return
+
+        self.progress_bar.set(fraction)
+        if not self.cancel.is_set():
+            self.status_label.configure(text=f"{report['parsed']} rows read\n"
+                                             f"{report['inserted']} imported, {report['skipped']} duplicates skipped")
+        self.after(POLL_INTERVAL, self.check_progress)
+
+    def cancel_import(self):
+        """
+        Stop the import. The chunk being imported is rolled back, the popup closes once
+        the worker has stopped
+        """
+        self.cancel.set()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="Cancelling...")
@@ -0,0 +1,83 @@
+# Author - Daniel Dang
+# Filename - multi_select.py
+# Purpose - Handles the appearance and function of dropdowns where several options can be picked
+
+import customtkinter
+
+class MultiSelect(customtkinter.CTkButton):
+    def __init__(self, parent, placeholder, options, **kwargs):
+        """
+        Initializes a new instance of the multi select dropdown. Clicking the button
+        opens a list of checkboxes under it
+
+        Arguments:
+            parent (CTkFrame): The container that will be containing this dropdown
+            placeholder (string): Text shown when nothing is picked
+            options (list): Names of the options that can be picked
+        """
+        super().__init__(parent, text=placeholder, command=self.toggle_dropdown, **kwargs)
+        self.placeholder = placeholder
+        self.options = options
+
+        self.variables = {option: customtkinter.BooleanVar(value=False) for option in options}
+        self.dropdown = None
+
+    def toggle_dropdown(self):
+        """
+        Open the list of options, or close it if it is already open
+        """
+        if self.dropdown is not None:
+            self.close_dropdown()
+            return
+
+        self.dropdown = customtkinter.CTkToplevel(self)
+        self.dropdown.overrideredirect(True)
+        self.dropdown.geometry(f"+{self.winfo_rootx()}+{self.winfo_rooty() + self.winfo_height()}")
+
+        options_frame = customtkinter.CTkScrollableFrame(self.dropdown, width=self.winfo_width(), height=200)
+        options_frame.pack(fill="both", expand=True)
+
+        for option in self.options:
+            checkbox = customtkinter.CTkCheckBox(options_frame, text=option, variable=self.variables[option], command=self.update_text)
+            checkbox.pack(anchor="w", padx=10, pady=2)
+
+        # Close the list when the user clicks somewhere else
+        self.dropdown.bind("<FocusOut>", lambda event: self.close_dropdown())
+        self.dropdown.focus_set()
+
+    def close_dropdown(self):
+        """
+        Close the list of options
+        """
+        if self.dropdown is not None:
+            self.dropdown.destroy()
+            self.dropdown = None
+
+    def update_text(self):
+        """
+        Show what is picked on the button
+        """
+        selected = self.get()
+        if not selected:
+            self.configure(text=self.placeholder)
+        elif len(selected) == 1:
+            self.configure(text=selected[0])
+        else:
+            self.configure(text=f"{len(selected)} selected")
+
+    def get(self):
+        """
+        Get the options that are picked
+
+        Returns:
+            list: Names of the picked options
+        """
+        return [option for option, variable in self.variables.items() if variable.get()]
+
+    def clear(self):
+        """
+        Unpick every option
+        """
+        for variable in self.variables.values():
+            variable.set(False)
+        self.update_text()
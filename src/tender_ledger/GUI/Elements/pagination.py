@@ -5,7 +5,7 @@
 import customtkinter
 
 class Pagination(customtkinter.CTkFrame):
-    def __init__(self, parent, options_per_page, items, on_page_change=None):
+    def __init__(self, parent, options_per_page, items, on_page_change=None, total_items=None):
         """
         Initializes a new instance of the Expense Table
 
@@ -14,11 +14,14 @@ class Pagination(customtkinter.CTkFrame):
             options_per_page(int): The number of options to show per page
             items (list): A list of items that will populate the table
             on_page_change: Command to call when pagination button is pressed
+            total_items (int): Number of items in the table, used instead of items
+                               when the table only loads one page at a time
         """
         super().__init__(parent)
         self.options_per_page = options_per_page
 
         self.items = items
+        self.total_items = total_items
         self.on_page_change = on_page_change
 
         self.pagination_frame = customtkinter.CTkFrame(self)
@@ -26,15 +29,18 @@ class Pagination(customtkinter.CTkFrame):
 
         self.current_page = 1
 
-    def create_pagination_options(self, items=None):
+    def create_pagination_options(self, items=None, total_items=None):
         """
         Displays pagination options for the expenses table
 
-        Argument:
+        Arguments:
             items (list): A list of items that will populate the table
+            total_items (int): Number of items in the table
         """
         if items:
             self.items = items
+        if total_items is not None:
+            self.total_items = total_items
         self.calculate_total_pages()
 
         # Previous button
@@ -56,8 +62,9 @@ class Pagination(customtkinter.CTkFrame):
         """
         Calculate the total number of pages in the table
         """
-        self.total_pages = len(self.items) // self.options_per_page
-        if len(self.items) % self.options_per_page != 0:
+        total_items = self.total_items if self.total_items is not None else len(self.items)
+        self.total_pages = total_items // self.options_per_page
+        if total_items % self.options_per_page != 0:
             self.total_pages += 1
 
     def go_to_prev_page(self):
@@ -4,13 +4,16 @@
 
 import customtkinter
 import platform
-from datetime import datetime
-from ...Backend.expenses import get_expenses_for_user, get_total_spending
-from ...Backend.dashboard import generate_pie_charts, generate_line_plot, generate_bar_chart
+from ...Backend.rollups import get_rollup_summary
+from ...Backend.expense_columns import get_rollup_columns
+from ...Backend.dashboard import get_spending_totals, get_period_totals, generate_pie_charts, generate_line_plot, generate_bar_chart
 from ..Elements.filter_section import FilterSection
 
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+# Longest span of days that the line plot shows day by day, longer spans are shown by month
+DAILY_PLOT_DAYS = 366
+
 class DashboardPage(customtkinter.CTkFrame):
     def __init__(self, parent, controller, db):
         """
@@ -52,7 +55,17 @@ class DashboardPage(customtkinter.CTkFrame):
             user_id (int): The user's id
         """
         self.user_id = user_id
-        self.expenses = get_expenses_for_user(self.user_id, self.db, start_date=self.start_date, end_date=self.end_date)
+        # Totals come from the rollups, which answer a date range with whole years,
+        # whole months and the days left over
+        self.summary = get_rollup_summary(self.user_id, self.db, start_date=self.start_date, end_date=self.end_date)
+        self.monthly = bool(self.summary["count"]) and (self.summary["last_date"] - self.summary["first_date"]).days > DAILY_PLOT_DAYS
+
+        # One read of the rollups as columns is enough for every chart, months are
+        # read whole when the line plot only needs monthly totals
+        columns = get_rollup_columns(self.user_id, self.db, start_date=self.start_date, end_date=self.end_date,
+                                     largest="month" if self.monthly else "day")
+        self.category_totals, self.payment_method_totals = get_spending_totals(columns)
+        self.spending_totals = get_period_totals(columns, self.monthly)
 
         # Header
         label = customtkinter.CTkLabel(self, text="Dashboard", font=self.controller.font_label)
@@ -78,19 +91,15 @@ class DashboardPage(customtkinter.CTkFrame):
 
         date_range_text = "No expenses"
         
-        if self.expenses:
-            # Get all dates from expenses
-            dates = [datetime.strptime(expense[1], "%Y-%m-%d").date() for expense in self.expenses]
+        if self.summary["count"]:
+            earliest_date = self.summary["first_date"]
+            latest_date = self.summary["last_date"]
+            
+            # Format dates
+            earliest_str = earliest_date.strftime("%b %d, %Y")
+            latest_str = latest_date.strftime("%b %d, %Y")
             
-            if dates:
-                earliest_date = min(dates)
-                latest_date = max(dates)
-                
-                # Format dates
-                earliest_str = earliest_date.strftime("%b %d, %Y")
-                latest_str = latest_date.strftime("%b %d, %Y")
-                
-                date_range_text = f"Date Range:\n{earliest_str} - {latest_str}"
+            date_range_text = f"Date Range:\n{earliest_str} - {latest_str}"
         
         # Create date range label
         self.date_range_label = customtkinter.CTkLabel(
@@ -109,16 +118,22 @@ class DashboardPage(customtkinter.CTkFrame):
         self.summary_frame = customtkinter.CTkFrame(self)
 
         # Display Total Spending label
-        total = get_total_spending(self.user_id, self.db, self.start_date, self.end_date)
+        total = self.summary["total"]
 
         total_spending_label = customtkinter.CTkLabel(self.summary_frame, text=f"Total Spending: ${total:.2f}", font=self.controller.font_label)
         total_spending_label.grid(row=0, column=0)
 
         # Display Total Number of Purchases
-        total_purchases = len(self.expenses)
-        total_purchases_label = customtkinter.CTkLabel(self.summary_frame, text=f"Total Purchases: {total_purchases}", font=self.controller.font_label)
+        total_purchases_label = customtkinter.CTkLabel(self.summary_frame, text=f"Total Purchases: {self.summary['count']}", font=self.controller.font_label)
         total_purchases_label.grid(row=0, column=1, padx=20)
 
+        # Display Average and Largest Purchase
+        average_label = customtkinter.CTkLabel(self.summary_frame, text=f"Average Purchase: ${self.summary['average']:.2f}", font=self.controller.font_label)
+        average_label.grid(row=0, column=2, padx=20)
+
+        largest_label = customtkinter.CTkLabel(self.summary_frame, text=f"Largest Purchase: ${self.summary['largest']:.2f}", font=self.controller.font_label)
+        largest_label.grid(row=0, column=3)
+
         self.summary_frame.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=20, pady=10)
 
     def filter_page(self):
@@ -143,7 +158,7 @@ class DashboardPage(customtkinter.CTkFrame):
         categories and payment methods.
         """
         # Generate pie charts
-        category_pie, payment_method_pie = generate_pie_charts(self.expenses)
+        category_pie, payment_method_pie = generate_pie_charts(self.category_totals, self.payment_method_totals)
         self.chart_frame = customtkinter.CTkScrollableFrame(self)
         self.chart_frame.grid(row=3, column=0, columnspan=2, sticky="nsew")
 
@@ -160,7 +175,7 @@ class DashboardPage(customtkinter.CTkFrame):
         line_container = customtkinter.CTkFrame(self.chart_frame)
         line_container.grid(row=0, column=0, pady=20, sticky="nsew")
         
-        line_plot = generate_line_plot(self.expenses)
+        line_plot = generate_line_plot(self.spending_totals, self.monthly)
         line_plot_chart = FigureCanvasTkAgg(figure=line_plot, master=line_container)
         line_plot_chart.get_tk_widget().pack()
 
@@ -176,7 +191,7 @@ class DashboardPage(customtkinter.CTkFrame):
         bar_container = customtkinter.CTkFrame(self.chart_frame)
         bar_container.grid(row=1, column=0, pady=20)
 
-        bar_chart = generate_bar_chart(self.expenses)
+        bar_chart = generate_bar_chart(self.category_totals)
         bar_chart_fig = FigureCanvasTkAgg(figure=bar_chart, master=bar_container)
         bar_chart_fig.get_tk_widget().pack()
 
@@ -5,12 +5,14 @@
 import customtkinter
 
 from ..Elements.Expenses.add_expense_popup import AddExpensePopup
-from ..Elements.Expenses.expense_table import ExpenseTable
+from ..Elements.Expenses.expense_table import SORT_COLUMNS, ExpenseTable
 from ..Elements.confirmation_popup import ConfirmationPopup
 from ..Elements.filter_section import FilterSection 
+from ..Elements.import_progress import ImportProgress
 from ...Backend.categories import get_categories_for_user
 from ...Backend.payment_methods import get_payment_methods_for_user
-from ...Backend.csv_utils import download_expenses_csv, open_file
+from ...Backend.csv_utils import download_expenses_csv, select_csv_file
+from ...Backend.expenses import iter_expenses_for_user
 
 class ExpensesPage(customtkinter.CTkFrame):
     def __init__(self, parent, controller, db):
@@ -58,6 +60,9 @@ class ExpensesPage(customtkinter.CTkFrame):
         download_button = customtkinter.CTkButton(button_frame, text="Download CSV", command=self.download_csv)
         download_button.pack(side="left", padx=(0, 10))
 
+        delete_button = customtkinter.CTkButton(button_frame, text="Delete Selected", command=self.delete_selected)
+        delete_button.pack(side="left", padx=(0, 10))
+
         add_button = customtkinter.CTkButton(button_frame, text="Add", command=self.display_popup)
         add_button.pack(side="left")
 
@@ -99,6 +104,18 @@ class ExpensesPage(customtkinter.CTkFrame):
         popup.grab_set()
         popup.wait_window(popup)
 
+    def delete_selected(self):
+        """
+        Displays the confirmation popup for deleting the expenses selected in the table
+        """
+        expense_ids = [int(expense_id) for expense_id in self.expense_table.expense_table.selection()]
+
+        if not expense_ids:
+            self.controller.show_message("No expenses selected")
+            return
+
+        self.display_popup(deleting=("Expenses", expense_ids, self.expense_table))
+
     def refresh_table(self):
         """
         Refresh the expenses table
@@ -109,13 +126,14 @@ class ExpensesPage(customtkinter.CTkFrame):
         """
         Downloads a csv file using the expenses in the table
         """
-        # Remove the last values from the expenses which were their ids
-        to_download = [list(expense[:-1]) for expense in self.expense_table.expenses]
+        # The table only holds the current page, so stream every expense matching its filters and order
+        table = self.expense_table
+        order = SORT_COLUMNS[table.sort_column][1]
+        expenses = iter_expenses_for_user(self.user_id, self.db, **table.filters, order=order, descending=table.descending)
 
-        # Formatting data by reordering the columns
-        for expense in to_download:
-            expense[0], expense[1] = expense[1], expense[0]
-            expense[2], expense[3] = expense[3], expense[2]
+        # Reorder the columns to match the csv file and remove the ids
+        to_download = ((date, amount, category, payment_method, location)
+                       for amount, date, payment_method, category, location, _ in expenses)
 
         download_expenses_csv(to_download)
 
@@ -123,11 +141,34 @@ class ExpensesPage(customtkinter.CTkFrame):
 
     def import_csv(self):
         """
-        Import a csv file and add them to the user's expenses
+        Import a csv file and add them to the user's expenses, without blocking the window
+        """
+        file_path = select_csv_file()
+        if not file_path:
+            return
+
+        # The import runs in the background, the popup reports back once it is done
+        popup = ImportProgress(parent=self.parent, controller=self.controller, db=self.db, user_id=self.user_id, file_path=file_path, on_finish=self.finish_import)
+
+        # Ensures that the popup is updated and visible before grabbing it
+        popup.update_idletasks()
+        popup.deiconify()
+        popup.grab_set()
+
+    def finish_import(self, report):
+        """
+        Refresh the page once after an import and show how it went
+
+        Argument:
+            report (dict): Report from import_expenses_csv, False if the import failed
         """
-        if open_file(self.user_id, self.db):
+        if report:
             self.refresh_page(self.user_id)
-            self.controller.show_message("Successfully imported \nexpenses")
+            message = "Import cancelled\n" if report["cancelled"] else ""
+            if report["resumed"]:
+                message += f"Resumed after row {report['resumed']}\n"
+            self.controller.show_message(f"{message}Imported {report['inserted']} expenses\n"
+                                         f"{report['skipped']} duplicates skipped, {report['invalid']} invalid rows")
 
         else:
             print("failure")
\ No newline at end of file
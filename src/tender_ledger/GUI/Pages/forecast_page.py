@@ -6,7 +6,8 @@ import customtkinter
 import platform
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from ...Backend.expenses import get_expenses_for_user, get_total_spending
+from ...Backend.expenses import get_total_spending
+from ...Backend.expense_columns import get_rollup_columns
 from ...Backend.forecast import forecast
 
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -58,7 +59,6 @@ class ForecastPage(customtkinter.CTkFrame):
             user_id (int): The user's id
         """
         self.user_id = user_id
-        self.expenses = get_expenses_for_user(self.user_id, self.db, start_date=self.start_date, end_date=self.end_date)
 
         # Header
         label = customtkinter.CTkLabel(self, text="Spending Forecast", font=self.controller.font_label)
@@ -103,10 +103,9 @@ class ForecastPage(customtkinter.CTkFrame):
         # Get expenses
         current_day = datetime.now() if months else None
         start_date = current_day - relativedelta(months=months) if months else None
-        self.expenses = get_expenses_for_user(self.user_id, self.db, start_date=start_date, end_date=current_day)
+        columns = get_rollup_columns(self.user_id, self.db, start_date=start_date, end_date=current_day)
 
-
-        forecast(self.expenses)
+        forecast(columns)
 
 
 
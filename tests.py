@@ -4,11 +4,24 @@
 
 import unittest
 import datetime
+import asyncio
+import itertools
+import threading
+import os
+import tempfile
 from src.tender_ledger.Backend.database import *
+from src.tender_ledger.Backend.migrations import *
 from src.tender_ledger.Backend.categories import *
 from src.tender_ledger.Backend.expenses import *
 from src.tender_ledger.Backend.payment_methods import *
 from src.tender_ledger.Backend.users import *
+from src.tender_ledger.Backend.csv_utils import CHECK_DUPLICATE_SQL, check_duplicate, import_expenses_csv, read_csv_chunks
+from src.tender_ledger.Backend.query_builder import *
+from src.tender_ledger.Backend.async_api import DEFAULT_MAX_READERS, AsyncLedger
+from src.tender_ledger.Backend.expense_columns import get_expense_columns, get_rollup_columns
+from src.tender_ledger.Backend.dashboard import get_spending_totals, get_period_totals
+from src.tender_ledger.Backend.rollups import (FIRST_DAY, LAST_DAY, plan_range, get_rollup_summary, get_rollup_totals,
+                                              get_rollup_daily_totals, get_rollup_monthly_totals, rebuild_rollups)
 
 
 #TODO - break apart into multiple test files
@@ -18,6 +31,205 @@ class Tests(unittest.TestCase):
         self.db = DatabaseManager(testing=True)
         self.user_id = -99
         
+    # For testing database functionality
+    def test_connection_profile_applied(self):
+        """
+        Tests if the connection profile's settings are applied when connecting
+        """
+        journal_mode = self.db.cur.execute("PRAGMA journal_mode").fetchone()[0]
+        busy_timeout = self.db.cur.execute("PRAGMA busy_timeout").fetchone()[0]
+
+        self.assertEqual(self.db.profile, "testing")
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual(busy_timeout, CONNECTION_PROFILES["testing"]["busy_timeout"])
+
+    def test_unknown_connection_profile(self):
+        """
+        Tests if an unknown connection profile is rejected
+        """
+        with self.assertRaises(ValueError):
+            get_connection_profile(True, "missing")
+
+    def test_schema_is_current(self):
+        """
+        Tests if the migrations bring the database up to the latest version
+        """
+        self.assertEqual(get_schema_version(self.db.cur), LATEST_VERSION)
+
+    def test_migrate_when_current(self):
+        """
+        Tests if migrating an up to date database doesn't apply anything again
+        """
+        self.db.clear_tables()
+        add_category(self.user_id, "testing", self.db)
+
+        version = migrate(self.db.con)
+        result = get_categories_for_user(self.user_id, self.db)
+
+        self.assertEqual(version, LATEST_VERSION)
+        self.assertEqual(len(result.keys()), 10)
+
+    def assert_no_table_scan(self, sql, val):
+        """
+        Asserts that the query plan for a query never scans the expenses table
+        """
+        plan = self.db.cur.execute("EXPLAIN QUERY PLAN " + sql, val).fetchall()
+        for row in plan:
+            detail = row[-1]
+            self.assertNotRegex(detail, r"^SCAN (e|expenses)\b", sql)
+
+    def get_totals(self, start_date=None, end_date=None):
+        """
+        Adds up the user's spending by category and by payment method from every expense,
+        to check the rollups against
+        """
+        categories = {}
+        payment_methods = {}
+        for amount, _, payment_method, category, _, _ in get_expenses_for_user(self.user_id, self.db, start_date, end_date):
+            cents = round(amount * 100)
+            categories[category or "Uncategorized"] = categories.get(category or "Uncategorized", 0) + cents
+            payment_methods[payment_method or "Uncategorized"] = payment_methods.get(payment_method or "Uncategorized", 0) + cents
+
+        return ({name: from_cents(total) for name, total in categories.items()},
+                {name: from_cents(total) for name, total in payment_methods.items()})
+
+    def test_expense_queries_use_indexes(self):
+        """
+        Tests if every combination of filters for expense queries is answered by an index
+        """
+        filters = {
+            "start_date": "2024-01-01",
+            "end_date": "2024-12-31",
+            "category": [1, 2],
+            "payment_method": 1,
+            "search": "store 12 2024 2024-01",
+            "min_amount": "10"
+        }
+
+        for size in range(len(filters) + 1):
+            for names in itertools.combinations(filters, size):
+                used = {name: filters[name] for name in names}
+                for build in (build_expenses_query, build_total_spending_query, build_daily_totals_query):
+                    sql, val = build(self.user_id, **used)
+                    self.assert_no_table_scan(sql, val)
+
+                sql, val = build_query("expenses_page", self.user_id, after=(739000, 1), **get_filters(**used))
+                self.assert_no_table_scan(sql, val + [PAGE_SIZE])
+                for query in ("expense_count", "spending_summary", "expense_columns"):
+                    sql, val = build_query(query, self.user_id, **get_filters(**used))
+                    self.assert_no_table_scan(sql, val)
+
+        for order in ORDERS:
+            sql, val = build_query("expenses_page", self.user_id, order, after=(1, 1))
+            self.assert_no_table_scan(sql, val + [PAGE_SIZE])
+
+        self.assert_no_table_scan(CHECK_DUPLICATE_SQL, (get_fingerprint(self.user_id, 739000, 100, 1, 1, "store"),))
+
+    def test_transaction_commits_once(self):
+        """
+        Tests if statements inside a transaction are committed together at the end
+        """
+        self.db.clear_tables()
+        other = DatabaseManager(testing=True)
+
+        with self.db.transaction():
+            add_category(self.user_id, "first", self.db)
+            add_category(self.user_id, "second", self.db)
+
+            # Other connections can't see the work until it is committed
+            self.assertEqual(len(get_categories_for_user(self.user_id, other)), 9)
+
+        self.assertEqual(len(get_categories_for_user(self.user_id, other)), 11)
+        other.close_connection()
+
+    def test_transaction_rolls_back_on_error(self):
+        """
+        Tests if an exception inside a transaction undoes all of its statements
+        """
+        self.db.clear_tables()
+
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                add_category(self.user_id, "first", self.db)
+                add_expense(self.user_id, 10, "2024-01-01", 1, 1, "testing", self.db)
+                raise RuntimeError("cancel")
+
+        self.assertEqual(len(get_categories_for_user(self.user_id, self.db)), 9)
+        self.assertEqual(get_total_spending(self.user_id, self.db), 0)
+        self.assertFalse(self.db.in_transaction())
+
+    def test_nested_transaction_rolls_back_inner_block(self):
+        """
+        Tests if an exception in a nested transaction only undoes the inner block
+        """
+        self.db.clear_tables()
+
+        with self.db.transaction():
+            add_category(self.user_id, "outer", self.db)
+            try:
+                with self.db.transaction():
+                    add_category(self.user_id, "inner", self.db)
+                    raise RuntimeError("cancel")
+            except RuntimeError:
+                pass
+
+        result = get_categories_for_user(self.user_id, self.db)
+        self.assertIn("outer", result)
+        self.assertNotIn("inner", result)
+
+    def test_query_shapes_are_reused(self):
+        """
+        Tests if queries with the same filter shape reuse the same SQL text
+        """
+        first_sql, first_val = build_expenses_query(self.user_id, start_date="2024-01-01", category=1)
+        second_sql, second_val = build_expenses_query(self.user_id, start_date="2023-05-05", category=4)
+        other_sql, _ = build_expenses_query(self.user_id, start_date="2024-01-01")
+
+        self.assertIs(first_sql, second_sql)
+        self.assertIsNot(first_sql, other_sql)
+        self.assertEqual(second_val, [self.user_id, to_day_ordinal("2023-05-05"), 4])
+
+    def test_reading_from_another_thread(self):
+        """
+        Tests if other threads can read while the writer has uncommitted changes
+        """
+        self.db.clear_tables()
+        totals = []
+
+        def read_total():
+            totals.append(get_total_spending(self.user_id, self.db))
+
+        with self.db.transaction():
+            add_expense(self.user_id, 10, "2024-01-01", 1, 1, "testing", self.db)
+
+            worker = threading.Thread(target=read_total)
+            worker.start()
+            worker.join()
+
+            # The writer's own thread sees the uncommitted expense
+            read_total()
+
+        worker = threading.Thread(target=read_total)
+        worker.start()
+        worker.join()
+
+        self.assertEqual(totals, [0, 10, 10])
+
+    def test_writing_from_many_threads(self):
+        """
+        Tests if writes from several threads are all applied without clobbering each other
+        """
+        self.db.clear_tables()
+        rows = [(self.user_id, 1, "2024-01-01", 1, 1, "testing")] * 100
+
+        workers = [threading.Thread(target=add_expenses, args=(rows, self.db)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(get_total_spending(self.user_id, self.db), 400)
+
     # For testing user functionality
     def test_adding_users(self):
         """
@@ -279,6 +491,791 @@ class Tests(unittest.TestCase):
             print(e)
             self.fail("Unable to delete expense")
 
+    def test_amounts_stored_as_cents(self):
+        """
+        Tests if amounts are converted to cents and totals are exact
+        """
+        self.db.clear_tables()
+        add_expense(self.user_id, "0.10", "2024-01-01", 1, 1, "testing", self.db)
+        add_expense(self.user_id, 0.2, "2024-01-02", 1, 1, "testing", self.db)
+        add_expense(self.user_id, "$1,000.005", "2024-01-03", 1, 1, "testing", self.db)
+
+        amounts = self.db.cur.execute("SELECT amount_cents FROM expenses ORDER BY id").fetchall()
+
+        self.assertEqual(amounts, [(10,), (20,), (100001,)])
+        self.assertEqual(get_total_spending(self.user_id, self.db), 1000.31)
+        self.assertFalse(add_expense(self.user_id, "abc", "2024-01-01", 1, 1, "testing", self.db))
+
+    def test_migrate_amounts_to_cents(self):
+        """
+        Tests if amounts stored as floats are converted when migrating
+        """
+        con = sqlite3.connect(":memory:")
+        cur = con.cursor()
+        create_initial_schema(cur)
+        create_expense_indexes(cur)
+        cur.execute("PRAGMA user_version = 2")
+        cur.executemany("INSERT INTO expenses (user_id, amount, date_of_purchase) VALUES (?, ?, ?)",
+                        [(1, 0.1 + 0.2, "2024-01-01"), (1, 19.99, "2024-01-02")])
+        cur.execute("DELETE FROM expenses WHERE amount > 19")
+        con.commit()
+
+        migrate(con)
+        cur.execute("INSERT INTO expenses (user_id, amount_cents, date_of_purchase) VALUES (1, 5, '2024-01-03')")
+
+        rows = cur.execute("SELECT id, amount_cents FROM expenses ORDER BY id").fetchall()
+        self.assertEqual(rows, [(1, 30), (3, 5)])
+        con.close()
+
+    def test_purchase_day_range(self):
+        """
+        Tests if the day of purchase is stored and used for date ranges
+        """
+        self.db.clear_tables()
+        add_expense(self.user_id, 5, "2024-01-01", 1, 1, "testing", self.db)
+        add_expense(self.user_id, 7, datetime(2024, 1, 31, 18, 30), 1, 1, "testing", self.db)
+        add_expense(self.user_id, 11, "2024-02-01", 1, 1, "testing", self.db)
+
+        expenses = get_expenses_for_user(self.user_id, self.db, start_date="2024-01-01", end_date="2024-01-31")
+        daily_totals = get_daily_totals(self.user_id, self.db, end_date=datetime(2024, 1, 31))
+
+        self.assertEqual(len(expenses), 2)
+        self.assertEqual(daily_totals, [(to_day_ordinal("2024-01-01"), 5.0), (to_day_ordinal("2024-01-31"), 7.0)])
+        self.assertEqual(from_day_ordinal(daily_totals[-1][0]), datetime(2024, 1, 31).date())
+
+    def test_bulk_expense_writes(self):
+        """
+        Tests if expenses can be added, updated and deleted in bulk with per row results
+        """
+        self.db.clear_tables()
+        rows = [(self.user_id, i, "2024-01-01", 1, 1, f"store {i}") for i in range(1, 1001)]
+        rows.append((self.user_id, "abc", "2024-01-01", 1, 1, "bad amount"))
+
+        added = add_expenses(rows, self.db)
+        self.assertEqual(added, [True] * 1000 + [False])
+        self.assertEqual(get_total_spending(self.user_id, self.db), 500500)
+
+        ids = [expense[-1] for expense in get_expenses_for_user(self.user_id, self.db)]
+        updated = update_expenses([(1, "2024-01-02", 1, 1, "updated", expense_id) for expense_id in ids] + [(1, "2024-01-02", 1, 1, "missing", -1)], self.db)
+        self.assertEqual(updated, [True] * 1000 + [False])
+        self.assertEqual(get_total_spending(self.user_id, self.db), 1000)
+
+        deleted = delete_expenses(ids[:600] + [-1], self.db)
+        self.assertEqual(deleted, [True] * 600 + [False])
+        self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 400)
+
+    def test_expense_pages(self):
+        """
+        Tests if paging through expenses returns every expense once, in order, for every sort order
+        """
+        self.db.clear_tables()
+
+        # Sort values repeat so that ids have to break the ties, some locations are missing
+        rows = [(self.user_id, i % 9 + 1, f"2024-01-{i % 7 + 1:02}", i % 2 + 1, i % 3 + 1, f"store {i % 4}" if i % 5 else None) for i in range(1, 51)]
+        add_expenses(rows, self.db)
+
+        for order in ORDERS:
+            for descending in (True, False):
+                expected = get_expenses_for_user(self.user_id, self.db, order=order, descending=descending)
+
+                pages = []
+                after = None
+                while True:
+                    page = get_expenses_page(self.user_id, self.db, after=after, limit=7, order=order, descending=descending)
+                    if not page:
+                        break
+                    pages.extend(page)
+                    after = get_page_key(page[-1], order)
+
+                self.assertEqual(pages, expected, (order, descending))
+                self.assertEqual(len(pages), 50)
+
+        amounts = [expense[0] for expense in get_expenses_for_user(self.user_id, self.db, order="amount", descending=False)]
+        self.assertEqual(amounts, sorted(amounts))
+
+        filters = {"category": 1, "start_date": "2024-01-03"}
+        filtered = get_expenses_page(self.user_id, self.db, filters, limit=100)
+
+        self.assertEqual(filtered, get_expenses_for_user(self.user_id, self.db, **filters))
+        self.assertEqual(get_expense_count(self.user_id, self.db, **filters), len(filtered))
+
+    def test_search_expenses(self):
+        """
+        Tests if the search bar matches locations by word prefix, and amounts and dates by range
+        """
+        self.db.clear_tables()
+        add_expense(self.user_id, "12.34", "2024-01-05", 1, 1, "Coffee Shop on Main", self.db)
+        add_expense(self.user_id, "112.00", "2024-02-10", 1, 1, "Store 12", self.db)
+        add_expense(self.user_id, "5.00", "2024-02-11", 1, 1, "Grocery Store", self.db)
+        add_expense(self.user_id, "7.50", "2024-03-01", 1, 1, None, self.db)
+        add_expense(self.user_id, "2024.10", "2023-06-01", 1, 1, "Bakery", self.db)
+
+        def search(text):
+            return sorted(expense[4] or "" for expense in get_expenses_for_user(self.user_id, self.db, search=text))
+
+        self.assertEqual(search("coff"), ["Coffee Shop on Main"])
+        self.assertEqual(search("main COFFEE"), ["Coffee Shop on Main"])
+        self.assertEqual(search("store"), ["Grocery Store", "Store 12"])
+        self.assertEqual(search("12"), ["Coffee Shop on Main", "Store 12"])
+        self.assertEqual(search("$12.3"), ["Coffee Shop on Main"])
+        self.assertEqual(search("7.5"), [""])
+        self.assertEqual(search("2024-02"), ["Grocery Store", "Store 12"])
+        self.assertEqual(search("2024-02-11 store"), ["Grocery Store"])
+        self.assertEqual(search('"quoted'), [])
+
+        # A bare year matches the days in it as well as amounts, and any of several amounts can match
+        self.assertEqual(search("2024"), ["", "Bakery", "Coffee Shop on Main", "Grocery Store", "Store 12"])
+        self.assertEqual(search("2023"), ["Bakery"])
+        self.assertEqual(search("12 7.5"), ["", "Coffee Shop on Main", "Store 12"])
+        self.assertEqual(search("12 7.5 store"), ["Store 12"])
+
+        # The full-text index follows updates and deletes
+        coffee_id = get_expenses_for_user(self.user_id, self.db, search="coffee")[0][-1]
+        update_expense("12.34", "2024-01-05", 1, 1, "Tea House", coffee_id, self.db)
+        self.assertEqual(search("coffee"), [])
+        self.assertEqual(search("tea"), ["Tea House"])
+
+        delete_expense(coffee_id, self.db)
+        self.assertEqual(search("tea"), [])
+
+    def test_amount_and_multi_select_filters(self):
+        """
+        Tests if expenses can be filtered by an amount range and by several categories or payment methods
+        """
+        self.db.clear_tables()
+        category_ids = sorted(get_categories_for_user(self.user_id, self.db).values())[:3]
+        method_ids = sorted(get_payment_methods_for_user(self.user_id, self.db).values())[:2]
+
+        add_expense(self.user_id, "5.00", "2024-01-01", method_ids[0], category_ids[0], "a", self.db)
+        add_expense(self.user_id, "15.00", "2024-01-02", method_ids[1], category_ids[1], "b", self.db)
+        add_expense(self.user_id, "25.00", "2024-01-03", method_ids[0], category_ids[2], "c", self.db)
+        add_expense(self.user_id, "35.00", "2024-01-04", method_ids[1], None, "d", self.db)
+
+        def locations(**filters):
+            return sorted(expense[4] for expense in get_expenses_for_user(self.user_id, self.db, **filters))
+
+        self.assertEqual(locations(min_amount="15"), ["b", "c", "d"])
+        self.assertEqual(locations(max_amount="$25.00"), ["a", "b", "c"])
+        self.assertEqual(locations(min_amount=10, max_amount=30), ["b", "c"])
+        self.assertEqual(locations(min_amount=""), ["a", "b", "c", "d"])
+
+        self.assertEqual(locations(category=category_ids[:2]), ["a", "b"])
+        self.assertEqual(locations(category=[category_ids[2]]), ["c"])
+        self.assertEqual(locations(category=[]), ["a", "b", "c", "d"])
+        self.assertEqual(locations(payment_method=method_ids), ["a", "b", "c", "d"])
+        self.assertEqual(locations(category=category_ids, payment_method=[method_ids[0]], min_amount=10), ["c"])
+
+        self.assertEqual(get_expense_count(self.user_id, self.db, category=category_ids[1:], max_amount=20), 1)
+        self.assertEqual(get_total_spending(self.user_id, self.db, payment_method=[method_ids[1]]), 50)
+
+        # Malformed filters typed into the page are treated like any other failed read
+        for bad_filter in ({"min_amount": "abc"}, {"start_date": "01/05/2024"}, {"end_date": "2024-13-01"}):
+            self.assertEqual(get_expenses_for_user(self.user_id, self.db, **bad_filter), [])
+            self.assertEqual(list(iter_expenses_for_user(self.user_id, self.db, **bad_filter)), [])
+            self.assertEqual(get_expenses_page(self.user_id, self.db, bad_filter), [])
+            self.assertEqual(get_expense_count(self.user_id, self.db, **bad_filter), 0)
+            self.assertEqual(get_total_spending(self.user_id, self.db, **bad_filter), 0)
+            self.assertEqual(get_spending_summary(self.user_id, self.db, **bad_filter)["count"], 0)
+            self.assertEqual(get_daily_totals(self.user_id, self.db, **bad_filter), [])
+
+        self.assertEqual(get_rollup_summary(self.user_id, self.db, start_date="2024-13-01")["count"], 0)
+        self.assertEqual(get_rollup_totals(self.user_id, self.db, end_date="01/05/2024"), ({}, {}))
+        self.assertEqual(get_rollup_daily_totals(self.user_id, self.db, start_date="2024-13-01"), [])
+        self.assertEqual(get_rollup_monthly_totals(self.user_id, self.db, start_date="2024-13-01"), [])
+
+    def test_result_cache(self):
+        """
+        Tests if repeated reads are served from the cache until the user's data changes
+        """
+        self.db.clear_tables()
+        other_user = self.user_id - 1
+        add_expense(self.user_id, 5, "2024-01-01", 1, 1, "testing", self.db)
+
+        get_expenses_for_user(self.user_id, self.db)
+        hits = self.db.cache.hits
+        self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 1)
+        self.assertEqual(self.db.cache.hits, hits + 1)
+
+        # Another user's changes leave the cached result alone
+        add_expense(other_user, 5, "2024-01-01", 1, 1, "testing", self.db)
+        get_expenses_for_user(self.user_id, self.db)
+        self.assertEqual(self.db.cache.hits, hits + 2)
+
+        # The user's own changes are seen right away, including ones made in a transaction
+        add_expense(self.user_id, 7, "2024-01-02", 1, 1, "testing", self.db)
+        expense_id = get_expenses_for_user(self.user_id, self.db)[0][-1]
+        self.assertEqual(get_total_spending(self.user_id, self.db), 12)
+
+        with self.db.transaction():
+            update_expense(9, "2024-01-02", 1, 1, "testing", expense_id, self.db)
+        self.assertEqual(get_total_spending(self.user_id, self.db), 14)
+
+        delete_expenses([expense_id], self.db)
+        self.assertEqual(get_total_spending(self.user_id, self.db), 5)
+
+        # Renaming a shared default category changes every user's results
+        name, category_id = next(iter(get_categories_for_user(other_user, self.db).items()))
+        add_expense(other_user, 3, "2024-01-03", 1, category_id, "testing", self.db)
+        self.assertEqual(get_expenses_for_user(other_user, self.db)[0][3], name)
+
+        update_category(category_id, "renamed", self.db)
+        self.assertEqual(get_expenses_for_user(other_user, self.db)[0][3], "renamed")
+        update_category(category_id, name, self.db)
+
+    def test_spending_summary(self):
+        """
+        Tests if the spending summary matches the user's expenses
+        """
+        self.db.clear_tables()
+        self.assertEqual(get_spending_summary(self.user_id, self.db)["count"], 0)
+
+        add_expense(self.user_id, "10.25", "2024-03-05", 1, 1, "testing", self.db)
+        add_expense(self.user_id, "4.75", "2024-01-02", 1, 2, "testing", self.db)
+        add_expense(self.user_id, 30, "2024-02-10", 1, 1, "testing", self.db)
+
+        summary = get_spending_summary(self.user_id, self.db)
+        filtered = get_spending_summary(self.user_id, self.db, category=1, end_date="2024-03-01")
+
+        self.assertEqual(summary, {
+            "count": 3,
+            "total": 45.0,
+            "first_date": datetime(2024, 1, 2).date(),
+            "last_date": datetime(2024, 3, 5).date(),
+            "average": 15.0,
+            "largest": 30.0
+        })
+        self.assertEqual((filtered["count"], filtered["total"]), (1, 30.0))
+
+    def test_daily_rollup(self):
+        """
+        Tests if the daily rollup follows changes to expenses and gives the same totals as the expenses
+        """
+        self.db.clear_tables()
+        category_ids = sorted(get_categories_for_user(self.user_id, self.db).values())[:2]
+        method_ids = sorted(get_payment_methods_for_user(self.user_id, self.db).values())[:2]
+
+        add_expenses([
+            (self.user_id, "10.25", "2024-01-02", method_ids[0], category_ids[0], "a"),
+            (self.user_id, "4.75", "2024-01-02", method_ids[0], category_ids[0], "b"),
+            (self.user_id, "30", "2024-01-02", method_ids[1], None, "c"),
+            (self.user_id, "8", "2024-02-10", method_ids[1], category_ids[1], "d"),
+            (self.user_id, "2", "2024-03-01", None, category_ids[1], "e"),
+        ], self.db)
+        ids = {expense[4]: expense[5] for expense in get_expenses_for_user(self.user_id, self.db)}
+        update_expense("12", "2024-02-11", method_ids[0], category_ids[1], "a", ids["a"], self.db)
+        delete_expense(ids["e"], self.db)
+
+        rollup_sql = "SELECT * FROM expense_daily_rollup WHERE user_id = ? ORDER BY 2, 3, 4"
+        rollup = self.db.cur.execute(rollup_sql, (self.user_id,)).fetchall()
+        day = datetime(2024, 1, 2).date().toordinal()
+        self.assertEqual(len(rollup), 4)
+        self.assertIn((self.user_id, day, category_ids[0], method_ids[0], 475, 1, 475), rollup)
+        self.assertIn((self.user_id, day, 0, method_ids[1], 3000, 1, 3000), rollup)
+
+        # The same numbers as reading every expense
+        for start_date, end_date in ((None, None), ("2024-01-01", "2024-02-10"), ("2024-02-11", None)):
+            summary = get_rollup_summary(self.user_id, self.db, start_date, end_date)
+            self.assertEqual(summary, get_spending_summary(self.user_id, self.db, start_date, end_date))
+            self.assertEqual(get_rollup_daily_totals(self.user_id, self.db, start_date, end_date),
+                             get_daily_totals(self.user_id, self.db, start_date, end_date))
+
+            self.assertEqual(get_rollup_totals(self.user_id, self.db, start_date, end_date), self.get_totals(start_date, end_date))
+
+        # Rebuilding puts back totals that were lost
+        self.db.execute_statement("DELETE FROM expense_daily_rollup WHERE user_id = ?", (self.user_id,))
+        self.assertTrue(rebuild_rollups(self.db, self.user_id))
+        self.assertEqual(self.db.cur.execute(rollup_sql, (self.user_id,)).fetchall(), rollup)
+        self.assertEqual(get_rollup_summary(self.user_id, self.db)["total"], 54.75)
+
+    def test_rollup_range_planner(self):
+        """
+        Tests if date ranges are split into whole years, whole months and edge days, and
+        if totals read through the monthly and yearly rollups match the expenses
+        """
+        day = lambda *value: datetime(*value).date().toordinal()
+
+        self.assertEqual(plan_range(day(2014, 3, 15), day(2024, 6, 20)), [
+            ("day", day(2014, 3, 15), day(2014, 3, 31)),
+            ("month", day(2014, 4, 1), day(2014, 12, 31)),
+            ("year", day(2015, 1, 1), day(2023, 12, 31)),
+            ("month", day(2024, 1, 1), day(2024, 5, 31)),
+            ("day", day(2024, 6, 1), day(2024, 6, 20)),
+        ])
+        self.assertEqual(plan_range(day(2024, 1, 5), day(2024, 1, 20)), [("day", day(2024, 1, 5), day(2024, 1, 20))])
+        self.assertEqual(plan_range(day(2024, 2, 1), day(2024, 3, 31), "month"), [("month", day(2024, 2, 1), day(2024, 3, 31))])
+        self.assertEqual(plan_range(day(2023, 1, 1), day(2024, 12, 31), "month"), [("month", day(2023, 1, 1), day(2024, 12, 31))])
+        self.assertEqual(plan_range(FIRST_DAY, LAST_DAY), [("year", FIRST_DAY, LAST_DAY)])
+        self.assertEqual(plan_range(day(2024, 1, 2), day(2024, 1, 1)), [])
+
+        self.db.clear_tables()
+        category_ids = sorted(get_categories_for_user(self.user_id, self.db).values())[:3]
+        method_ids = sorted(get_payment_methods_for_user(self.user_id, self.db).values())[:2]
+        add_expenses([
+            (self.user_id, i * 1.25, datetime.fromordinal(day(2019, 1, 1) + i * 17).date().isoformat(),
+             method_ids[i % 2], category_ids[i % 3] if i % 5 else None, "testing")
+            for i in range(300)
+        ], self.db)
+
+        ids = [expense[5] for expense in get_expenses_for_user(self.user_id, self.db)]
+        update_expense("99.99", "2020-02-29", method_ids[0], category_ids[0], "testing", ids[0], self.db)
+        delete_expenses(ids[1:20], self.db)
+
+        def check_tables():
+            expected = self.db.cur.execute("""
+                                           SELECT user_id, purchase_day, IFNULL(category_id, 0), IFNULL(payment_method_id, 0),
+                                                  SUM(amount_cents), COUNT(*), MAX(amount_cents)
+                                           FROM expenses WHERE user_id = ? GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+                                           """, (self.user_id,)).fetchall()
+            actual = self.db.cur.execute("SELECT * FROM expense_daily_rollup WHERE user_id = ? ORDER BY 1, 2, 3, 4", (self.user_id,)).fetchall()
+            self.assertEqual(actual, expected)
+
+            for table, column, start in (("expense_monthly_rollup", "month_start", "start of month"),
+                                         ("expense_yearly_rollup", "year_start", "start of year")):
+                expected = self.db.cur.execute(f"""
+                                               SELECT user_id, CAST(julianday(date(day + 1721424.5, '{start}')) - 1721424.5 AS INTEGER),
+                                                      category_id, payment_method_id, SUM(total), SUM(count), MAX(max_cents)
+                                               FROM expense_daily_rollup WHERE user_id = ? GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+                                               """, (self.user_id,)).fetchall()
+                actual = self.db.cur.execute(f"SELECT * FROM {table} WHERE user_id = ? ORDER BY 1, 2, 3, 4", (self.user_id,)).fetchall()
+                self.assertEqual(actual, expected)
+
+        def check_ranges():
+            for start_date, end_date in ((None, None), ("2019-03-15", "2031-06-20"), ("2020-01-01", "2022-12-31"), ("2021-05-03", "2021-05-30")):
+                summary = get_rollup_summary(self.user_id, self.db, start_date, end_date)
+                expected = get_spending_summary(self.user_id, self.db, start_date, end_date)
+                self.assertAlmostEqual(summary.pop("average"), expected.pop("average"))
+                self.assertEqual(summary, expected)
+
+                self.assertEqual(get_rollup_totals(self.user_id, self.db, start_date, end_date), self.get_totals(start_date, end_date))
+
+                # Columns read from the rollups add up to the same totals as the expenses
+                daily_columns = get_rollup_columns(self.user_id, self.db, start_date, end_date)
+                monthly_columns = get_rollup_columns(self.user_id, self.db, start_date, end_date, largest="month")
+                self.assertEqual(get_spending_totals(daily_columns), self.get_totals(start_date, end_date))
+                self.assertEqual(get_spending_totals(monthly_columns), self.get_totals(start_date, end_date))
+                self.assertEqual(int(monthly_columns.counts.sum()), expected["count"])
+                self.assertEqual([(daily_day, round(total, 2)) for daily_day, total in get_period_totals(daily_columns)],
+                                 [(daily_day, round(total, 2)) for daily_day, total in get_daily_totals(self.user_id, self.db, start_date, end_date)])
+                self.assertEqual([(month, round(total, 2)) for month, total in get_period_totals(monthly_columns, monthly=True)],
+                                 [(month, round(total, 2)) for month, total in get_rollup_monthly_totals(self.user_id, self.db, start_date, end_date)])
+
+                monthly = {}
+                for daily_day, total in get_daily_totals(self.user_id, self.db, start_date, end_date):
+                    month = datetime.fromordinal(daily_day).replace(day=1).toordinal()
+                    monthly[month] = monthly.get(month, 0) + total
+                self.assertEqual([(month, round(total, 2)) for month, total in get_rollup_monthly_totals(self.user_id, self.db, start_date, end_date)],
+                                 [(month, round(total, 2)) for month, total in monthly.items()])
+
+        check_tables()
+        check_ranges()
+
+        # Taking out the largest expenses leaves the rollups to find the next largest
+        largest = get_expenses_for_user(self.user_id, self.db, order="amount")[:2]
+        delete_expense(largest[0][5], self.db)
+        self.db.execute_statement("UPDATE expenses SET amount_cents = 50 WHERE id = ?", (largest[1][5],))
+        self.db.invalidate(self.user_id)
+        check_tables()
+        check_ranges()
+
+        self.db.execute_statement("DELETE FROM expense_yearly_rollup WHERE user_id = ?", (self.user_id,))
+        self.assertTrue(rebuild_rollups(self.db, self.user_id))
+        check_tables()
+
+    def test_import_expenses_csv(self):
+        """
+        Tests if importing a csv file adds the valid rows, reports the invalid ones and
+        skips expenses that were already imported
+        """
+        self.db.clear_tables()
+        contents = (
+            "Date,Amount,Category,Payment Method,Location\n"
+            "2024-01-05,12.345,Food,Cash,Market\n"
+            "01/06/2024,\"$1,200.00\",Brand New,Credit,\n"
+            "2024-01-07,abc,Food,Cash,Store\n"
+            "not a date,5,Food,Cash,Store\n"
+            "2024-01-08,-3.50,,,\"Two\nLines\"\n"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            report = import_expenses_csv(file_path, self.user_id, self.db)
+            again = import_expenses_csv(file_path, self.user_id, self.db)
+
+            # Chunks end on whole rows, even inside a quoted value that runs over two lines
+            chunks = list(read_csv_chunks(file_path, chunk_size=2))
+            self.assertEqual([len(df) for df, _ in chunks], [2, 2, 1])
+            self.assertEqual(chunks[-1][0]["Location"].tolist(), ["Two\nLines"])
+            self.assertEqual(chunks[-1][1], os.path.getsize(file_path))
+
+            self.db.clear_tables()
+            chunked = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2)
+
+        self.assertEqual(chunked, report)
+        self.assertEqual(report, {
+            "parsed": 5,
+            "inserted": 3,
+            "skipped": 0,
+            "invalid": 2,
+            "errors": {3: "Invalid amount: abc", 4: "Invalid date: not a date"},
+            "cancelled": False,
+            "resumed": 0
+        })
+        self.assertEqual((again["inserted"], again["skipped"]), (0, 3))
+
+        expenses = sorted(get_expenses_for_user(self.user_id, self.db), key=lambda expense: expense[1])
+        self.assertEqual([expense[:5] for expense in expenses], [
+            (12.35, "2024-01-05", "Cash", "Food", "Market"),
+            (1200.0, "2024-01-06", "Credit", "Brand New", None),
+            (-3.5, "2024-01-08", None, None, "Two\nLines"),
+        ])
+        self.assertIn("Brand New", get_categories_for_user(self.user_id, self.db))
+
+    def test_import_updates_search_and_rollups(self):
+        """
+        Tests if an import adds its chunks to the search index and the daily, monthly and
+        yearly totals, puts their triggers back, and doesn't count rows the insert ignored
+        """
+        self.db.clear_tables()
+        food = get_categories_for_user(self.user_id, self.db)["Food"]
+        cash = get_payment_methods_for_user(self.user_id, self.db)["Cash"]
+        self.assertTrue(add_expense(self.user_id, "20", "2024-01-05", cash, food, "Corner Shop", self.db))
+
+        contents = "Date,Amount,Category,Payment Method,Location\n" + "".join(
+            f"{day},{amount},Food,Cash,{location}\n" for day, amount, location in (
+                ("2024-01-05", 30, "Market"),
+                ("2024-01-31", 5, "Bakery"),
+                ("2024-02-01", 7, "Market"),
+                ("2024-02-01", 7, "Market"),
+                ("2023-12-31", 40, "Bakery"),
+            ))
+        triggers_sql = "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+        triggers = self.db.cur.execute(triggers_sql).fetchall()
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2)
+            self.assertEqual((report["inserted"], report["skipped"]), (4, 1))
+            self.assertEqual(self.db.cur.execute(triggers_sql).fetchall(), triggers)
+
+            # The totals of every period match the ones rebuilt from the expenses
+            rollups = [self.db.cur.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4").fetchall()
+                       for table, _, _ in ROLLUP_TABLES]
+            self.assertTrue(rebuild_rollups(self.db))
+            self.assertEqual([self.db.cur.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4").fetchall()
+                              for table, _, _ in ROLLUP_TABLES], rollups)
+            self.assertEqual(rollups[1][0][4:], (4000, 1, 4000))
+            self.assertEqual(rollups[1][1][4:], (5500, 3, 3000))
+
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db, search="Market")), 2)
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db, search="bake")), 2)
+
+            # A row whose fingerprint an uncommitted expense holds is ignored by the insert
+            self.db.clear_tables()
+            food = get_categories_for_user(self.user_id, self.db)["Food"]
+            cash = get_payment_methods_for_user(self.user_id, self.db)["Cash"]
+            with self.db.transaction():
+                self.assertTrue(add_expense(self.user_id, "30", "2024-01-05", cash, food, "Market", self.db))
+                report = import_expenses_csv(file_path, self.user_id, self.db)
+            self.assertEqual((report["inserted"], report["skipped"]), (3, 2))
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 4)
+
+    def test_cancel_import_expenses_csv(self):
+        """
+        Tests if cancelling an import keeps the chunks already committed and rolls back
+        the one being imported
+        """
+        self.db.clear_tables()
+        contents = "Date,Amount,Category,Payment Method,Location\n" + "".join(
+            f"2024-01-{day:02d},{day},Food,Cash,Store\n" for day in range(1, 7))
+
+        class CancelAfter:
+            """
+            Reports the import as cancelled once is_set has been checked a number of times
+            """
+            def __init__(self, checks):
+                self.checks = checks
+
+            def is_set(self):
+                self.checks -= 1
+                return self.checks < 0
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            # Cancel from the progress callback once the first chunk is committed
+            cancel = threading.Event()
+            updates = []
+            def progress(report, fraction):
+                updates.append((report["parsed"], report["inserted"], report["skipped"], fraction))
+                cancel.set()
+
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2, progress=progress, cancel=cancel)
+            self.assertTrue(report["cancelled"])
+            self.assertEqual(updates, [(2, 2, 0, contents.index("2024-01-03") / len(contents))])
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 2)
+
+            # Cancelling while the chunk's statements run rolls all of them back
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=6, cancel=CancelAfter(1))
+            self.assertEqual((report["cancelled"], report["parsed"], report["inserted"]), (True, 2, 2))
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 2)
+
+            # The rest of the file can still be imported afterwards
+            report = import_expenses_csv(file_path, self.user_id, self.db, cancel=threading.Event())
+            self.assertEqual((report["cancelled"], report["inserted"], report["skipped"]), (False, 6, 0))
+
+    def test_resume_import_expenses_csv(self):
+        """
+        Tests if importing a file again after an import was interrupted carries on from
+        the last chunk that was committed
+        """
+        self.db.clear_tables()
+        contents = "Date,Amount,Category,Payment Method,Location\n" + "".join(
+            f"2024-02-{day:02d},{day},Food,Cash,Store\n" for day in range(1, 6)) + "bad date,1,Food,Cash,Store\n"
+        journal_sql = "SELECT byte_offset, rows_committed, inserted, completed FROM imports WHERE user_id = ?"
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            # Stop the import after its second chunk, as if the app had closed
+            def crash(report, fraction):
+                if report["parsed"] == 4:
+                    raise KeyboardInterrupt
+
+            with self.assertRaises(KeyboardInterrupt):
+                import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2, progress=crash)
+            self.assertEqual(self.db.cur.execute(journal_sql, (self.user_id,)).fetchall(),
+                             [(contents.index("2024-02-05"), 4, 4, 0)])
+
+            # Only the rows after the journal's offset are read again, and they keep their row numbers
+            parsed = []
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2,
+                                         progress=lambda report, fraction: parsed.append(report["parsed"]))
+            self.assertEqual(parsed, [6])
+            self.assertEqual((report["resumed"], report["inserted"], report["skipped"], report["errors"]),
+                             (4, 5, 0, {6: "Invalid date: bad date"}))
+            self.assertEqual(self.db.cur.execute(journal_sql, (self.user_id,)).fetchall(), [(len(contents), 6, 5, 1)])
+            self.assertEqual(len(get_expenses_for_user(self.user_id, self.db)), 5)
+
+            # A file that was fully imported is gone through again from the start
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2)
+            self.assertEqual((report["resumed"], report["inserted"], report["skipped"]), (0, 0, 5))
+
+    def test_resume_import_with_blank_lines(self):
+        """
+        Tests if blank lines, which aren't rows, leave the chunks, the journal and the
+        row numbers of a resumed import the same as a file without them
+        """
+        self.db.clear_tables()
+        rows = [f"2024-03-{day:02d},{day},Food,Cash,Store\n" for day in range(1, 6)] + ["bad date,1,Food,Cash,Store\n"]
+        contents = ("Date,Amount,Category,Payment Method,Location\n" + rows[0] + "\n" + rows[1] + "   \n"
+                    + "".join(rows[2:5]) + "\n" + rows[5] + "\n")
+        journal_sql = "SELECT byte_offset, rows_committed, inserted, completed FROM imports WHERE user_id = ?"
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            self.assertEqual([len(df) for df, _ in read_csv_chunks(file_path, chunk_size=2)], [2, 2, 2, 0])
+
+            def crash(report, fraction):
+                if report["parsed"] == 4:
+                    raise KeyboardInterrupt
+
+            with self.assertRaises(KeyboardInterrupt):
+                import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2, progress=crash)
+            self.assertEqual(self.db.cur.execute(journal_sql, (self.user_id,)).fetchall(),
+                             [(contents.index(rows[4]), 4, 4, 0)])
+
+            report = import_expenses_csv(file_path, self.user_id, self.db, chunk_size=2)
+            self.assertEqual((report["resumed"], report["parsed"], report["inserted"], report["errors"]),
+                             (4, 6, 5, {6: "Invalid date: bad date"}))
+            self.assertEqual(self.db.cur.execute(journal_sql, (self.user_id,)).fetchall(), [(len(contents), 6, 5, 1)])
+
+    def test_expense_fingerprints(self):
+        """
+        Tests if fingerprints find duplicates, including ones without a location, while
+        still allowing the same expense to be entered twice by hand
+        """
+        self.db.clear_tables()
+        fingerprint_sql = "SELECT fingerprint FROM expenses WHERE user_id = ? ORDER BY id"
+
+        self.assertTrue(add_expense(self.user_id, "5", "2024-01-05", None, None, None, self.db))
+        self.assertTrue(add_expense(self.user_id, "5", "2024-01-05", None, None, None, self.db))
+        self.assertTrue(add_expense(self.user_id, "7", "2024-01-06", None, None, "  Corner   STORE ", self.db))
+
+        first, second, third = [row[0] for row in self.db.cur.execute(fingerprint_sql, (self.user_id,)).fetchall()]
+        self.assertEqual(first, get_fingerprint(self.user_id, datetime(2024, 1, 5).date().toordinal(), 500, None, None, ""))
+        self.assertEqual(first, fingerprint_v9(self.user_id, datetime(2024, 1, 5).date().toordinal(), 500, None, None, ""))
+        self.assertIsNone(second)
+
+        self.assertTrue(check_duplicate(self.user_id, self.db, "2024-01-05", 5, None, None, None))
+        self.assertTrue(check_duplicate(self.user_id, self.db, "2024-01-06", "7.00", None, None, "corner store"))
+        self.assertFalse(check_duplicate(self.user_id + 1, self.db, "2024-01-06", "7.00", None, None, "corner store"))
+
+        # Changing an expense to match another one keeps the change, without a fingerprint
+        third_id = get_expenses_for_user(self.user_id, self.db, search="corner")[0][-1]
+        self.assertTrue(update_expense("5", "2024-01-05", None, None, "", third_id, self.db))
+        self.assertIsNone(self.db.cur.execute("SELECT fingerprint FROM expenses WHERE id = ?", (third_id,)).fetchone()[0])
+
+        contents = (
+            "Date,Amount,Category,Payment Method,Location\n"
+            "2024-01-05,5.00,,,\n"
+            "2024-01-09,1.00,,,Cafe\n"
+            "2024-01-09,1.00,,,cafe\n"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "expenses.csv")
+            with open(file_path, "w", newline="") as file:
+                file.write(contents)
+
+            report = import_expenses_csv(file_path, self.user_id, self.db)
+
+        self.assertEqual((report["inserted"], report["skipped"]), (1, 2))
+        self.assertEqual(get_expense_count(self.user_id, self.db), 4)
+
+        # Deleting or changing the copy with the fingerprint passes it on to the next copy
+        first_id, second_id = [expense[-1] for expense in get_expenses_for_user(self.user_id, self.db, search="5.00", order="amount", descending=False)
+                               if expense[-1] != third_id]
+        self.assertTrue(delete_expense(first_id, self.db))
+        self.assertEqual(self.db.cur.execute("SELECT fingerprint FROM expenses WHERE id = ?", (second_id,)).fetchone()[0], first)
+        self.assertTrue(update_expense("6", "2024-01-05", None, None, "", second_id, self.db))
+        self.assertEqual(self.db.cur.execute("SELECT fingerprint FROM expenses WHERE id = ?", (third_id,)).fetchone()[0], first)
+
+        def reimport():
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, "expenses.csv")
+                with open(file_path, "w", newline="") as file:
+                    file.write(contents)
+                return import_expenses_csv(file_path, self.user_id, self.db)
+
+        report = reimport()
+        self.assertEqual((report["inserted"], report["skipped"]), (0, 3))
+
+        # Once the last copy is gone the expense can be imported again
+        self.assertEqual(delete_expenses([third_id], self.db), [True])
+        report = reimport()
+        self.assertEqual((report["inserted"], report["skipped"]), (1, 2))
+
+    def test_iter_expenses_for_user(self):
+        """
+        Tests if streaming expenses gives the same rows as getting them all at once
+        """
+        self.db.clear_tables()
+        add_expenses([(self.user_id, i, "2024-01-01", 1, i % 3 + 1, "testing") for i in range(1, 11)], self.db)
+
+        streamed = list(iter_expenses_for_user(self.user_id, self.db, batch_size=3))
+        filtered = list(iter_expenses_for_user(self.user_id, self.db, category=1, order="amount", batch_size=2))
+
+        self.assertEqual(streamed, get_expenses_for_user(self.user_id, self.db))
+        self.assertEqual(filtered, get_expenses_for_user(self.user_id, self.db, category=1, order="amount"))
+
+    def test_expense_columns(self):
+        """
+        Tests if the columnar expenses and the totals made from them match the rows
+        """
+        self.db.clear_tables()
+        categories = get_categories_for_user(self.user_id, self.db)
+        methods = get_payment_methods_for_user(self.user_id, self.db)
+        category_ids = list(categories.values())
+        method_ids = list(methods.values())
+
+        rows = [(self.user_id, f"{i}.25", f"2024-01-{i % 28 + 1:02}", method_ids[i % 2], category_ids[i % 3], "testing") for i in range(1, 31)]
+        rows.append((self.user_id, "1.00", "2024-02-01", None, None, "testing"))
+        add_expenses(rows, self.db)
+
+        columns = get_expense_columns(self.user_id, self.db)
+        expenses = get_expenses_for_user(self.user_id, self.db)
+
+        self.assertEqual(len(columns), len(expenses))
+        self.assertEqual(columns.counts.tolist(), [1] * len(expenses))
+        self.assertEqual(int(columns.amount_cents.sum()), round(sum(expense[0] for expense in expenses) * 100))
+        self.assertEqual(columns.purchase_day.tolist(), sorted(to_day_ordinal(expense[1]) for expense in expenses))
+
+        category_totals, method_totals = get_spending_totals(columns)
+        expected = {}
+        for expense in expenses:
+            name = expense[3] or "Uncategorized"
+            expected[name] = expected.get(name, 0) + expense[0]
+
+        self.assertEqual(category_totals.keys(), expected.keys())
+        for name, total in expected.items():
+            self.assertAlmostEqual(category_totals[name], total)
+        self.assertAlmostEqual(sum(method_totals.values()), sum(expected.values()))
+
+        # The rollups give the same totals from one row per day (or year), category and payment method
+        rollup_columns = get_rollup_columns(self.user_id, self.db)
+        yearly_columns = get_rollup_columns(self.user_id, self.db, largest="year")
+        self.assertLess(len(yearly_columns), len(columns))
+        self.assertEqual(int(yearly_columns.counts.sum()), len(expenses))
+        self.assertEqual(get_spending_totals(yearly_columns), get_spending_totals(columns))
+        self.assertEqual(get_period_totals(rollup_columns), get_period_totals(columns))
+
+        self.assertEqual(len(get_expense_columns(self.user_id, self.db, start_date="2030-01-01")), 0)
+        self.assertEqual(len(get_rollup_columns(self.user_id, self.db, start_date="2030-01-01")), 0)
+        self.assertEqual(len(get_expense_columns(self.user_id, self.db, min_amount="abc")), 0)
+
+    def test_async_ledger(self):
+        """
+        Tests if the asyncio version of the Backend can read and write concurrently
+        """
+        self.db.clear_tables()
+
+        async def run():
+            async with AsyncLedger(self.db) as ledger:
+                added = await asyncio.gather(*[
+                    ledger.add_expense(self.user_id, i, "2024-01-01", 1, 1, "testing") for i in range(1, 11)
+                ])
+                total, categories = await asyncio.gather(
+                    ledger.get_total_spending(self.user_id),
+                    ledger.get_categories_for_user(self.user_id)
+                )
+                streamed = [row async for row in ledger.iter_expenses(self.user_id, batch_size=3)]
+
+                # Stopping early shouldn't leave the reading thread stuck
+                async for row in ledger.iter_expenses(self.user_id, batch_size=1):
+                    break
+
+                return added, total, categories, streamed
+
+        added, total, categories, streamed = asyncio.run(run())
+
+        self.assertTrue(all(added))
+        self.assertEqual(total, 55)
+        self.assertEqual(len(categories), 9)
+        self.assertEqual(len(streamed), 10)
+
+    def test_async_ledger_open_streams(self):
+        """
+        Tests if reads still run while as many streams as there are readers are open
+        """
+        self.db.clear_tables()
+        add_expenses([(self.user_id, i, "2024-01-01", 1, 1, "testing") for i in range(1, 11)], self.db)
+
+        async def run():
+            async with AsyncLedger(self.db) as ledger:
+                streams = [ledger.iter_expenses(self.user_id, batch_size=1) for _ in range(DEFAULT_MAX_READERS)]
+                firsts = [await anext(stream) for stream in streams]
+
+                count = await asyncio.wait_for(ledger.get_expense_count(self.user_id), timeout=5)
+                rests = [[row async for row in stream] for stream in streams]
+                return firsts, count, rests
+
+        firsts, count, rests = asyncio.run(run())
+
+        self.assertEqual(count, 10)
+        self.assertEqual([[first] + rest for first, rest in zip(firsts, rests)],
+                         [get_expenses_for_user(self.user_id, self.db)] * DEFAULT_MAX_READERS)
+
     def test_update_expense(self):
         """
         Tests if able to update expense